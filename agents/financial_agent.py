@@ -1,5 +1,5 @@
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Iterable, Tuple, Optional
 from pydantic import BaseModel
 from collections import defaultdict
 
@@ -28,6 +28,71 @@ class FinancialData(BaseModel):
     credit_score: int = None
     last_updated: datetime
 
+class TransactionBatch:
+    """
+    Columnar container for transactions that are already trusted (e.g. rows read
+    from our own typed DB columns). No per-row validation is performed, so
+    untrusted input must still go through the Pydantic models above.
+    """
+    __slots__ = ("ids", "amounts", "descriptions", "categories", "dates")
+
+    def __init__(self, ids=None, amounts=None, descriptions=None, categories=None, dates=None):
+        self.ids = ids if ids is not None else []
+        self.amounts = amounts if amounts is not None else []
+        self.descriptions = descriptions if descriptions is not None else []
+        self.categories = categories if categories is not None else []
+        self.dates = dates if dates is not None else []
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def append(self, id, amount: float, description: str, category: str, date: datetime):
+        self.ids.append(id)
+        self.amounts.append(amount)
+        self.descriptions.append(description)
+        self.categories.append(category)
+        self.dates.append(date)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple]) -> "TransactionBatch":
+        """Build a batch from (id, amount, description, category, date) tuples."""
+        rows = list(rows)
+        if not rows:
+            return cls()
+        ids, amounts, descriptions, categories, dates = (list(column) for column in zip(*rows))
+        return cls(ids, amounts, descriptions, categories, dates)
+
+    @classmethod
+    def from_models(cls, transactions: List[Transaction]) -> "TransactionBatch":
+        batch = cls()
+        for t in transactions:
+            batch.append(t.id, t.amount, t.description, t.category, t.date)
+        return batch
+
+class TrustedFinancialData:
+    """Unvalidated counterpart of FinancialData for DB-sourced rows."""
+    __slots__ = ("user_id", "transactions", "account_balances", "budgets", "credit_score", "last_updated")
+
+    def __init__(self, user_id: str, transactions: TransactionBatch, account_balances: Dict[str, float],
+                 budgets: List[Tuple[str, float]], credit_score: Optional[int] = None, last_updated: datetime = None):
+        self.user_id = user_id
+        self.transactions = transactions
+        self.account_balances = account_balances
+        self.budgets = budgets
+        self.credit_score = credit_score
+        self.last_updated = last_updated
+
+    @classmethod
+    def from_model(cls, data: FinancialData) -> "TrustedFinancialData":
+        return cls(
+            user_id=data.user_id,
+            transactions=TransactionBatch.from_models(data.transactions),
+            account_balances={account.name: account.balance for account in data.accounts},
+            budgets=[(budget.category, budget.amount) for budget in data.budgets],
+            credit_score=data.credit_score,
+            last_updated=data.last_updated
+        )
+
 class MonthlyReport(BaseModel):
     month: str
     total_income: float
@@ -54,61 +119,106 @@ class FinancialReport(BaseModel):
     monthly_reports: List[MonthlyReport]
     budget_comparisons: List[BudgetComparison]
 
-class FinancialAgent:
-    def analyze_financial_data(self, data: FinancialData) -> FinancialReport:
-        total_income = sum(t.amount for t in data.transactions if t.amount > 0)
-        total_expenses = sum(t.amount for t in data.transactions if t.amount < 0)
-        net_savings = total_income + total_expenses  # expenses are negative
+# Independently computable parts of a FinancialReport and the fields each one fills.
+REPORT_SECTION_FIELDS = {
+    "totals": ("total_income", "total_expenses", "net_savings"),
+    "expense_breakdown": ("expense_breakdown",),
+    "top_spending_categories": ("top_spending_categories",),
+    "account_balances": ("account_balances",),
+    "credit_score": ("credit_score",),
+    "monthly_reports": ("monthly_reports",),
+    "budget_comparisons": ("budget_comparisons",),
+}
+REPORT_SECTIONS = tuple(REPORT_SECTION_FIELDS)
 
-        expense_breakdown = defaultdict(float)
-        for t in data.transactions:
-            if t.amount < 0:
-                expense_breakdown[t.category] += abs(t.amount)
+class MonthEndForecast(BaseModel):
+    as_of: date
+    month_end: date
+    current_balance: float
+    daily_net: float
+    upcoming_bills: float
+    projected_balance: float
 
-        top_spending_categories = sorted(expense_breakdown, key=expense_breakdown.get, reverse=True)[:3]
+class FinancialAnalysis(BaseModel):
+    report: FinancialReport
+    advice: List[str]
+    forecast: Optional[MonthEndForecast] = None
+
+class FinancialAgent:
+    def analyze_financial_data(self, data: FinancialData) -> FinancialReport:
+        return self.analyze_trusted_data(TrustedFinancialData.from_model(data))
 
-        account_balances = {account.name: account.balance for account in data.accounts}
+    def analyze_trusted_data(self, data: TrustedFinancialData, sections: Optional[Iterable[str]] = None) -> FinancialReport:
+        """
+        Build a report from trusted data. When `sections` is given (names from
+        REPORT_SECTIONS), only those sections are computed and the result is a
+        partial report whose unset fields should be excluded on serialization.
+        """
+        wanted = set(REPORT_SECTIONS if sections is None else sections)
+        needs_breakdown = bool(wanted & {"expense_breakdown", "top_spending_categories", "budget_comparisons"})
+        batch = data.transactions
+        fields = {"user_id": data.user_id, "report_date": datetime.now()}
 
-        monthly_reports = self.generate_monthly_reports(data.transactions)
+        if "totals" in wanted or needs_breakdown:
+            total_income = 0.0
+            total_expenses = 0.0
+            expense_breakdown = defaultdict(float)
+            for amount, category in zip(batch.amounts, batch.categories):
+                if amount > 0:
+                    total_income += amount
+                elif amount < 0:
+                    total_expenses += amount
+                    if needs_breakdown:
+                        expense_breakdown[category] += abs(amount)
+            if "totals" in wanted:
+                fields["total_income"] = total_income
+                fields["total_expenses"] = abs(total_expenses)
+                fields["net_savings"] = total_income + total_expenses  # expenses are negative
+            if "expense_breakdown" in wanted:
+                fields["expense_breakdown"] = dict(expense_breakdown)
+            if "top_spending_categories" in wanted:
+                fields["top_spending_categories"] = sorted(expense_breakdown, key=expense_breakdown.get, reverse=True)[:3]
+            if "budget_comparisons" in wanted:
+                budgets = [Budget.model_construct(category=category, amount=amount) for category, amount in data.budgets]
+                fields["budget_comparisons"] = self.compare_budget_to_actual(budgets, expense_breakdown)
 
-        budget_comparisons = self.compare_budget_to_actual(data.budgets, expense_breakdown)
+        if "account_balances" in wanted:
+            fields["account_balances"] = data.account_balances
+        if "credit_score" in wanted:
+            fields["credit_score"] = data.credit_score or 0
+        if "monthly_reports" in wanted:
+            fields["monthly_reports"] = self._monthly_reports_from_columns(batch.amounts, batch.categories, batch.dates)
 
-        return FinancialReport(
-            user_id=data.user_id,
-            total_income=total_income,
-            total_expenses=abs(total_expenses),
-            net_savings=net_savings,
-            expense_breakdown=dict(expense_breakdown),
-            top_spending_categories=top_spending_categories,
-            account_balances=account_balances,
-            credit_score=data.credit_score or 0,
-            report_date=datetime.now(),
-            monthly_reports=monthly_reports,
-            budget_comparisons=budget_comparisons
-        )
+        if sections is None:
+            return FinancialReport(**fields)
+        return FinancialReport.model_construct(**fields)
 
     def generate_monthly_reports(self, transactions: List[Transaction]) -> List[MonthlyReport]:
+        batch = TransactionBatch.from_models(transactions)
+        return self._monthly_reports_from_columns(batch.amounts, batch.categories, batch.dates)
+
+    def _monthly_reports_from_columns(self, amounts: List[float], categories: List[str], dates: List[datetime]) -> List[MonthlyReport]:
         monthly_data = defaultdict(lambda: {'income': 0, 'expenses': defaultdict(float)})
         
-        for t in transactions:
-            month = t.date.strftime('%Y-%m')
-            if t.amount > 0:
-                monthly_data[month]['income'] += t.amount
+        for amount, category, date in zip(amounts, categories, dates):
+            month = (date.year, date.month)
+            if amount > 0:
+                monthly_data[month]['income'] += amount
             else:
-                monthly_data[month]['expenses'][t.category] += abs(t.amount)
+                monthly_data[month]['expenses'][category] += abs(amount)
 
         monthly_reports = []
-        for month, data in monthly_data.items():
+        for (year, month), data in sorted(monthly_data.items()):
             total_expenses = sum(data['expenses'].values())
             monthly_reports.append(MonthlyReport(
-                month=month,
+                month=f"{year:04d}-{month:02d}",
                 total_income=data['income'],
                 total_expenses=total_expenses,
                 net_savings=data['income'] - total_expenses,
                 expense_breakdown=dict(data['expenses'])
             ))
 
-        return sorted(monthly_reports, key=lambda x: x.month)
+        return monthly_reports
 
     def compare_budget_to_actual(self, budgets: List[Budget], actual_expenses: Dict[str, float]) -> List[BudgetComparison]:
         comparisons = []
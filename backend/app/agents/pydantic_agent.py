@@ -1,8 +1,64 @@
-from typing import Dict, Any, List
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 from pydantic import ValidationError
 from app.models.financial_data import FinancialData, Transaction, Account, User
 from app.models.financial_report import FinancialReport, FinancialAdvice
 
+try:
+    from pydantic import TypeAdapter
+except ImportError:  # pydantic 1.x
+    from pydantic import parse_obj_as
+    TypeAdapter = None
+
+# Everything sanitize_input strips: not alphanumeric (str.isalnum) and not one of " -_.@".
+_UNSAFE_CHARACTERS = re.compile(r"[^\w \-.@]")
+PARALLEL_CHUNK_SIZE = 20000
+
+@dataclass
+class RowError:
+    row: int
+    field: str
+    message: str
+
+class BulkValidationError(ValueError):
+    def __init__(self, errors: List[RowError]):
+        self.errors = errors
+        details = "; ".join(f"Error in transaction {e.row}: {e.field}: {e.message}" for e in errors[:20])
+        more = f" (and {len(errors) - 20} more)" if len(errors) > 20 else ""
+        super().__init__(f"Errors in bulk transaction validation: {details}{more}")
+
+@lru_cache(maxsize=None)
+def _list_validator(model):
+    """Validates a whole list of `model` rows in one call; built once per model."""
+    if TypeAdapter is not None:
+        return TypeAdapter(List[model]).validate_python
+    return lambda rows: parse_obj_as(List[model], rows)
+
+def _validate_rows(model, rows: List[Dict[str, Any]], offset: int = 0) -> Tuple[List[Any], List[RowError]]:
+    """
+    Validate rows in one pass. On failure, returns the valid rows and one
+    RowError per invalid field, with row numbers counted from `offset`.
+    """
+    validate = _list_validator(model)
+    try:
+        return validate(rows), []
+    except ValidationError as e:
+        errors, bad_rows = [], set()
+        for error in e.errors():
+            loc = [part for part in error["loc"] if part != "__root__"]
+            row = loc[0] if loc and isinstance(loc[0], int) else 0
+            bad_rows.add(row)
+            errors.append(RowError(row=offset + row, field=".".join(str(part) for part in loc[1:]), message=error["msg"]))
+        good = validate([r for i, r in enumerate(rows) if i not in bad_rows]) if len(bad_rows) < len(rows) else []
+        return good, errors
+
+def _validate_chunk(args):
+    model, rows, offset = args
+    return _validate_rows(model, rows, offset)
+
 class PydanticAgent:
     @staticmethod
     def validate_financial_data(data: Dict[str, Any]) -> FinancialData:
@@ -49,10 +105,11 @@ class PydanticAgent:
     @staticmethod
     def sanitize_input(input_data: Dict[str, Any]) -> Dict[str, Any]:
         sanitized_data = {}
+        strip_unsafe = _UNSAFE_CHARACTERS.sub
         for key, value in input_data.items():
             if isinstance(value, str):
                 # Remove any potentially harmful characters
-                sanitized_data[key] = ''.join(char for char in value if char.isalnum() or char in [' ', '-', '_', '.', '@'])
+                sanitized_data[key] = strip_unsafe("", value)
             elif isinstance(value, (int, float, bool)):
                 sanitized_data[key] = value
             elif isinstance(value, list):
@@ -63,23 +120,47 @@ class PydanticAgent:
                 sanitized_data[key] = str(value)
         return sanitized_data
 
+    @classmethod
+    def sanitize_batch(cls, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [cls.sanitize_input(row) for row in rows]
+
     @classmethod
     def validate_and_sanitize_financial_data(cls, data: Dict[str, Any]) -> FinancialData:
         sanitized_data = cls.sanitize_input(data)
         return cls.validate_financial_data(sanitized_data)
 
     @classmethod
-    def bulk_validate_transactions(cls, transactions: List[Dict[str, Any]]) -> List[Transaction]:
-        valid_transactions = []
-        errors = []
-        for i, transaction_data in enumerate(transactions):
-            try:
-                valid_transaction = cls.validate_transaction(transaction_data)
-                valid_transactions.append(valid_transaction)
-            except ValueError as e:
-                errors.append(f"Error in transaction {i}: {str(e)}")
-        
+    def bulk_validate_transactions(cls, transactions: List[Dict[str, Any]], sanitize: bool = False,
+                                   workers: Optional[int] = None,
+                                   chunk_size: int = PARALLEL_CHUNK_SIZE) -> List[Transaction]:
+        """
+        Validate a whole batch of transaction rows.
+
+        :param sanitize: Run sanitize_input over each row first
+        :param workers: Validate chunks of `chunk_size` rows in this many processes. Validated rows are
+            pickled back to the caller, so this only pays off for very large imports on otherwise idle cores
+        :raises BulkValidationError: With one RowError per invalid field if any row is invalid
+        """
+        valid_transactions, errors = cls.bulk_validate_partial(transactions, sanitize, workers, chunk_size)
         if errors:
-            raise ValueError(f"Errors in bulk transaction validation: {'; '.join(errors)}")
-        
+            raise BulkValidationError(errors)
         return valid_transactions
+
+    @classmethod
+    def bulk_validate_partial(cls, transactions: List[Dict[str, Any]], sanitize: bool = False,
+                              workers: Optional[int] = None,
+                              chunk_size: int = PARALLEL_CHUNK_SIZE) -> Tuple[List[Transaction], List[RowError]]:
+        """Like bulk_validate_transactions, but returns the valid rows alongside the errors instead of raising."""
+        if sanitize:
+            transactions = cls.sanitize_batch(transactions)
+        if not workers or workers < 2 or len(transactions) <= chunk_size:
+            return _validate_rows(Transaction, transactions)
+
+        chunks = [(Transaction, transactions[start:start + chunk_size], start)
+                  for start in range(0, len(transactions), chunk_size)]
+        valid_transactions, errors = [], []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk_valid, chunk_errors in pool.map(_validate_chunk, chunks):
+                valid_transactions.extend(chunk_valid)
+                errors.extend(chunk_errors)
+        return valid_transactions, errors
@@ -29,16 +29,20 @@ def send_alert(alert_type: str, message: str, data: Dict[str, Any] = None):
     if data:
         print(f"Additional data: {data}")
 
-def budget_exceeded_alert(category: str, amount: float, budget: float):
+def budget_exceeded_alert(category: str, amount: float, budget: float, threshold: float = 1.0):
     """
-    Send an alert when a budget category is exceeded.
+    Send an alert when a budget category is exceeded, or nearly so.
     
     :param category: Budget category
     :param amount: Actual spent amount
     :param budget: Budget limit
+    :param threshold: Fraction of the budget that was crossed (1.0 means fully spent)
     """
-    message = f"Budget exceeded for {category}. Spent ${amount:.2f}, budget was ${budget:.2f}"
-    send_alert('budget_exceeded', message, {'category': category, 'amount': amount, 'budget': budget})
+    if threshold >= 1.0:
+        message = f"Budget exceeded for {category}. Spent ${amount:.2f}, budget was ${budget:.2f}"
+    else:
+        message = f"Budget for {category} is {threshold:.0%} used. Spent ${amount:.2f} of ${budget:.2f}"
+    send_alert('budget_exceeded', message, {'category': category, 'amount': amount, 'budget': budget, 'threshold': threshold})
 
 def unusual_activity_alert(transaction_id: str, amount: float, reason: str):
     """
@@ -0,0 +1,86 @@
+"""
+Point-in-time balance lookups and downsampled series on a large ledger,
+compared against replaying every entry up to T.
+
+Run from the repository root:
+    python -m benchmarks.bench_balance_ledger --entries 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/ledger.db")
+
+from sqlalchemy import func  # noqa: E402
+
+from database import SessionLocal, engine, Account, BalanceEntry  # noqa: E402
+from services.balance_ledger import balance_at, balance_series  # noqa: E402
+
+def populate(entries: int, years: int) -> datetime:
+    db = SessionLocal()
+    account = Account(user_id=1, name="Checking", balance=0.0, type="checking")
+    db.add(account)
+    db.commit()
+    rng = random.Random(1)
+    start = datetime(2020, 1, 1)
+    spacing = timedelta(seconds=years * 365 * 86400 / entries)
+    balance = 0.0
+    rows = []
+    for i in range(entries):
+        delta = round(rng.uniform(-100, 120), 2)
+        balance += delta
+        rows.append({"account_id": account.id, "occurred_at": start + spacing * i, "delta": delta, "balance_after": balance})
+    with engine.begin() as connection:
+        for offset in range(0, entries, 100_000):
+            connection.execute(BalanceEntry.__table__.insert(), rows[offset:offset + 100_000])
+    db.close()
+    return start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    start = populate(args.entries, args.years)
+    print(f"populated {args.entries} entries in {time.perf_counter() - t0:.1f}s")
+
+    db = SessionLocal()
+    rng = random.Random(2)
+    span = args.years * 365 * 86400
+    points = [start + timedelta(seconds=rng.randrange(span)) for _ in range(args.lookups)]
+
+    t0 = time.perf_counter()
+    for point in points:
+        balance_at(db, 1, point)
+    seek = (time.perf_counter() - t0) / len(points)
+
+    replay_points = points[:20]
+    t0 = time.perf_counter()
+    for point in replay_points:
+        replayed = db.query(func.sum(BalanceEntry.delta)).filter(
+            BalanceEntry.account_id == 1, BalanceEntry.occurred_at <= point
+        ).scalar() or 0.0
+        assert abs(replayed - balance_at(db, 1, point)) < 1e-6 * max(1.0, abs(replayed))
+    replay = (time.perf_counter() - t0) / len(replay_points)
+
+    t0 = time.perf_counter()
+    daily = balance_series(db, 1, start, start + timedelta(days=365), "daily")
+    daily_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    weekly = balance_series(db, 1, start, start + timedelta(days=365 * args.years), "weekly")
+    weekly_time = time.perf_counter() - t0
+    db.close()
+
+    print(f"balance_at (seek):   {seek * 1e6:9.1f} us/lookup")
+    print(f"full replay (sum):   {replay * 1e6:9.1f} us/lookup")
+    print(f"daily series, 1y:    {daily_time * 1000:9.1f} ms ({len(daily)} points)")
+    print(f"weekly series, {args.years}y:   {weekly_time * 1000:9.1f} ms ({len(weekly)} points)")
+
+if __name__ == "__main__":
+    main()
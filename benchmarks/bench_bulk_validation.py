@@ -0,0 +1,93 @@
+"""
+Compare bulk transaction validation in the backend PydanticAgent against the
+previous row-at-a-time implementation (validate_transaction per row, a regex-
+free sanitizer), on generated transaction rows.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_validation --rows 100000
+    python -m benchmarks.bench_bulk_validation --rows 100000 --invalid 0.01 --workers 4
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from pydantic import ValidationError
+
+from benchmarks.suite import load_backend_module
+
+DESCRIPTIONS = ["Grocery Store #214", "Uber *Trip <help.uber.com>", "Salary - ACME Corp.", "Netflix.com/bill",
+                "Rent (March)", "Coffee & bagel", "ATM withdrawal @ 5th Ave", "Électricité EDF"]
+
+def generate_rows(count: int, invalid: float, seed: int = 7):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        row = {"id": f"txn-{i}", "amount": round(rng.uniform(-500, 3000), 2),
+               "description": rng.choice(DESCRIPTIONS), "category": rng.choice(["food", "travel", "bills", "income"]),
+               "date": int((start + timedelta(minutes=i)).timestamp())}  # sanitizing strips ":" from ISO strings
+        if rng.random() < invalid:
+            row["amount"] = "not a number"
+        rows.append(row)
+    return rows
+
+def legacy_sanitize(input_data):
+    sanitized_data = {}
+    for key, value in input_data.items():
+        if isinstance(value, str):
+            sanitized_data[key] = ''.join(char for char in value if char.isalnum() or char in [' ', '-', '_', '.', '@'])
+        elif isinstance(value, (int, float, bool)):
+            sanitized_data[key] = value
+        elif isinstance(value, list):
+            sanitized_data[key] = [legacy_sanitize(item) if isinstance(item, dict) else item for item in value]
+        elif isinstance(value, dict):
+            sanitized_data[key] = legacy_sanitize(value)
+        else:
+            sanitized_data[key] = str(value)
+    return sanitized_data
+
+def legacy_bulk_validate(transaction_model, rows):
+    valid, errors = [], []
+    for i, row in enumerate(rows):
+        try:
+            valid.append(transaction_model(**legacy_sanitize(row)))
+        except ValidationError as e:
+            errors.append(f"Error in transaction {i}: Invalid transaction data: {e}")
+    return valid, errors
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--invalid", type=float, default=0.0, help="fraction of rows with a bad amount")
+    parser.add_argument("--workers", type=int, default=0, help="also time chunked validation in this many processes")
+    args = parser.parse_args()
+
+    agent_module = load_backend_module("app.agents.pydantic_agent")
+    agent = agent_module.PydanticAgent
+    rows = generate_rows(args.rows, args.invalid)
+    agent.bulk_validate_partial(rows[:100], sanitize=True)  # build the cached validator
+
+    legacy_time, (legacy_valid, legacy_errors) = timed(legacy_bulk_validate, agent_module.Transaction, rows)
+    scenarios = [("legacy, row at a time", legacy_time, len(legacy_valid), len(legacy_errors))]
+    sanitize_time, sanitized = timed(agent.sanitize_batch, rows)
+    scenarios.append(("sanitize_batch only", sanitize_time, len(sanitized), 0))
+    batch_time, (valid, errors) = timed(agent.bulk_validate_partial, rows, sanitize=True)
+    scenarios.append(("sanitize + list validator", batch_time, len(valid), len(errors)))
+    if args.workers > 1:
+        parallel_time, (valid, errors) = timed(agent.bulk_validate_partial, rows, sanitize=True, workers=args.workers)
+        scenarios.append((f"sanitize + {args.workers} processes", parallel_time, len(valid), len(errors)))
+
+    print(f"{args.rows} rows, {args.invalid:.1%} invalid")
+    print(f"{'scenario':<30} {'seconds':>9} {'rows/s':>12} {'valid':>8} {'errors':>7} {'speedup':>8}")
+    for name, seconds, valid_count, error_count in scenarios:
+        print(f"{name:<30} {seconds:>9.3f} {args.rows / seconds:>12,.0f} {valid_count:>8} {error_count:>7} "
+              f"{legacy_time / seconds:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
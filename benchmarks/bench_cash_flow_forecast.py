@@ -0,0 +1,129 @@
+"""
+Batch month-end forecasts (services.cash_flow_forecast) at scale.
+
+Two measurements:
+- kernel: smoothing and projection on in-memory users x days matrices, in
+  the same chunks the batch uses, against a per-user Python loop on a sample;
+- end to end: `forecast_all` on a temp SQLite DB holding `--users` users, each
+  with daily rollups on `--active-days` of the last 90 days, 1-4 accounts and
+  3 upcoming bills; reads, computes and upserts every forecast.
+
+Run from the repository root:
+    python -m benchmarks.bench_cash_flow_forecast --users 1000000
+    python -m benchmarks.bench_cash_flow_forecast --users 100000 --kernel-only
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+if "DATABASE_URL" not in os.environ:
+    _directory = tempfile.TemporaryDirectory()  # removed at exit; the DB runs to gigabytes at 1M users
+    os.environ["DATABASE_URL"] = f"sqlite:///{_directory.name}/forecast.db"
+os.environ.setdefault("SLOW_QUERY_MS", "60000")  # every chunk query is a large scan
+
+import numpy as np  # noqa: E402
+
+from services import cash_flow_forecast  # noqa: E402
+
+AS_OF = date(2024, 6, 12)
+CATEGORIES = ["Food", "Transportation", "Shopping", "Utilities", "Housing"]
+
+def python_forecast(flows, balance, bills_due, monthly_bills, days_left):
+    level = flows[0]
+    for flow in flows[1:]:
+        level = cash_flow_forecast.SMOOTHING * flow + (1 - cash_flow_forecast.SMOOTHING) * level
+    return balance + days_left * level - (bills_due - monthly_bills * days_left / cash_flow_forecast.DAYS_PER_MONTH)
+
+def kernel(users: int, chunk_size: int):
+    rng = np.random.default_rng(5)
+    days_left = (cash_flow_forecast.month_end(AS_OF) - AS_OF).days
+    weights = cash_flow_forecast.smoothing_weights(cash_flow_forecast.HISTORY_DAYS)
+    elapsed = 0.0
+    for start in range(0, users, chunk_size):
+        size = min(chunk_size, users - start)
+        flows = np.where(rng.random((size, len(weights))) < 0.3, -rng.lognormal(3, 1, (size, len(weights))), 0.0)
+        balances, bills = rng.lognormal(8, 1, size), rng.lognormal(6, 1, size)
+        started = time.perf_counter()
+        daily_net, projected = cash_flow_forecast.project(flows, balances, bills, bills, days_left, weights)
+        elapsed += time.perf_counter() - started
+    sample = min(10_000, size)
+    started = time.perf_counter()
+    expected = [python_forecast(flows[i].tolist(), balances[i], bills[i], bills[i], days_left) for i in range(sample)]
+    loop_rate = sample / (time.perf_counter() - started)
+    assert np.allclose(expected, projected[:sample])
+    print(f"kernel: {users:,} users x {len(weights)} days in {elapsed:.2f}s = {users / elapsed:,.0f} users/s "
+          f"(Python loop: {loop_rate:,.0f} users/s)")
+
+def populate(users: int, active_days: int, seed: int = 9):
+    from database import engine
+
+    rng = random.Random(seed)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = OFF")
+        for start in range(1, users + 1, 50_000):
+            ids = range(start, min(start + 50_000, users + 1))
+            cursor.executemany("INSERT INTO users (id, username, hashed_password, credit_score) VALUES (?, ?, '', 0)",
+                               [(user_id, f"user{user_id}") for user_id in ids])
+            rollups, accounts, bills = [], [], []
+            for user_id in ids:
+                for offset in sorted(rng.sample(range(cash_flow_forecast.HISTORY_DAYS), active_days)):
+                    day = (AS_OF - timedelta(days=offset)).isoformat()
+                    if offset % 30 == 0:
+                        rollups.append((user_id, day, "Income", round(rng.lognormvariate(8.3, 0.3), 2), 0.0))
+                    rollups.append((user_id, day, rng.choice(CATEGORIES), 0.0, round(rng.lognormvariate(3, 1), 2)))
+                accounts.extend((user_id, "Checking", round(rng.lognormvariate(8, 1), 2), "checking", 1)
+                                for _ in range(rng.randint(1, 4)))
+                bills.extend((user_id, "Bill", round(rng.lognormvariate(4.5, 0.8), 2),
+                              datetime.combine(AS_OF, datetime.min.time()) + timedelta(days=rng.randrange(1, 31), hours=8))
+                             for _ in range(3))
+            cursor.executemany("INSERT OR IGNORE INTO daily_rollups (user_id, day, category, income, expense) "
+                               "VALUES (?, ?, ?, ?, ?)", rollups)
+            cursor.executemany("INSERT INTO accounts (user_id, name, balance, type, version) VALUES (?, ?, ?, ?, ?)", accounts)
+            cursor.executemany("INSERT INTO bill_reminders (user_id, description, amount, due_date, remind_at) "
+                               "VALUES (?, ?, ?, ?, ?)", [(*bill, bill[3]) for bill in bills])
+            connection.commit()
+        cursor.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+
+def end_to_end(users: int, active_days: int, chunk_size: int):
+    from database import CashFlowForecast, SessionLocal
+
+    started = time.perf_counter()
+    populate(users, active_days)
+    print(f"\npopulated {users:,} users in {time.perf_counter() - started:.0f}s")
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        forecast = cash_flow_forecast.forecast_all(db, AS_OF, chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"forecast_all: {forecast:,} users in {elapsed:.1f}s = {forecast / elapsed:,.0f} users/s "
+              f"(chunks of {chunk_size:,})")
+        rows = db.query(CashFlowForecast).count()
+        sample = db.query(CashFlowForecast).filter(CashFlowForecast.user_id == 1).one()
+        print(f"stored {rows:,} forecasts; user 1: balance {sample.current_balance}, daily net {sample.daily_net}, "
+              f"bills {sample.upcoming_bills}, month end {sample.projected_balance}")
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--active-days", type=int, default=20, help="days with spending, of the last 90")
+    parser.add_argument("--chunk-size", type=int, default=cash_flow_forecast.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--kernel-only", action="store_true")
+    args = parser.parse_args()
+
+    kernel(args.users, args.chunk_size)
+    if not args.kernel_only:
+        end_to_end(args.users, args.active_days, args.chunk_size)
+
+if __name__ == "__main__":
+    main()
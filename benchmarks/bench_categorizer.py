@@ -0,0 +1,74 @@
+"""
+Accuracy and throughput of the transaction categorizer (utils.categorizer).
+
+Accuracy is measured on a labeled fixture of bank-statement style
+descriptions (benchmarks/fixtures/labeled_descriptions.csv). Throughput is
+measured on two streams built from the fixture: recurring descriptions (the
+same merchants over and over, as in real statements; served mostly from the
+memo cache) and unique descriptions (a distinct reference number on each, so
+every one goes through normalization and the automaton).
+
+Run from the repository root:
+    python -m benchmarks.bench_categorizer
+    python -m benchmarks.bench_categorizer --count 1000000 --show-misses
+"""
+import argparse
+import csv
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+from utils import categorizer as categorizer_module
+from utils.categorizer import Categorizer
+
+FIXTURE = Path(__file__).with_name("fixtures") / "labeled_descriptions.csv"
+
+def load_fixture(path: Path = FIXTURE) -> List[Tuple[str, str]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["description"], row["category"]) for row in csv.DictReader(f)]
+
+def throughput(categorizer: Categorizer, descriptions: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        categorizer._cache.clear()
+        started = time.perf_counter()
+        categorizer.categorize_many(descriptions)
+        best = min(best, time.perf_counter() - started)
+    return len(descriptions) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000, help="descriptions per throughput stream")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--show-misses", action="store_true")
+    args = parser.parse_args()
+
+    fixture = load_fixture()
+    categorizer = Categorizer()
+    predicted = categorizer.categorize_many(description for description, _ in fixture)
+    misses = [(description, expected, got) for (description, expected), got in zip(fixture, predicted) if got != expected]
+    per_category = Counter(expected for _, expected in fixture)
+    missed_per_category = Counter(expected for _, expected, _ in misses)
+
+    print(f"automaton: {'pyahocorasick' if categorizer_module.ahocorasick else 'pure Python'}, "
+          f"{categorizer.automaton.size} keywords")
+    print(f"accuracy: {1 - len(misses) / len(fixture):.1%} ({len(fixture) - len(misses)}/{len(fixture)})")
+    for category, total in sorted(per_category.items()):
+        print(f"  {category:<15} {1 - missed_per_category[category] / total:>7.1%}  ({total})")
+    if args.show_misses:
+        for description, expected, got in misses:
+            print(f"  miss: {description!r}: expected {expected}, got {got}")
+
+    rng = random.Random(3)
+    descriptions = [description for description, _ in fixture]
+    recurring = [rng.choice(descriptions) for _ in range(args.count)]
+    unique_count = max(1, args.count // 10)
+    unique = [f"{rng.choice(descriptions)} REF{i}" for i in range(unique_count)]
+    print(f"\n{'stream':<36} {'descriptions/s':>15}")
+    print(f"{'recurring (' + str(len(recurring)) + ')':<36} {throughput(categorizer, recurring, args.repeat):>15,.0f}")
+    print(f"{'unique, cache misses (' + str(len(unique)) + ')':<36} {throughput(categorizer, unique, args.repeat):>15,.0f}")
+
+if __name__ == "__main__":
+    main()
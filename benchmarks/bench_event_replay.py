@@ -0,0 +1,210 @@
+"""
+Event-log replay (services.event_log) at scale.
+
+Two measurements:
+- kernel: the built-in projections applied to in-memory event batches of
+  REPLAY_CHUNK_SIZE, against a per-event Python fold on a sample (and checked
+  equal to it);
+- end to end: `--users` users with `--events` events each (mostly created
+  transactions, some recategorizations and deletions, balance adjustments)
+  in a temp SQLite DB. Measures a full replay per user (reading included),
+  `snapshot_all`, and a replay from the latest snapshot after a few more
+  events.
+
+Run from the repository root:
+    python -m benchmarks.bench_event_replay
+    python -m benchmarks.bench_event_replay --kernel-events 20000000 --users 20 --events 500000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+if "DATABASE_URL" not in os.environ:
+    _directory = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{_directory.name}/events.db"
+os.environ.setdefault("SLOW_QUERY_MS", "60000")  # replays are large scans
+
+import numpy as np  # noqa: E402
+
+from services import event_log  # noqa: E402
+
+CATEGORIES = ["Food", "Transportation", "Shopping", "Utilities", "Housing", "Entertainment", "Income"]
+START = date(2022, 1, 1)
+
+def generate(count: int, accounts: int, seed: int, first_id: int = 1):
+    """
+    (kind, entity_id, amount, category, day ordinal, previous amount,
+    previous category, previous day ordinal) rows: a user's history.
+    """
+    rng = random.Random(seed)
+    rows, live = [], []
+    next_transaction = first_id
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.2:
+            rows.append((event_log.BALANCE_ADJUSTED, rng.randrange(accounts), round(rng.uniform(-500, 500), 2),
+                         "", START.toordinal() + rng.randrange(900), None, "", 0))
+        elif roll < 0.25 and live:
+            transaction_id, amount, category, day = live[rng.randrange(len(live))]
+            new_category = rng.choice(CATEGORIES)
+            rows.append((event_log.TRANSACTION_UPDATED, transaction_id, amount, new_category, day, amount, category, day))
+            live.append((transaction_id, amount, new_category, day))  # older copies go stale; see below
+        elif roll < 0.27 and live:
+            transaction_id, amount, category, day = live.pop(rng.randrange(len(live)))
+            rows.append((event_log.TRANSACTION_DELETED, transaction_id, amount, category, day, None, "", 0))
+        else:
+            amount = round(rng.uniform(1000, 3000), 2) if rng.random() < 0.05 else -round(rng.lognormvariate(3, 1), 2)
+            category = "Income" if amount > 0 else rng.choice(CATEGORIES[:-1])
+            day = START.toordinal() + rng.randrange(900)
+            rows.append((event_log.TRANSACTION_CREATED, next_transaction, amount, category, day, None, "", 0))
+            live.append((next_transaction, amount, category, day))
+            next_transaction += 1
+    return _consistent(rows)
+
+def _consistent(rows):
+    """Rewrite update/delete rows to carry each transaction's actual current values."""
+    current, fixed = {}, []
+    for kind, entity_id, amount, category, day, previous_amount, previous_category, previous_day in rows:
+        if kind == event_log.TRANSACTION_CREATED:
+            current[entity_id] = category
+        elif kind == event_log.TRANSACTION_UPDATED:
+            if entity_id not in current:
+                continue
+            previous_category, current[entity_id] = current[entity_id], category
+        elif kind == event_log.TRANSACTION_DELETED:
+            if entity_id not in current:
+                continue
+            category = current.pop(entity_id)
+        fixed.append((kind, entity_id, amount, category, day, previous_amount, previous_category, previous_day))
+    return fixed
+
+def python_fold(rows):
+    balances, rollups = {}, {}
+
+    def add(day, category, amount, sign):
+        cell = rollups.setdefault((day, category), [0.0, 0.0])
+        cell[0 if amount > 0 else 1] += sign * abs(amount)
+
+    for kind, entity_id, amount, category, day, previous_amount, previous_category, previous_day in rows:
+        if kind == event_log.BALANCE_ADJUSTED:
+            balances[entity_id] = balances.get(entity_id, 0.0) + amount
+        elif kind == event_log.TRANSACTION_DELETED:
+            add(day, category, amount, -1)
+        else:
+            add(day, category, amount, 1)
+            if kind == event_log.TRANSACTION_UPDATED:
+                add(previous_day, previous_category, previous_amount, -1)
+    return balances, rollups
+
+def same(left: dict, right: dict) -> bool:
+    keys = set(left) | set(right)
+    return all(np.allclose(left.get(key, 0.0), right.get(key, 0.0), atol=1e-6) for key in keys)
+
+def kernel(events: int, seed: int):
+    chunk = event_log.REPLAY_CHUNK_SIZE
+    rows = generate(min(events, chunk), 8, seed)
+    batch = event_log.EventBatch.from_rows(rows)
+    balances, rollups = event_log.AccountBalances(), event_log.DailyRollups()
+    states = {balances.name: balances.initial(), rollups.name: rollups.initial()}
+    applied, elapsed = 0, 0.0
+    while applied < events:
+        started = time.perf_counter()
+        for projection in (balances, rollups):
+            states[projection.name] = projection.apply(states[projection.name], batch)
+        elapsed += time.perf_counter() - started
+        applied += len(batch)
+    single = {projection.name: projection.apply(projection.initial(), batch) for projection in (balances, rollups)}
+    started = time.perf_counter()
+    expected_balances, expected_rollups = python_fold(rows)
+    loop_rate = len(rows) / (time.perf_counter() - started)
+    assert same(single[balances.name], expected_balances) and same(single[rollups.name], expected_rollups)
+    print(f"kernel: {applied:,} events in {elapsed:.2f}s = {applied / elapsed:,.0f} events/s "
+          f"(chunks of {len(batch):,}; Python fold: {loop_rate:,.0f} events/s; results equal)")
+
+def populate(users: int, events: int, seed: int):
+    from database import engine
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = OFF")
+        recorded = datetime(2024, 6, 30).isoformat(" ")
+        for user_id in range(1, users + 1):
+            cursor.execute("INSERT INTO users (id, username, hashed_password, credit_score) VALUES (?, ?, '', 0)",
+                           (user_id, f"user{user_id}"))
+            rows = generate(events, 4, seed + user_id, first_id=user_id * 10_000_000)
+            cursor.executemany(
+                "INSERT INTO events (user_id, kind, entity_id, amount, category, occurred_at, previous_amount, "
+                "previous_category, previous_occurred_at, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((user_id, kind, entity_id, amount, category or None, _timestamp(day), previous_amount,
+                  previous_category or None, _timestamp(previous_day), recorded)
+                 for kind, entity_id, amount, category, day, previous_amount, previous_category, previous_day in rows)
+            )
+            connection.commit()
+        cursor.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+
+def _timestamp(day: int):
+    return (datetime.combine(date.fromordinal(day), datetime.min.time()) + timedelta(hours=12)).isoformat(" ") if day else None
+
+def end_to_end(users: int, events: int, seed: int):
+    from database import Account, SessionLocal
+
+    started = time.perf_counter()
+    populate(users, events, seed)
+    print(f"\npopulated {users} users x {events:,} events in {time.perf_counter() - started:.0f}s")
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        replayed = sum(event_log.replay(db, user_id, use_snapshots=False).events_replayed for user_id in range(1, users + 1))
+        elapsed = time.perf_counter() - started
+        print(f"full replay (read + apply): {replayed:,} events in {elapsed:.2f}s = {replayed / elapsed:,.0f} events/s")
+
+        started = time.perf_counter()
+        # Dropping stale updates and deletions leaves users a few short of `events`; every one needs a snapshot.
+        snapshots = event_log.snapshot_all(db, every=min(events // 2, event_log.SNAPSHOT_EVERY))
+        print(f"snapshot_all: {snapshots} users in {time.perf_counter() - started:.2f}s")
+
+        # A few more events per user, as the API would write them.
+        for user_id in range(1, users + 1):
+            account = Account(id=user_id * 10, user_id=user_id, name="Checking", type="checking", balance=0.0)
+            db.add(account)
+            for _ in range(50):
+                event_log.record_balance_adjusted(db, account, 1.0, "bench", datetime(2024, 7, 1))
+        db.commit()
+        timings = []
+        for user_id in range(1, users + 1):
+            started = time.perf_counter()
+            result = event_log.replay(db, user_id)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert result.events_replayed == 50 and result.states["account_balances"][user_id * 10] == 50.0
+            full = event_log.replay(db, user_id, use_snapshots=False)
+            assert same(full.states["account_balances"], result.states["account_balances"])
+            assert same(full.states["daily_rollups"], result.states["daily_rollups"])
+        timings.sort()
+        print(f"replay from snapshot (+50 events): median {timings[len(timings) // 2]:.1f} ms, "
+              f"max {timings[-1]:.1f} ms per user; equal to a full replay")
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kernel-events", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--events", type=int, default=200_000, help="per user")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--kernel-only", action="store_true")
+    args = parser.parse_args()
+
+    kernel(args.kernel_events, args.seed)
+    if not args.kernel_only:
+        end_to_end(args.users, args.events, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure what the profiling hook costs per request when it is off, installed
+but not triggered, and profiling every request.
+
+Drives minimal ASGI calls against a trivial sync endpoint (the worst case:
+the hook's overhead is not hidden behind real work).
+
+Run from the repository root:
+    python -m benchmarks.bench_profiling_overhead --requests 5000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from fastapi import FastAPI
+
+from middlewares.profiling import ProfiledRoute, ProfileStore, ProfilingMiddleware
+
+def build_app(route_class=None, middleware: dict = None) -> FastAPI:
+    app = FastAPI()
+    if route_class is not None:
+        app.router.route_class = route_class
+    if middleware is not None:
+        app.add_middleware(ProfilingMiddleware, **middleware)
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+    return app
+
+async def drive(app, requests: int, headers=()) -> float:
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"", "headers": list(headers),
+             "server": ("test", 80), "client": ("test", 1)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(50):  # warm-up
+        await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    store = ProfileStore(tempfile.mkdtemp(), max_profiles=20)
+    token = "benchmark-token"
+    scenarios = [
+        ("plain APIRoute, no middleware", build_app(), (), args.requests),
+        ("ProfiledRoute, no middleware", build_app(ProfiledRoute), (), args.requests),
+        ("middleware installed, not triggered", build_app(ProfiledRoute, {"store": store, "token": token}), (), args.requests),
+        ("middleware, 1-in-1000 sampling", build_app(ProfiledRoute, {"store": store, "token": token, "sample_every": 1000}), (),
+         args.requests),
+        ("every request profiled", build_app(ProfiledRoute, {"store": store, "token": token}),
+         ((b"x-profile-token", token.encode()),), max(1, args.requests // 20)),
+    ]
+    baseline = None
+    print(f"{'scenario':<40} {'us/request':>11} {'overhead':>10}")
+    for name, app, headers, requests in scenarios:
+        per_request = min(asyncio.run(drive(app, requests, headers)) for _ in range(args.repeat))
+        baseline = baseline or per_request
+        print(f"{name:<40} {per_request * 1e6:>11.1f} {per_request / baseline - 1:>+10.1%}")
+
+if __name__ == "__main__":
+    main()
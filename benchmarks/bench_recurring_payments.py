@@ -0,0 +1,99 @@
+"""
+Recurring-payment detection (services.recurring_payments) on the synthetic
+dataset: batch throughput across all users, how many of the generated bills
+and subscriptions are found (and what else is flagged), and the latency the
+incremental check adds to one transaction insert.
+
+The detector runs as of the latest generated charge, as a nightly job would
+the day after an import.
+
+Run from the repository root (writes a fresh temp DB):
+    python -m benchmarks.bench_recurring_payments
+    python -m benchmarks.bench_recurring_payments --users 2000 --months 24
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+os.environ.setdefault("SLOW_QUERY_MS", "60000")  # the bulk inserts and full scans would flood the slow-query log
+
+from sqlalchemy import func  # noqa: E402
+
+from benchmarks import synthetic_data  # noqa: E402
+from database import SessionLocal, Transaction  # noqa: E402
+from services import recurring_payments  # noqa: E402
+from utils.categorizer import merchant_phrase  # noqa: E402
+
+END = datetime(2024, 6, 15, 12)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--inserts", type=int, default=2000, help="transactions for the incremental check")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    user_ids = synthetic_data.generate(args.users, args.months, seed=args.seed, end=END)
+    print(f"generated {len(user_ids)} users in {time.perf_counter() - started:.0f}s")
+    expected = {merchant_phrase(description) for description, *_ in synthetic_data.BILLS + synthetic_data.SUBSCRIPTIONS}
+
+    db = SessionLocal()
+    try:
+        now = db.query(func.max(Transaction.date)).scalar()
+        rows = db.query(Transaction.user_id, Transaction.description, Transaction.amount, Transaction.date).filter(
+            Transaction.amount < 0, Transaction.date >= now - recurring_payments.LOOKBACK
+        ).order_by(Transaction.user_id).all()
+        by_user = {}
+        for user_id, description, amount, when in rows:
+            by_user.setdefault(user_id, []).append((description, amount, when))
+
+        started = time.perf_counter()
+        found = [series for charges in by_user.values() for series in recurring_payments.detect(charges, now)]
+        elapsed = time.perf_counter() - started
+        print(f"\ndetect (in memory): {len(rows):,} expenses in {elapsed:.2f}s = {len(rows) / elapsed:,.0f} expenses/s")
+
+        started = time.perf_counter()
+        users, series_found, created = recurring_payments.detect_all(db, now=now)
+        db.flush()
+        elapsed = time.perf_counter() - started
+        print(f"detect_all (scan + reminders): {users} users, {len(rows):,} expenses in {elapsed:.2f}s "
+              f"= {len(rows) / elapsed:,.0f} expenses/s; {series_found} series, {len(created)} new reminders")
+
+        # Every user has the three bills; subscriptions vary per user.
+        generated = Counter(merchant_phrase(description) for _, description, _, _ in rows)
+        users_with = {merchant: len({user_id for user_id, description, _, _ in rows if merchant_phrase(description) == merchant})
+                      for merchant in expected}
+        detected = Counter(series.merchant for series in found)
+        print(f"\n{'merchant':<22} {'period':<9} {'users with it':>14} {'detected':>9}")
+        for merchant in sorted(expected):
+            periods = {series.period for series in found if series.merchant == merchant}
+            print(f"{merchant:<22} {','.join(sorted(periods)) or '-':<9} {users_with[merchant]:>14} {detected[merchant]:>9}")
+        others = Counter(series.merchant for series in found if series.merchant not in expected)
+        print(f"other merchants flagged: {sum(others.values())} "
+              f"({sum(others.values()) / len(by_user):.2f}/user, of {len(generated) - len(expected)} other merchants)"
+              + (f": {dict(others.most_common(5))}" if others else ""))
+        db.rollback()
+
+        # Incremental: one insert's worth of work, a mix of bill payments and everyday spending.
+        rng = random.Random(args.seed)
+        timings = []
+        for _ in range(args.inserts):
+            user_id = rng.choice(user_ids)
+            description, amount, when = rng.choice(by_user[user_id])
+            started = time.perf_counter()
+            recurring_payments.record_transaction(db, user_id, description, amount, now + timedelta(days=rng.randrange(0, 20)), now)
+            timings.append((time.perf_counter() - started) * 1000)
+        db.rollback()
+        timings.sort()
+        print(f"\nrecord_transaction: p50 {timings[len(timings) // 2]:.2f} ms, "
+              f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms over {len(timings)} inserts")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare FastAPI's default jsonable_encoder + json.dumps path against direct
+model-to-bytes dumping for the analyze_finances response, and report bytes on
+the wire for each compression option.
+
+Run from the repository root:
+    python -m benchmarks.bench_report_serialization --years 10
+"""
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from agents.financial_agent import FinancialAgent, FinancialAnalysis, TransactionBatch, TrustedFinancialData
+from benchmarks.bench_trusted_construction import CATEGORIES, make_rows
+from utils.responses import brotli, compress_body, model_json_bytes
+
+def build_analysis(years: int) -> FinancialAnalysis:
+    agent = FinancialAgent()
+    data = TrustedFinancialData(
+        user_id="1",
+        transactions=TransactionBatch.from_rows(make_rows(years * 1500, years=years)),
+        account_balances={"Checking": 1500.0, "Savings": 12000.0},
+        budgets=[(c, 500.0) for c in CATEGORIES],
+        credit_score=720
+    )
+    report = agent.analyze_trusted_data(data)
+    return FinancialAnalysis(report=report, advice=agent.generate_advice(report))
+
+def default_path(analysis: FinancialAnalysis) -> bytes:
+    content = jsonable_encoder({"report": analysis.report, "advice": analysis.advice})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def best_of(fn, arg, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    analysis = build_analysis(args.years)
+    body = model_json_bytes(analysis)
+    assert json.loads(body) == json.loads(default_path(analysis))
+
+    print(f"{'serializer':<20} {'best (ms)':>10}")
+    print(f"{'jsonable_encoder':<20} {best_of(default_path, analysis, args.repeat) * 1000:>10.2f}")
+    print(f"{'model_json_bytes':<20} {best_of(model_json_bytes, analysis, args.repeat) * 1000:>10.2f}")
+
+    print(f"\n{'encoding':<20} {'bytes':>10} {'encode (ms)':>12}")
+    print(f"{'identity':<20} {len(body):>10} {0:>12.2f}")
+    encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+    for encoding in encodings:
+        elapsed = best_of(lambda b: compress_body(b, encoding), body, args.repeat)
+        print(f"{encoding:<20} {len(compress_body(body, encoding)):>10} {elapsed * 1000:>12.2f}")
+
+if __name__ == "__main__":
+    main()
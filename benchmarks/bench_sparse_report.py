@@ -0,0 +1,53 @@
+"""
+Compare computing and serializing the full analyze_finances report against
+sparse `include=` selections, in server time and response size.
+
+Run from the repository root:
+    python -m benchmarks.bench_sparse_report --years 10
+"""
+import argparse
+import time
+
+from agents.financial_agent import (
+    FinancialAgent, FinancialAnalysis, FinancialReport, TransactionBatch, TrustedFinancialData, REPORT_SECTIONS
+)
+from benchmarks.bench_trusted_construction import CATEGORIES, make_rows
+from utils.responses import model_json_bytes
+
+SELECTIONS = [None, ("totals",), ("totals", "top_spending_categories"), ("account_balances", "credit_score"), ("monthly_reports",)]
+
+def render(agent: FinancialAgent, data: TrustedFinancialData, sections) -> bytes:
+    if sections is None:
+        report = agent.analyze_trusted_data(data)
+        return model_json_bytes(FinancialAnalysis(report=report, advice=agent.generate_advice(report)))
+    report = agent.analyze_trusted_data(data, set(sections))
+    return model_json_bytes(FinancialAnalysis.model_construct(report=report), exclude_unset=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    agent = FinancialAgent()
+    data = TrustedFinancialData(
+        user_id="1",
+        transactions=TransactionBatch.from_rows(make_rows(args.years * 1500, years=args.years)),
+        account_balances={"Checking": 1500.0, "Savings": 12000.0},
+        budgets=[(c, 500.0) for c in CATEGORIES],
+        credit_score=720
+    )
+    assert set(REPORT_SECTIONS) <= set(FinancialReport.model_fields) | {"totals"}
+
+    print(f"{'include':<40} {'best (ms)':>10} {'bytes':>10}")
+    for sections in SELECTIONS:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            body = render(agent, data, sections)
+            timings.append(time.perf_counter() - start)
+        label = ",".join(sections) if sections else "(full report + advice)"
+        print(f"{label:<40} {min(timings) * 1000:>10.2f} {len(body):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Search latency: the FTS5 transaction index (services.transaction_search)
+against a `LIKE '%term%'` scan with the same filters.
+
+Each size gets a fresh temp DB holding `--rows` transactions spread over
+`--users` users, with descriptions drawn from the categorizer fixture plus
+a reference number. The FTS index is built by the insert triggers, as in
+production. Both variants run through the ORM with the same user, filter and
+LIMIT; LIKE returns newest first, FTS by relevance and by date.
+
+Run from the repository root:
+    python -m benchmarks.bench_transaction_search --rows 1000000
+    python -m benchmarks.bench_transaction_search --rows 1000000 10000000 --repeat 20
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+QUERIES = [
+    # (label, search query, LIKE pattern, filters)
+    ("common word", "amazon", "%amazon%", {}),
+    ("rare word", "hertz", "%hertz%", {}),
+    ("prefix", "starb*", "%starb%", {}),
+    ("two words", "whole foods", "%whole foods%", {}),
+    ("word + filters", "uber", "%uber%", {"category": "Transportation", "min_amount": -50.0, "days": 90}),
+    ("no match", "zzyzx", "%zzyzx%", {}),
+]
+
+def populate(rows: int, users: int, seed: int = 11):
+    from benchmarks.bench_categorizer import load_fixture
+    from database import engine
+
+    rng = random.Random(seed)
+    fixture = load_fixture()
+    end = datetime(2024, 6, 30)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.executemany("INSERT INTO users (id, username, hashed_password, credit_score) VALUES (?, ?, '', 0)",
+                           [(user_id, f"user{user_id}") for user_id in range(1, users + 1)])
+        batch = []
+        for i in range(rows):
+            description, category = rng.choice(fixture)
+            when = end - timedelta(minutes=rng.randrange(0, 3 * 365 * 24 * 60))
+            batch.append((rng.randint(1, users), -round(rng.lognormvariate(3, 1), 2),
+                          f"{description} {rng.randrange(10 ** 6):06d}", category, when.isoformat(" ")))
+            if len(batch) == 50000 or i == rows - 1:
+                cursor.executemany("INSERT INTO transactions (user_id, amount, description, category, date) "
+                                   "VALUES (?, ?, ?, ?, ?)", batch)
+                connection.commit()
+                batch = []
+        cursor.execute("INSERT INTO transactions_fts(transactions_fts) VALUES ('optimize')")
+        cursor.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+    return end
+
+def like_search(db, user_id, pattern, filters, end, limit=50):
+    from database import Transaction
+
+    query = db.query(Transaction.id, Transaction.amount, Transaction.description, Transaction.category,
+                     Transaction.date).filter(Transaction.user_id == user_id, Transaction.description.like(pattern))
+    if "days" in filters:
+        query = query.filter(Transaction.date >= end - timedelta(days=filters["days"]))
+    if "category" in filters:
+        query = query.filter(Transaction.category == filters["category"])
+    if "min_amount" in filters:
+        query = query.filter(Transaction.amount >= filters["min_amount"])
+    return query.order_by(Transaction.date.desc()).limit(limit).all()
+
+def measure(fn, repeat: int):
+    fn()  # warm the page cache
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[min(len(timings) - 1, int(len(timings) * 0.95))], len(result)
+
+def run_size(rows: int, users: int, repeat: int):
+    from database import SessionLocal
+    from services import transaction_search
+
+    started = time.perf_counter()
+    end = populate(rows, users)
+    print(f"\n{rows:,} rows, {users} users (loaded and indexed in {time.perf_counter() - started:.0f}s)")
+    print(f"{'query':<16} {'variant':<14} {'p50 ms':>9} {'p95 ms':>9} {'rows':>5}")
+    db = SessionLocal()
+    try:
+        for label, query, pattern, filters in QUERIES:
+            search_filters = {key: value for key, value in filters.items() if key != "days"}
+            if "days" in filters:
+                search_filters["start_date"] = end - timedelta(days=filters["days"])
+            variants = [
+                ("LIKE", lambda: like_search(db, 1, pattern, filters, end)),
+                ("FTS relevance", lambda: transaction_search.search(db, 1, query, **search_filters)),
+                ("FTS date", lambda: transaction_search.search(db, 1, query, order="date", **search_filters)),
+            ]
+            for variant, fn in variants:
+                p50, p95, count = measure(fn, repeat)
+                print(f"{label:<16} {variant:<14} {p50:>9.2f} {p95:>9.2f} {count:>5}")
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)  # internal: run one size in this process
+    args = parser.parse_args()
+
+    if args.size is not None:
+        run_size(args.size, args.users, args.repeat)
+        return
+    # One process per size: `database` binds its engine to DATABASE_URL at import.
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{directory}/search.db")
+            env.setdefault("SLOW_QUERY_MS", "60000")  # the LIKE scans would flood the slow-query log
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_transaction_search", "--size", str(rows),
+                            "--users", str(args.users), "--repeat", str(args.repeat)], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
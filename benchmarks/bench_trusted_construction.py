@@ -0,0 +1,87 @@
+"""
+Compare the validated FinancialData path against the trusted TransactionBatch
+path used by analyze_finances.
+
+Run from the repository root:
+    python -m benchmarks.bench_trusted_construction --transactions 50000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from agents.financial_agent import FinancialAgent, FinancialData, TransactionBatch, TrustedFinancialData
+
+CATEGORIES = ["Food", "Housing", "Transportation", "Entertainment", "Utilities", "Health", "Shopping"]
+
+def make_rows(n: int, seed: int = 42, years: int = 4):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    rows = []
+    for i in range(n):
+        if rng.random() < 0.1:
+            amount, category = round(rng.uniform(1000, 5000), 2), "Income"
+        else:
+            amount, category = -round(rng.uniform(1, 300), 2), rng.choice(CATEGORIES)
+        rows.append((i + 1, amount, f"Transaction {i}", category, start + timedelta(minutes=rng.randrange(60 * 24 * 365 * years))))
+    return rows
+
+def validated_path(agent, rows):
+    financial_data = FinancialData(
+        user_id="1",
+        transactions=[
+            {"id": str(r[0]), "amount": r[1], "description": r[2], "category": r[3], "date": r[4]}
+            for r in rows
+        ],
+        accounts=[{"id": "1", "name": "Checking", "balance": 1500.0, "type": "Checking"}],
+        budgets=[{"category": c, "amount": 500.0} for c in CATEGORIES],
+        credit_score=720,
+        last_updated=datetime.now()
+    )
+    return agent.analyze_financial_data(financial_data)
+
+def trusted_path(agent, rows):
+    financial_data = TrustedFinancialData(
+        user_id="1",
+        transactions=TransactionBatch.from_rows(rows),
+        account_balances={"Checking": 1500.0},
+        budgets=[(c, 500.0) for c in CATEGORIES],
+        credit_score=720,
+        last_updated=datetime.now()
+    )
+    return agent.analyze_trusted_data(financial_data)
+
+def measure(fn, agent, rows, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(agent, rows)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    report = fn(agent, rows)  # noqa: F841 - keep the result alive for the snapshot
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    return min(timings), peak, blocks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    agent = FinancialAgent()
+    rows = make_rows(args.transactions)
+    assert validated_path(agent, rows).model_dump(exclude={"report_date"}) == \
+        trusted_path(agent, rows).model_dump(exclude={"report_date"})
+
+    print(f"{'path':<10} {'best wall (ms)':>15} {'peak mem (KiB)':>15} {'blocks held':>12}")
+    for name, fn in (("validated", validated_path), ("trusted", trusted_path)):
+        wall, peak, blocks = measure(fn, agent, rows, args.repeat)
+        print(f"{name:<10} {wall * 1000:>15.1f} {peak / 1024:>15.0f} {blocks:>12}")
+
+if __name__ == "__main__":
+    main()
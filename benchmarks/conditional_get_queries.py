@@ -0,0 +1,49 @@
+"""
+Count the DB queries a conditional GET costs when the client's ETag is
+current (304) versus a full response, for each ETag-enabled endpoint.
+
+Run from the repository root:
+    python -m benchmarks.conditional_get_queries
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/etag.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from database import engine  # noqa: E402
+from main import app  # noqa: E402
+
+queries = []
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    queries.append(statement)
+
+def main():
+    client = TestClient(app)
+    client.post("/users/", json={"username": "etag", "password": "x"})
+    client.post("/budgets/", json={"category": "Food", "amount": 300})
+    client.post("/bill_reminders/", json={"description": "Rent", "amount": 900, "due_date": "2030-01-01T00:00:00"})
+    client.post("/transactions/", json={"amount": -20, "description": "Lunch", "category": "Food", "date": "2024-05-01T12:00:00"})
+
+    print(f"{'endpoint':<24} {'200 queries':>12} {'304 queries':>12}")
+    for path in ("/budgets/", "/bill_reminders/", "/analyze_finances/1"):
+        queries.clear()
+        first = client.get(path)
+        full = len(queries)
+        queries.clear()
+        revalidated = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+        assert revalidated.status_code == 304 and not revalidated.content
+        print(f"{path:<24} {full:>12} {len(queries):>12}")
+        assert len(queries) <= 1
+
+    etag = client.get("/budgets/").headers["ETag"]
+    client.post("/transactions/", json={"amount": -5, "description": "Snack", "category": "Food", "date": "2024-05-02T12:00:00"})
+    assert client.get("/budgets/", headers={"If-None-Match": etag}).status_code == 200
+    print("writes invalidate ETags; 304s cost at most one query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Load harness for the FastAPI apps, in-process or over a local socket.
+
+Drives an ASGI app through httpx's in-process transport (no network), through
+a uvicorn server started on a local port (--serve), or against any running
+server (--url). Two scenarios:
+
+* closed loop (--concurrency N): N clients each send their next request as
+  soon as the previous one finishes. Measures capacity.
+* open loop (--rate R): requests arrive as a Poisson process at R/s whether
+  or not earlier ones finished. Latency is measured from the scheduled
+  arrival time, so queueing inside the app is not hidden (no coordinated
+  omission).
+
+Requests are drawn from a weighted mix (--mix-file, JSON list of
+{"method", "path", "weight", "json"}; default: the mobile app's main calls).
+Results are printed and optionally written as JSON (--output) with the git
+commit, so runs can be compared across commits. An app run in-process (or
+with --serve) gets a temp DB unless DATABASE_URL is set.
+
+Run from the repository root:
+    python -m benchmarks.load_harness --concurrency 32 --duration 20 --seed-users 50
+    python -m benchmarks.load_harness --rate 200 --duration 20 --serve --output load.json
+    python -m benchmarks.load_harness --app app.main:app --mix-file mix.json
+    python -m benchmarks.load_harness --app-dir backend --app app.main:app
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_MIX = [
+    {"method": "GET", "path": "/budgets/", "weight": 4},
+    {"method": "GET", "path": "/bill_reminders/", "weight": 3},
+    {"method": "GET", "path": "/analyze_finances/1", "weight": 2},
+    {"method": "GET", "path": "/analyze_finances/1?include=totals", "weight": 2},
+    {"method": "POST", "path": "/transactions/", "weight": 1,
+     "json": {"amount": -12.5, "description": "Coffee", "category": "Food", "date": "2024-06-15T08:30:00"}},
+]
+
+def load_app(target: str, app_dir: str = None):
+    if app_dir:
+        sys.path.insert(0, app_dir)
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "app")
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile.
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, latency: float, status: str):
+        self.latencies[name].append(latency)
+        self.statuses[name][status] += 1
+
+    def summary(self, elapsed: float) -> Dict:
+        def describe(latencies: List[float], statuses: Dict[str, int]) -> Dict:
+            values = sorted(latencies)
+            count = len(values)
+            errors = sum(n for status, n in statuses.items() if status == "error" or status.startswith("5"))
+            return {
+                "requests": count,
+                "throughput": count / elapsed if elapsed else 0.0,
+                "error_rate": errors / count if count else 0.0,
+                "client_error_rate": sum(n for s, n in statuses.items() if s.startswith("4")) / count if count else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": (values[-1] if values else 0.0) * 1000,
+                "statuses": dict(statuses),
+            }
+        combined_statuses = defaultdict(int)
+        for statuses in self.statuses.values():
+            for status, n in statuses.items():
+                combined_statuses[status] += n
+        return {
+            "total": describe([v for values in self.latencies.values() for v in values], combined_statuses),
+            "endpoints": {name: describe(self.latencies[name], self.statuses[name]) for name in sorted(self.latencies)},
+        }
+
+async def send(client: httpx.AsyncClient, item: Dict, recorder: Recorder, started: float):
+    name = f"{item['method']} {item['path']}"
+    try:
+        response = await client.request(item["method"], item["path"], json=item.get("json"))
+        status = str(response.status_code)
+    except Exception:
+        status = "error"
+    recorder.record(name, time.perf_counter() - started, status)
+
+async def closed_loop(client, mix, weights, recorder: Recorder, concurrency: int, deadline: float, rng: random.Random):
+    async def worker():
+        while time.perf_counter() < deadline:
+            await send(client, rng.choices(mix, weights)[0], recorder, time.perf_counter())
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+async def open_loop(client, mix, weights, recorder: Recorder, rate: float, deadline: float, rng: random.Random):
+    in_flight = set()
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(send(client, rng.choices(mix, weights)[0], recorder, next_arrival))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        next_arrival += rng.expovariate(rate)
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+def serve(app) -> str:
+    """Run the app under uvicorn on a free local port in a background thread; returns its base URL."""
+    import uvicorn
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+async def run(args, app, mix) -> Dict:
+    weights = [item.get("weight", 1) for item in mix]
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout)
+    async with client:
+        deadline = time.perf_counter() + args.warmup
+        await closed_loop(client, mix, weights, Recorder(), min(args.concurrency, 4), deadline, rng)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        if args.rate:
+            await open_loop(client, mix, weights, recorder, args.rate, deadline, rng)
+        else:
+            await closed_loop(client, mix, weights, recorder, args.concurrency, deadline, rng)
+        return recorder.summary(time.perf_counter() - started)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:app", help="ASGI app import path (default %(default)s)")
+    parser.add_argument("--app-dir", help="directory to put on sys.path before importing --app")
+    parser.add_argument("--url", help="drive an already running server instead of an in-process app")
+    parser.add_argument("--serve", action="store_true", help="serve the app with uvicorn on a local port and drive it over HTTP")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed-loop clients (default %(default)s)")
+    parser.add_argument("--rate", type=float, help="open-loop arrival rate in requests/sec (overrides --concurrency)")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds (default %(default)s)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before the run (default %(default)s)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--mix-file", help="JSON list of {method, path, weight, json}")
+    parser.add_argument("--seed-users", type=int, default=0,
+                        help="for main:app, write this many synthetic users to the temp DB first")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    app = None
+    if not args.url:
+        # The mix posts transactions; never write them into the tracked financial_app.db.
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load.db")
+        if args.seed_users:
+            from benchmarks import synthetic_data
+            synthetic_data.generate(args.seed_users)
+        app = load_app(args.app, args.app_dir)
+        if args.serve:
+            args.url = serve(app)
+    mix = DEFAULT_MIX
+    if args.mix_file:
+        with open(args.mix_file) as f:
+            mix = json.load(f)
+
+    summary = asyncio.run(run(args, app, mix))
+
+    scenario = f"open loop at {args.rate:g} req/s" if args.rate else f"closed loop, {args.concurrency} clients"
+    transport = args.url or "in-process"
+    print(f"{args.app} via {transport}: {scenario}, {args.duration:g}s")
+    print(f"{'endpoint':<44} {'reqs':>7} {'req/s':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, stats in list(summary["endpoints"].items()) + [("TOTAL", summary["total"])]:
+        print(f"{name[:44]:<44} {stats['requests']:>7} {stats['throughput']:>8.1f} {stats['error_rate'] * 100:>6.2f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "app": args.app,
+                "transport": transport,
+                "scenario": {"rate": args.rate, "concurrency": None if args.rate else args.concurrency,
+                             "duration": args.duration, "mix": mix},
+                "results": summary,
+            }, f, indent=2)
+        print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
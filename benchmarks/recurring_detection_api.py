@@ -0,0 +1,39 @@
+"""
+Check that recurring payments posted one by one through POST /transactions/
+end up as bill reminders: a monthly subscription after its third charge and
+an annual one after its second.
+
+Run from the repository root:
+    python -m benchmarks.recurring_detection_api
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/recurring.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app  # noqa: E402
+
+def main():
+    client = TestClient(app)
+    client.post("/users/", json={"username": "recurring", "password": "x"})
+    today = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=12)
+    charges = [("NETFLIX.COM", -15.99, today - timedelta(days=days)) for days in (61, 31, 1)]
+    charges += [("AMAZON PRIME", -139.0, today - timedelta(days=days)) for days in (366, 1)]
+    for description, amount, when in charges:
+        response = client.post("/transactions/", json={"amount": amount, "description": description, "date": when.isoformat()})
+        assert response.status_code == 200, response.text
+
+    reminders = client.get("/bill_reminders/").json()
+    print(f"{'description':<20} {'amount':>8} {'due':>12}")
+    for reminder in reminders:
+        print(f"{reminder['description']:<20} {reminder['amount']:>8.2f} {reminder['due_date'][:10]:>12}")
+    detected = {reminder["description"].upper() for reminder in reminders}
+    for merchant in ("NETFLIX", "AMAZON PRIME"):
+        assert any(merchant in description for description in detected), f"no reminder for {merchant}"
+    print("recurring charges posted through the API create their reminders")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Replay traffic captured by TrafficCaptureMiddleware against a build, diff the
+responses and compare latency with the capture.
+
+Requests are re-issued on the captured schedule, scaled by --speed (1 =
+original pacing, 10 = ten times faster, 0 = as fast as possible, one at a
+time). Responses are compared on status and body; JSON bodies are compared
+after redaction and after dropping volatile keys (--ignore-key). Writes are
+replayed too, so point the target at a copy of the captured database.
+
+Headers that would let the build answer from state rather than do the work
+are rewritten: If-None-Match is dropped (a captured 304 is replayed as a
+full GET and counted as `revalidated`, not compared), and Idempotency-Keys
+get a per-run prefix, so a POST runs once per replay instead of coming
+back from the copy's `idempotency_keys`.
+
+Run from the repository root:
+    TRAFFIC_CAPTURE_SAMPLE_RATE=0.05 uvicorn main:app        # capture
+    python -m benchmarks.replay_traffic captures/traffic.jsonl --speed 5
+    python -m benchmarks.replay_traffic captures/traffic.jsonl --url http://127.0.0.1:8000 --output replay.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load_harness import git_commit, load_app, percentile
+from middlewares.traffic_capture import redact
+
+DEFAULT_IGNORED_KEYS = ["report_date", "created_at", "last_updated", "timestamp"]
+
+def replay_headers(record: Dict, run_id: str) -> Dict[str, str]:
+    headers = {}
+    for name, value in (record.get("headers") or {}).items():
+        if name.lower() == "if-none-match":
+            continue
+        if name.lower() == "idempotency-key":
+            value = f"{run_id}-{value}"
+        headers[name] = value
+    return headers
+
+def read_capture(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+def strip_keys(value, ignored: set):
+    if isinstance(value, dict):
+        return {k: strip_keys(v, ignored) for k, v in value.items() if k not in ignored}
+    if isinstance(value, list):
+        return [strip_keys(item, ignored) for item in value]
+    return value
+
+def body_matches(captured: Optional[Dict], response: httpx.Response, ignored: set) -> bool:
+    if captured is None:
+        return not response.content
+    if "json" in captured:
+        try:
+            replayed = redact(response.json())
+        except ValueError:
+            return False
+        return strip_keys(captured["json"], ignored) == strip_keys(replayed, ignored)
+    if "text" in captured:
+        return captured["text"] == response.text
+    return captured["sha256"] == hashlib.sha256(response.content).hexdigest()
+
+async def replay(client: httpx.AsyncClient, records: List[Dict], speed: float, ignored: set):
+    results = []
+    run_id = uuid.uuid4().hex[:12]
+
+    async def issue(record: Dict, scheduled: float):
+        request_body = record.get("request_body")
+        if request_body is not None and "json" not in request_body and "text" not in request_body:
+            results.append({"record": record, "outcome": "skipped"})
+            return
+        url = record["path"] + (f"?{record['query']}" if record["query"] else "")
+        started = time.perf_counter()
+        try:
+            response = await client.request(
+                record["method"], url, headers=replay_headers(record, run_id),
+                json=request_body["json"] if request_body and "json" in request_body else None,
+                content=request_body["text"] if request_body and "text" in request_body else None,
+            )
+        except Exception as e:
+            results.append({"record": record, "outcome": "error", "detail": repr(e),
+                            "latency_ms": (time.perf_counter() - scheduled) * 1000})
+            return
+        finished = time.perf_counter()
+        if record["status"] == 304 and response.status_code == 200:
+            outcome = "revalidated"  # the capture holds no body to compare with
+        elif response.status_code != record["status"]:
+            outcome = "status_mismatch"
+        elif not body_matches(record.get("response_body"), response, ignored):
+            outcome = "body_mismatch"
+        else:
+            outcome = "match"
+        results.append({"record": record, "outcome": outcome, "status": response.status_code,
+                        "latency_ms": (finished - scheduled) * 1000, "service_ms": (finished - started) * 1000})
+
+    if speed <= 0:
+        for record in records:
+            await issue(record, time.perf_counter())
+        return results
+
+    first_ts, start = records[0]["ts"], time.perf_counter()
+    tasks = []
+    for record in records:
+        scheduled = start + (record["ts"] - first_ts) / speed
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(issue(record, scheduled)))
+    await asyncio.gather(*tasks)
+    return results
+
+def distribution(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {"count": len(values), "p50_ms": percentile(values, 0.5), "p95_ms": percentile(values, 0.95),
+            "p99_ms": percentile(values, 0.99), "max_ms": values[-1] if values else 0.0}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="JSONL file written by TrafficCaptureMiddleware")
+    parser.add_argument("--app", default="main:app", help="ASGI app to replay against in-process (default %(default)s)")
+    parser.add_argument("--app-dir")
+    parser.add_argument("--url", help="replay against a running server instead")
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing multiplier; 0 = sequential, no pacing")
+    parser.add_argument("--ignore-key", action="append", default=list(DEFAULT_IGNORED_KEYS),
+                        help="JSON key to leave out of body comparisons (repeatable)")
+    parser.add_argument("--show", type=int, default=5, help="mismatches to print")
+    parser.add_argument("--output", help="write the comparison as JSON to this file")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    records = read_capture(args.capture)
+    if not records:
+        parser.error(f"no captured requests in {args.capture}")
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=load_app(args.app, args.app_dir)),
+                                   base_url="http://replay", timeout=60)
+
+    async def run():
+        async with client:
+            return await replay(client, records, args.speed, set(args.ignore_key))
+    results = asyncio.run(run())
+
+    outcomes = Counter(result["outcome"] for result in results)
+    captured = distribution([r["duration_ms"] for r in records])
+    replayed = distribution([r["latency_ms"] for r in results if "latency_ms" in r])
+    print(f"replayed {len(results)} requests from {args.capture} against {args.url or args.app} at speed {args.speed:g}")
+    print("outcomes: " + ", ".join(f"{name}={count}" for name, count in sorted(outcomes.items())))
+    print(f"\n{'latency':<10} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for label, stats in (("captured", captured), ("replayed", replayed)):
+        print(f"{label:<10} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}")
+
+    mismatches = [r for r in results if r["outcome"] not in ("match", "revalidated", "skipped")]
+    for result in mismatches[:args.show]:
+        record = result["record"]
+        print(f"  {result['outcome']}: {record['method']} {record['path']}?{record['query']} "
+              f"captured {record['status']}, replayed {result.get('status', result.get('detail'))}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "capture": args.capture,
+                "target": args.url or args.app,
+                "speed": args.speed,
+                "outcomes": dict(outcomes),
+                "latency": {"captured": captured, "replayed": replayed},
+                "mismatches": [{"method": r["record"]["method"], "path": r["record"]["path"], "query": r["record"]["query"],
+                                "outcome": r["outcome"], "captured_status": r["record"]["status"],
+                                "replayed_status": r.get("status")} for r in mismatches],
+            }, f, indent=2)
+        print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Cross-worker cache staleness under concurrent writes (services.cache_bus).
+
+One writer process posts $1 expenses for random users through the same
+service calls as `POST /transactions/`, and notes when each commit returned.
+Several reader processes, each with its own in-process cache like a uvicorn
+worker, keep reading a random user's expense count from
+`windowed_analytics.get_index`. A read is stale when it misses a write that
+had committed before the read began, and its staleness is how long that
+write had been committed.
+
+Modes:
+- read-check: bus running, caches sync before every read (the default
+  setup); no read may be stale;
+- poll-only: bus running, readers rely on the background poll alone;
+  staleness is bounded by the poll interval plus scheduling delay;
+- off: no bus; readers keep serving the index they first built.
+
+Run from the repository root (uses a temp DB):
+    python -m benchmarks.sim_cache_invalidation
+    python -m benchmarks.sim_cache_invalidation --readers 4 --writes 2000 --poll-ms 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+if "DATABASE_URL" not in os.environ:
+    _directory = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{_directory.name}/cache_bus.db"
+os.environ.setdefault("SLOW_QUERY_MS", "60000")  # reads wait on the writer's locks; that is part of the test
+
+MODES = ("read-check", "poll-only", "off")
+
+def writer(first_user: int, users: int, writes: int, seed: int, ready, results):
+    from database import SessionLocal
+    from services import windowed_analytics
+
+    rng = random.Random(seed)
+    committed = []
+    ready.wait()
+    db = SessionLocal()
+    try:
+        for _ in range(writes):
+            user_id = rng.randint(first_user, first_user + users - 1)
+            when = datetime.now()
+            windowed_analytics.record_transaction(db, user_id, -1.0, "Food", when)
+            db.commit()
+            committed.append((user_id, time.monotonic()))
+            windowed_analytics.observe_transaction(user_id, -1.0, "Food", when)
+            time.sleep(rng.uniform(0, 0.002))
+    finally:
+        db.close()
+    results.put(("writer", committed))
+
+def reader(name: str, mode: str, first_user: int, users: int, poll_ms: float, seed: int, ready, done, results):
+    from database import SessionLocal
+    from services import windowed_analytics
+    from services.cache_bus import bus
+
+    bus.poll_interval = poll_ms / 1000
+    bus.check_on_read = mode == "read-check"
+    if mode != "off":
+        bus.start()
+    rng = random.Random(seed)
+    reads = []
+    ready.wait()
+    while not done.is_set():
+        user_id = rng.randint(first_user, first_user + users - 1)
+        started = time.monotonic()
+        db = SessionLocal()  # one session per read, as per request in the API
+        try:
+            index = windowed_analytics.get_index(db, user_id)
+            today = datetime.now().toordinal()
+            expense = index.totals(today - 1, today)[1]
+        finally:
+            db.close()
+        reads.append((user_id, started, round(expense)))
+    bus.stop()
+    results.put((name, reads))
+
+def staleness(committed, reads):
+    """Staleness in seconds of every read that missed a write committed before it began."""
+    by_user = {}
+    for user_id, at in committed:
+        by_user.setdefault(user_id, []).append(at)
+    stale = []
+    for user_id, started, seen in reads:
+        times = by_user.get(user_id, [])
+        expected = bisect_left(times, started)  # writes committed before the read began
+        if seen < expected:
+            stale.append(started - times[seen])  # the first write the read missed
+    return stale
+
+def run(mode: str, args) -> float:
+    context = multiprocessing.get_context("spawn")
+    first_user = 1 + MODES.index(mode) * args.users  # each mode writes to its own users
+    ready, done, results = context.Event(), context.Event(), context.Queue()
+    processes = [context.Process(target=reader, args=(f"reader{i}", mode, first_user, args.users, args.poll_ms,
+                                                      args.seed + i, ready, done, results))
+                 for i in range(args.readers)]
+    processes.append(context.Process(target=writer, args=(first_user, args.users, args.writes, args.seed, ready, results)))
+    for process in processes:
+        process.start()
+    time.sleep(1)  # let every process import and start its bus
+    ready.set()
+    outcome = dict([results.get()])  # the writer finishes first
+    done.set()
+    for _ in range(args.readers):
+        name, reads = results.get()
+        outcome[name] = reads
+    for process in processes:
+        process.join()
+
+    committed = outcome.pop("writer")
+    reads = [read for reads in outcome.values() for read in reads]
+    stale = sorted(staleness(committed, reads))
+    worst = stale[-1] * 1000 if stale else 0.0
+    p99 = stale[int(len(stale) * 0.99)] * 1000 if stale else 0.0
+    print(f"{mode:<11} {len(reads):>8,} reads {len(stale):>7,} stale ({len(stale) / max(len(reads), 1):6.1%}); "
+          f"staleness p99 {p99:8.1f} ms, max {worst:8.1f} ms")
+    return worst
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=3)
+    parser.add_argument("--users", type=int, default=20, help="few users, so reads hit recently written ones")
+    parser.add_argument("--writes", type=int, default=1000)
+    parser.add_argument("--poll-ms", type=float, default=5.0)
+    parser.add_argument("--mode", choices=MODES, action="append", help="default: all")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    import database  # noqa: F401  creates the schema before the workers start
+
+    print(f"{args.readers} readers, 1 writer, {args.writes} writes over {args.users} users, poll every {args.poll_ms} ms "
+          f"({os.cpu_count()} CPUs)\n")
+    worst = {mode: run(mode, args) for mode in args.mode or MODES}
+    if "read-check" in worst and worst["read-check"] > 0:
+        raise SystemExit("FAIL: a read with read-check on missed a committed write")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Concurrent transfer stress run: many threads move money among many accounts,
+then the run checks that the total balance is conserved and that every
+account's ledger sums to its balance.
+
+Run from the repository root:
+    python -m benchmarks.stress_transfers --threads 100 --accounts 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/transfers.db")
+
+from sqlalchemy import func  # noqa: E402
+
+from database import SessionLocal, engine, Account, BalanceEntry  # noqa: E402
+from services import transfers  # noqa: E402
+
+INITIAL_BALANCE = 1000.0
+
+def populate(accounts: int):
+    now = datetime.now()
+    with engine.begin() as connection:
+        connection.execute(Account.__table__.insert(), [
+            {"id": i, "user_id": 1, "name": f"Account {i}", "balance": INITIAL_BALANCE, "type": "checking", "version": 1}
+            for i in range(1, accounts + 1)
+        ])
+        connection.execute(BalanceEntry.__table__.insert(), [
+            {"account_id": i, "occurred_at": now, "delta": INITIAL_BALANCE, "balance_after": INITIAL_BALANCE, "reason": "opening balance"}
+            for i in range(1, accounts + 1)
+        ])
+
+def worker(seed: int, accounts: int, count: int, outcomes: Counter, lock: threading.Lock):
+    rng = random.Random(seed)
+    db = SessionLocal()
+    local = Counter()
+    try:
+        for _ in range(count):
+            source, target = rng.sample(range(1, accounts + 1), 2)
+            try:
+                transfers.transfer_money(db, source, target, round(rng.uniform(1, 200), 2))
+                local["ok"] += 1
+            except transfers.InsufficientFundsError:
+                local["insufficient_funds"] += 1
+            except transfers.TransferConflictError:
+                local["conflict"] += 1
+    finally:
+        db.close()
+    with lock:
+        outcomes.update(local)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--transfers-per-thread", type=int, default=50)
+    args = parser.parse_args()
+
+    populate(args.accounts)
+    outcomes, lock = Counter(), threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(seed, args.accounts, args.transfers_per_thread, outcomes, lock))
+        for seed in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    total = db.query(func.sum(Account.balance)).scalar()
+    mismatched = db.query(Account.id).join(BalanceEntry, BalanceEntry.account_id == Account.id).group_by(Account.id).having(
+        func.abs(func.sum(BalanceEntry.delta) - func.max(Account.balance)) > 1e-6
+    ).count()
+    db.close()
+
+    expected = INITIAL_BALANCE * args.accounts
+    print(f"outcomes: {dict(outcomes)}")
+    print(f"throughput: {outcomes['ok'] / elapsed:.0f} transfers/sec over {elapsed:.1f}s")
+    print(f"total balance: {total:.2f} (expected {expected:.2f})")
+    assert abs(total - expected) < 1e-6 * expected, "total balance not conserved"
+    assert mismatched == 0, f"{mismatched} accounts whose ledger does not sum to their balance"
+    print("balance conserved; ledgers consistent")
+
+if __name__ == "__main__":
+    main()
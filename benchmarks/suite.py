@@ -0,0 +1,176 @@
+"""
+Benchmark suite for the core paths, checked against stored baselines.
+
+Every case runs against the same synthetic data (benchmarks.synthetic_data,
+fixed seed and end date) in a temp DB. Each case reports the best per-call
+time over several rounds; a case slower than its baseline by more than the
+threshold fails the run with exit status 1.
+
+Baselines are machine-specific. Refresh them on the machine that runs the
+check after an intentional change:
+    python -m benchmarks.suite --update-baselines
+    python -m benchmarks.suite --threshold 0.25 [-k analyze]
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/suite.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from agents.financial_agent import FinancialAgent, FinancialData  # noqa: E402
+from benchmarks import synthetic_data  # noqa: E402
+from database import SessionLocal, User, Transaction, Account  # noqa: E402
+from main import app  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINES = Path(__file__).with_name("baselines.json")
+DATA_END = datetime(2024, 6, 30, 23, 59)
+DEFAULT_THRESHOLD = 0.25
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[], Callable[[], object]]  # returns the function to time
+    number: int  # calls per round
+
+def load_backend_module(name: str):
+    """
+    Import a module from backend/app without executing backend/app/__init__.py,
+    which wires up every router and their optional dependencies (openai, langchain).
+    """
+    if not getattr(sys.modules.get("app"), "__backend__", False):
+        for package in ("app", "app.agents", "app.models", "app.utils"):
+            module = types.ModuleType(package)
+            module.__path__ = [str(ROOT.joinpath("backend", *package.split(".")))]
+            module.__backend__ = True
+            sys.modules[package] = module
+    return importlib.import_module(name)
+
+def financial_data_for(user_id: int) -> FinancialData:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        return FinancialData(
+            user_id=str(user_id),
+            transactions=[
+                {"id": str(t.id), "amount": t.amount, "description": t.description, "category": t.category, "date": t.date}
+                for t in db.query(Transaction).filter(Transaction.user_id == user_id)
+            ],
+            accounts=[
+                {"id": str(a.id), "name": a.name, "balance": a.balance, "type": a.type}
+                for a in db.query(Account).filter(Account.user_id == user_id)
+            ],
+            budgets=[],
+            credit_score=user.credit_score,
+            last_updated=DATA_END,
+        )
+    finally:
+        db.close()
+
+def build_cases(user_ids: List[int]) -> List[Case]:
+    agent = FinancialAgent()
+    client = TestClient(app)
+    # create_transaction writes for user 1; read the last user so the measured data does not grow.
+    heavy_user = user_ids[-1]
+
+    def analyze_financial_data():
+        data = financial_data_for(heavy_user)
+        return lambda: agent.analyze_financial_data(data)
+
+    def generate_advice():
+        report = agent.analyze_financial_data(financial_data_for(heavy_user))
+        return lambda: agent.generate_advice(report)
+
+    def create_transaction():
+        payload = {"amount": -12.5, "description": "Coffee", "category": "Food", "date": "2024-06-15T08:30:00"}
+        return lambda: client.post("/transactions/", json=payload)
+
+    def analyze_finances():
+        path = f"/analyze_finances/{heavy_user}"
+        assert client.get(path).status_code == 200
+        return lambda: client.get(path)
+
+    def sanitize_input():
+        agent_module = load_backend_module("app.agents.pydantic_agent")
+        payload = json.loads(financial_data_for(heavy_user).model_dump_json())
+        return lambda: agent_module.PydanticAgent.sanitize_input(payload)
+
+    def parse_sms_command():
+        sms_commands = load_backend_module("app.utils.sms_commands")
+        messages = [
+            "balance checking", "spend 12.50 food lunch with team", "transfer 200 checking savings",
+            "budget food", "yes BILL123", "no BILL456", "SPEND 80 groceries weekly shopping run",
+        ] * 150
+        return lambda: [sms_commands.parse_sms_command(message) for message in messages]
+
+    return [
+        Case("agent.analyze_financial_data", analyze_financial_data, 5),
+        Case("agent.generate_advice", generate_advice, 200),
+        Case("api.create_transaction", create_transaction, 20),
+        Case("api.analyze_finances", analyze_finances, 5),
+        Case("backend.sanitize_input", sanitize_input, 5),
+        Case("backend.parse_sms_command", parse_sms_command, 10),
+    ]
+
+def measure(case: Case, rounds: int) -> float:
+    fn = case.setup()
+    fn()  # warm-up
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(case.number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / case.number)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown vs baseline, as a fraction (default %(default)s)")
+    parser.add_argument("-k", dest="keyword", help="only run cases whose name contains this")
+    parser.add_argument("--update-baselines", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per in-process request otherwise
+
+    user_ids = synthetic_data.generate(users=20, months=24, seed=7, end=DATA_END)
+    cases = [case for case in build_cases(user_ids) if not args.keyword or args.keyword in case.name]
+    stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {"cases": {}}
+
+    results: Dict[str, float] = {}
+    regressions = []
+    print(f"{'case':<32} {'best (ms)':>10} {'baseline':>10} {'change':>8}")
+    for case in cases:
+        results[case.name] = elapsed = measure(case, args.rounds)
+        baseline = stored["cases"].get(case.name)
+        if baseline is None:
+            print(f"{case.name:<32} {elapsed * 1000:>10.3f} {'-':>10} {'-':>8}")
+            continue
+        change = elapsed / baseline - 1
+        print(f"{case.name:<32} {elapsed * 1000:>10.3f} {baseline * 1000:>10.3f} {change:>+8.1%}")
+        if change > args.threshold:
+            regressions.append(case.name)
+
+    if args.update_baselines:
+        stored["cases"].update({name: round(elapsed, 9) for name, elapsed in results.items()})
+        stored["python"] = platform.python_version()
+        stored["machine"] = platform.machine()
+        BASELINES.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"baselines written to {BASELINES}")
+    elif regressions:
+        print(f"regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
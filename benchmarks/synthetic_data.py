@@ -0,0 +1,161 @@
+"""
+Reproducible synthetic users for benchmarks and local load testing.
+
+Each user gets a monthly salary, monthly bills of a steady amount, up to two
+subscriptions, log-normally distributed day-to-day spending across categories
+(a few large purchases, many small ones), 1-4 accounts with opening-balance
+ledger entries, budgets for their main spending categories and upcoming bill
+reminders. Derived tables (daily rollups, budget counters, spending
+aggregates) are rebuilt so every endpoint sees consistent data.
+
+Writes to $DATABASE_URL, or a fresh temp DB when it is unset:
+    DATABASE_URL=sqlite:///./financial_app.db python -m benchmarks.synthetic_data --users 100
+"""
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/synthetic.db")
+
+from sqlalchemy import func, select  # noqa: E402
+
+from database import (  # noqa: E402
+    DATABASE_URL, SessionLocal, engine, User, Transaction, Account, BalanceEntry, BillReminder, Budget
+)
+from services import budget_tracker, spending_patterns, windowed_analytics  # noqa: E402
+
+# (category, share of spending transactions, median amount)
+SPENDING = [
+    ("Food", 0.35, 18.0),
+    ("Transportation", 0.15, 25.0),
+    ("Shopping", 0.15, 45.0),
+    ("Entertainment", 0.12, 30.0),
+    ("Health", 0.05, 60.0),
+    ("Utilities", 0.08, 80.0),
+    ("Travel", 0.02, 400.0),
+    ("Other", 0.08, 20.0),
+]
+MERCHANTS = {
+    "Food": ["Whole Foods", "Trader Joe's", "Chipotle", "Starbucks", "Local Diner"],
+    "Transportation": ["Shell", "Uber", "Lyft", "Metro Card"],
+    "Shopping": ["Amazon", "Target", "Walmart", "Best Buy"],
+    "Entertainment": ["Netflix", "Spotify", "AMC Theatres", "Steam"],
+    "Health": ["CVS Pharmacy", "Walgreens", "Dental Care"],
+    "Utilities": ["Electric Co", "Water Dept", "Comcast"],
+    "Travel": ["Delta Airlines", "Marriott", "Airbnb"],
+    "Other": ["Venmo", "ATM Withdrawal", "Etsy"],
+}
+# (description, category, lowest, highest, month-to-month variation)
+BILLS = [("Rent", "Housing", 900.0, 2500.0, 0.0), ("Phone bill", "Utilities", 40.0, 90.0, 0.05),
+         ("Car insurance", "Transportation", 80.0, 200.0, 0.0)]
+# (description, category, price, day of month)
+SUBSCRIPTIONS = [("NETFLIX.COM", "Entertainment", 15.49, 7), ("Spotify USA", "Entertainment", 10.99, 14),
+                 ("PLANET FITNESS CLUB FEES", "Health", 24.99, 17), ("Disney Plus", "Entertainment", 13.99, 22)]
+ACCOUNT_TYPES = [("Checking", "checking"), ("Savings", "savings"), ("Credit Card", "credit"), ("Brokerage", "investment")]
+
+def _months(start: datetime, months: int):
+    year, month = start.year, start.month
+    for _ in range(months):
+        yield datetime(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def generate(users: int, months: int = 12, transactions_per_month: int = 60, seed: int = 42, end: datetime = None):
+    """
+    Insert `users` synthetic users with `months` of history ending at `end`
+    (default: now). Returns the new user ids.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now()
+    start = datetime(end.year, end.month, 1) - timedelta(days=31 * (months - 1))
+    weights = [share for _, share, _ in SPENDING]
+    with engine.begin() as connection:
+        first_id = (connection.execute(select(func.max(User.id))).scalar() or 0) + 1
+        user_ids = list(range(first_id, first_id + users))
+        connection.execute(User.__table__.insert(), [
+            {"id": user_id, "username": f"synthetic_{user_id}", "hashed_password": "x",
+             "credit_score": int(min(850, max(300, rng.gauss(690, 70))))}
+            for user_id in user_ids
+        ])
+        for user_id in user_ids:
+            salary = round(rng.lognormvariate(math.log(4200), 0.35), 2)
+            bills = [(description, category, round(rng.uniform(low, high), 2), variation)
+                     for description, category, low, high, variation in BILLS]
+            subscriptions = rng.sample(SUBSCRIPTIONS, rng.randint(0, 2))
+            transactions, accounts, reminders = [], [], []
+            for month_start in _months(start, months):
+                if month_start > end:
+                    break
+                transactions.append({"user_id": user_id, "amount": salary, "description": "Payroll deposit",
+                                     "category": "Income", "date": month_start + timedelta(days=rng.randrange(0, 3), hours=9)})
+                for description, category, amount, variation in bills:
+                    amount = round(amount * rng.uniform(1 - variation, 1 + variation), 2)
+                    transactions.append({"user_id": user_id, "amount": -amount, "description": description,
+                                         "category": category, "date": month_start + timedelta(days=rng.randrange(0, 5), hours=8)})
+                for description, category, price, day in subscriptions:
+                    when = month_start + timedelta(days=day - 1, hours=3)
+                    if when <= end:
+                        transactions.append({"user_id": user_id, "amount": -price, "description": description,
+                                             "category": category, "date": when})
+                for _ in range(max(0, int(rng.gauss(transactions_per_month, transactions_per_month / 5)))):
+                    category, _, median = rng.choices(SPENDING, weights)[0]
+                    when = month_start + timedelta(minutes=rng.randrange(28 * 24 * 60))
+                    if when > end:
+                        continue
+                    transactions.append({"user_id": user_id, "amount": -round(rng.lognormvariate(math.log(median), 0.8), 2),
+                                         "description": rng.choice(MERCHANTS[category]), "category": category, "date": when})
+            connection.execute(Transaction.__table__.insert(), transactions)
+
+            for name, account_type in ACCOUNT_TYPES[:rng.randint(1, len(ACCOUNT_TYPES))]:
+                accounts.append({"user_id": user_id, "name": name, "type": account_type, "version": 1,
+                                 "balance": round(rng.lognormvariate(math.log(3000), 1.0), 2)})
+            for account in accounts:
+                result = connection.execute(Account.__table__.insert(), account)
+                connection.execute(BalanceEntry.__table__.insert(), {
+                    "account_id": result.inserted_primary_key[0], "occurred_at": start, "delta": account["balance"],
+                    "balance_after": account["balance"], "reason": "opening balance"
+                })
+
+            connection.execute(Budget.__table__.insert(), [
+                {"user_id": user_id, "category": category, "period": "monthly", "amount": round(median * 40, -1)}
+                for category, _, median in SPENDING[:rng.randint(2, 5)]
+            ])
+            for description, _, amount, _ in bills:
+                due = datetime(end.year, end.month, 1) + timedelta(days=31 + rng.randrange(0, 5))
+                reminders.append({"user_id": user_id, "description": description, "amount": amount,
+                                  "due_date": due, "remind_at": due})
+            connection.execute(BillReminder.__table__.insert(), reminders)
+
+    db = SessionLocal()
+    try:
+        for user_id in user_ids:
+            windowed_analytics.rebuild_rollups(db, user_id)
+            spending_patterns.rebuild(db, user_id)
+        for budget in db.query(Budget).filter(Budget.user_id.in_(user_ids)):
+            budget_tracker.seed_current_period(db, budget, end)
+        db.commit()
+    finally:
+        db.close()
+    return user_ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--transactions-per-month", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    user_ids = generate(args.users, args.months, args.transactions_per_month, args.seed)
+    db = SessionLocal()
+    transactions = db.query(func.count(Transaction.id)).filter(Transaction.user_id.in_(user_ids)).scalar()
+    db.close()
+    print(f"wrote {len(user_ids)} users ({user_ids[0]}-{user_ids[-1]}) and {transactions} transactions "
+          f"to {DATABASE_URL} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+import os
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Float, Date, DateTime, Text, LargeBinary, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from databases import Database
 
-DATABASE_URL = "sqlite:///./financial_app.db"
+from utils import query_instrumentation
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./financial_app.db")
 
 database = Database(DATABASE_URL)
-engine = create_engine(DATABASE_URL)
+# Sessions are opened, used and closed from different threadpool threads (and
+# shared across the sub-requests of a POST /batch), so let SQLite connections cross threads.
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+)
+# Time every statement; per-request counts, N+1 suspects and the slow-query log.
+query_instrumentation.install(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -21,6 +32,7 @@ class User(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (Index("ix_transactions_user_date", "user_id", "date"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -37,22 +49,321 @@ class Account(Base):
     name = Column(String)
     balance = Column(Float)
     type = Column(String)
+    version = Column(Integer, default=0, nullable=False)
+
+    # Optimistic concurrency: every UPDATE checks and bumps `version`, and a
+    # concurrent change surfaces as StaleDataError instead of a lost update.
+    __mapper_args__ = {"version_id_col": version}
+
+class BalanceEntry(Base):
+    """Append-only log of account balance changes; balance_after makes every entry a checkpoint."""
+    __tablename__ = "balance_entries"
+    __table_args__ = (Index("ix_balance_entries_account_time", "account_id", "occurred_at", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    occurred_at = Column(DateTime, nullable=False)
+    delta = Column(Float, nullable=False)
+    balance_after = Column(Float, nullable=False)
+    reason = Column(String)
+
+class Transfer(Base):
+    __tablename__ = "transfers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    from_account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False, index=True)
+    to_account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False, index=True)
+    amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, nullable=False)
 
 class BillReminder(Base):
     __tablename__ = "bill_reminders"
+    __table_args__ = (Index("ix_bill_reminders_user_due", "user_id", "due_date"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     description = Column(String)
     amount = Column(Float)
-    due_date = Column(DateTime)
+    due_date = Column(DateTime, index=True)
+    remind_at = Column(DateTime, index=True)  # defaults to due_date; moved by reschedules
+    reminded_at = Column(DateTime)  # set once the reminder SMS has gone out
+    merchant = Column(String)  # merchant phrase, on reminders created by services.recurring_payments
 
 class Budget(Base):
     __tablename__ = "budgets"
+    __table_args__ = (Index("ix_budgets_user_category", "user_id", "category"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     category = Column(String)
     amount = Column(Float)
+    period = Column(String, default="monthly", nullable=False)  # "monthly" or "weekly"
+
+class BudgetSpend(Base):
+    """Running spend counter for one budget period, maintained at write time."""
+    __tablename__ = "budget_spend"
+    __table_args__ = (UniqueConstraint("budget_id", "period_start"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    budget_id = Column(Integer, ForeignKey("budgets.id"), nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    spent = Column(Float, default=0.0, nullable=False)
+    alerted_threshold = Column(Float, default=0.0, nullable=False)  # highest threshold already alerted
+
+class DailyRollup(Base):
+    """Per-user, per-day, per-category income/expense totals, maintained on insert."""
+    __tablename__ = "daily_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True)
+    income = Column(Float, default=0.0, nullable=False)
+    expense = Column(Float, default=0.0, nullable=False)  # positive amount spent
+
+class SpendingPatternBucket(Base):
+    """
+    One cell of a user's streaming spending aggregates (see services.spending_patterns):
+    a weekday, an hour of day, a category, or the user's overall total.
+    Amounts are integer cents so that merged aggregates are exact.
+    """
+    __tablename__ = "spending_pattern_buckets"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    dimension = Column(String, primary_key=True)  # "total", "weekday", "hour" or "category"
+    bucket = Column(String, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    cents = Column(Integer, default=0, nullable=False)  # positive amount spent
+    month_cents = Column(Integer, default=0, nullable=False)  # sum of month index * cents, for trend slopes
+    first_day = Column(Integer)  # date ordinals, tracked on the "total" bucket
+    last_day = Column(Integer)
+
+class CategoryOverride(Base):
+    """A user's own category for a merchant phrase, learned when they recategorize a transaction."""
+    __tablename__ = "category_overrides"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    phrase = Column(String, primary_key=True)  # normalized merchant words, see services.categorization
+    category = Column(String, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+class CashFlowForecast(Base):
+    """Projected month-end balance for one user, written by the batch forecast (services.cash_flow_forecast)."""
+    __tablename__ = "cash_flow_forecasts"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    as_of = Column(Date, nullable=False)  # last day of history the forecast used
+    month_end = Column(Date, nullable=False)
+    current_balance = Column(Float, nullable=False)  # sum of the user's account balances
+    daily_net = Column(Float, nullable=False)  # smoothed net flow per day
+    upcoming_bills = Column(Float, nullable=False)  # bill reminders due after as_of, up to month_end
+    projected_balance = Column(Float, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+class ReportSnapshot(Base):
+    """Precomputed report + advice for one user, written by the batch report job."""
+    __tablename__ = "report_snapshots"
+    __table_args__ = (UniqueConstraint("run_id", "user_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    report = Column(Text, nullable=False)  # FinancialAnalysis JSON
+    created_at = Column(DateTime, nullable=False)
+
+class ReportBatchCheckpoint(Base):
+    """A user-id chunk that a batch report run has fully written."""
+    __tablename__ = "report_batch_checkpoints"
+
+    run_id = Column(String, primary_key=True)
+    chunk_start = Column(Integer, primary_key=True)
+    completed_at = Column(DateTime, nullable=False)
+
+class DataVersion(Base):
+    """Per-user, per-resource change counter used to derive ETags."""
+    __tablename__ = "data_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    resource = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+
+class CacheInvalidation(Base):
+    """
+    A cache eviction for other worker processes, written in the same DB
+    transaction as the change that caused it (see services.cache_bus).
+    """
+    __tablename__ = "cache_invalidations"
+    # AUTOINCREMENT: ids never go back after old rows are trimmed, so a worker's high-water mark stays valid.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    cache = Column(String, nullable=False)
+    user_id = Column(Integer)  # NULL evicts every user
+    origin = Column(String, nullable=False)  # publishing process; it has already updated its own cache
+    created_at = Column(DateTime, nullable=False, index=True)
+
+class Event(Base):
+    """
+    Append-only log of changes to a user's transactions and account balances,
+    written in the same DB transaction as the change (see services.event_log).
+    Rows are never updated or deleted.
+    """
+    __tablename__ = "events"
+    __table_args__ = (Index("ix_events_user_id", "user_id", "id"),)
+
+    id = Column(Integer, primary_key=True)  # global order of events
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(Integer, nullable=False)  # services.event_log.TRANSACTION_CREATED, ...
+    entity_id = Column(Integer, nullable=False)  # transaction or account id
+    amount = Column(Float)  # transaction amount, or balance delta
+    category = Column(String)
+    occurred_at = Column(DateTime)  # transaction date, or when the balance changed
+    # On TRANSACTION_UPDATED: the transaction's values before the update.
+    previous_amount = Column(Float)
+    previous_category = Column(String)
+    previous_occurred_at = Column(DateTime)
+    description = Column(String)
+    recorded_at = Column(DateTime, nullable=False)
+
+class EventSnapshot(Base):
+    """Projections of a user's events up to and including `event_id`, to start replays from."""
+    __tablename__ = "event_snapshots"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    event_id = Column(Integer, primary_key=True)
+    state = Column(Text, nullable=False)  # JSON object, one entry per projection
+    created_at = Column(DateTime, nullable=False)
+
+class IdempotencyRecord(Base):
+    """
+    Stored response for an Idempotency-Key, or a claim (status_code 0) while
+    the first request with the key is still running.
+    """
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    headers = Column(Text, nullable=False)  # JSON list of [name, value]
+    body = Column(LargeBinary, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class PendingBackfill(Base):
+    """
+    A derived table created on a database that already held transactions;
+    the owning service fills it from existing data (see run_pending_backfill).
+    """
+    __tablename__ = "pending_backfills"
+
+    table_name = Column(String, primary_key=True)
+
+def _sql_default(column):
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is None:
+        return ""
+    if isinstance(default, str):
+        return " DEFAULT '%s'" % default.replace("'", "''")
+    return f" DEFAULT {default}"
+
+# Tables maintained at write time from transactions and budgets. Created on
+# a database with existing history, they start empty and must be filled once.
+DERIVED_TABLES = ("budget_spend", "daily_rollups", "spending_pattern_buckets")
+
+def upgrade_schema(existing_tables=None):
+    """
+    Bring an existing database up to the current models. create_all only
+    creates missing tables, so add any new columns and indexes on tables that
+    already exist. Only additive changes are handled.
+
+    `existing_tables` are the tables from before create_all; derived tables
+    that were just created next to existing transactions are marked for a
+    backfill.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        if existing_tables is not None and "transactions" in existing_tables:
+            for table_name in DERIVED_TABLES:
+                if table_name not in existing_tables:
+                    connection.execute(
+                        PendingBackfill.__table__.insert().prefix_with("OR IGNORE").values(table_name=table_name)
+                    )
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{_sql_default(column)}"
+                    ))
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+
+# Full-text index over transaction descriptions (see services.transaction_search).
+# External content: the index stores only tokens and reads rows back from the
+# view; the triggers keep it in step with every insert, update and delete.
+# `owner` holds one token per row ("u<user_id>"), so a search is narrowed to
+# one user inside the index rather than after matching every user's rows.
+TRANSACTION_SEARCH_DDL = [
+    """CREATE VIEW IF NOT EXISTS transactions_fts_source AS
+        SELECT id, description, 'u' || user_id AS owner FROM transactions""",
+    """CREATE VIRTUAL TABLE transactions_fts USING fts5(
+        description, owner, content='transactions_fts_source', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts(rowid, description, owner) VALUES (new.id, new.description, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, owner)
+        VALUES ('delete', old.id, old.description, 'u' || old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF id, user_id, description ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, owner)
+        VALUES ('delete', old.id, old.description, 'u' || old.user_id);
+        INSERT INTO transactions_fts(rowid, description, owner) VALUES (new.id, new.description, 'u' || new.user_id);
+    END""",
+]
+
+def create_search_index():
+    """Create the FTS5 index and its triggers if missing, indexing any existing transactions."""
+    if not DATABASE_URL.startswith("sqlite"):
+        return
+    with engine.begin() as connection:
+        created = not inspect(connection).has_table("transactions_fts")
+        for statement in TRANSACTION_SEARCH_DDL:
+            if created or not statement.startswith("CREATE VIRTUAL TABLE"):
+                connection.execute(text(statement))
+        if created:
+            connection.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+
+def run_pending_backfill(table_name, backfill):
+    """
+    Fill `table_name` with `backfill(session)` if upgrade_schema marked it,
+    clearing the mark in the same transaction. Called by the owning service
+    when it is imported; when several processes start together, one of them
+    does the work.
+    """
+    db = SessionLocal()
+    try:
+        if db.query(PendingBackfill).filter(PendingBackfill.table_name == table_name).first() is None:
+            return
+        try:
+            claimed = db.query(PendingBackfill).filter(PendingBackfill.table_name == table_name).delete()
+        except OperationalError:  # another process holds the write lock, most likely for this backfill
+            db.rollback()
+            return
+        if claimed:
+            backfill(db)
+            db.commit()
+        else:
+            db.rollback()
+    finally:
+        db.close()
 
+_existing_tables = set(inspect(engine).get_table_names())
 Base.metadata.create_all(bind=engine)
+upgrade_schema(_existing_tables)
+create_search_index()
@@ -1,16 +1,70 @@
-from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List
-from datetime import datetime
+import hmac
+import os
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from typing import Any, Callable, Dict, List, Literal, Optional
+from datetime import date, datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from database import SessionLocal, engine, User, Transaction, Account, BillReminder, Budget
-from agents.financial_agent import FinancialAgent, FinancialData, FinancialReport
+from database import SessionLocal, engine, User, Transaction, Account, BillReminder, Budget, CashFlowForecast
+from agents.financial_agent import (
+    FinancialAgent, FinancialReport, FinancialAnalysis, MonthEndForecast, TransactionBatch,
+    TrustedFinancialData, REPORT_SECTIONS, REPORT_SECTION_FIELDS
+)
+from utils.responses import json_bytes_response, model_json_bytes, negotiate_encoding
+from utils.batch import MAX_BATCH_SIZE, READ_METHODS, batch_cached, run_batch
+from utils import query_instrumentation, sms_commands
+from middlewares.idempotency import IdempotencyMiddleware
+from middlewares.traffic_capture import DEFAULT_CAPTURE_PATH, TrafficCaptureMiddleware
+from middlewares.query_stats import QueryStatsMiddleware
+from middlewares.profiling import DEFAULT_MAX_PROFILES, DEFAULT_PROFILE_DIR, ProfiledRoute, ProfileStore, ProfilingMiddleware
+from services import (
+    balance_ledger, budget_tracker, cache_bus, categorization, data_versions, event_log, recurring_payments,
+    reminder_scheduler, spending_patterns, transaction_search, transfers, windowed_analytics
+)
 
 app = FastAPI()
+# Lets a profiled request reach into sync endpoints' worker threads (one ContextVar lookup per call otherwise).
+app.router.route_class = ProfiledRoute
+# Mobile clients retry POSTs on timeout; replay the first response for a repeated Idempotency-Key.
+app.add_middleware(IdempotencyMiddleware, paths=["/transactions/", "/accounts/", "/bill_reminders/", "/budgets/", "/transfers/"])
+# Count each request's SQL queries; SQL_DEBUG=1 also returns them as X-DB-* response headers.
+app.add_middleware(QueryStatsMiddleware, debug_headers=os.getenv("SQL_DEBUG", "0") == "1")
+# Record a sample of real traffic for `python -m benchmarks.replay_traffic`.
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "0"))
+if TRAFFIC_CAPTURE_SAMPLE_RATE > 0:
+    app.add_middleware(TrafficCaptureMiddleware, path=os.getenv("TRAFFIC_CAPTURE_PATH", DEFAULT_CAPTURE_PATH),
+                       sample_rate=TRAFFIC_CAPTURE_SAMPLE_RATE)
+# Profile a request on demand (X-Profile-Token header or ?profile=<token>) or a random 1-in-N sample.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_SAMPLE_EVERY = int(os.getenv("PROFILING_SAMPLE_EVERY", "0"))
+profile_store = ProfileStore(os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR), int(os.getenv("PROFILE_MAX_FILES", DEFAULT_MAX_PROFILES)))
+if PROFILING_TOKEN or PROFILING_SAMPLE_EVERY:
+    app.add_middleware(ProfilingMiddleware, store=profile_store, token=PROFILING_TOKEN, sample_every=PROFILING_SAMPLE_EVERY)
 financial_agent = FinancialAgent()
+# Only one process should send reminders; enable it on a single worker (or run
+# `python -m services.reminder_scheduler` separately). It follows reminders
+# written by the other workers through the cache bus.
+bill_reminder_scheduler = reminder_scheduler.create_scheduler()
+RUN_REMINDER_SCHEDULER = os.getenv("RUN_REMINDER_SCHEDULER", "0") == "1"
 
-def get_db():
+async def get_db(request: Request):
+    batch = request.scope.get("batch")
+    if batch is not None and request.method not in READ_METHODS:
+        # Write sub-requests of a POST /batch share one session, one route at a
+        # time, each in a savepoint. A route's commit() releases its savepoint;
+        # what it did not commit (a failed write included) is rolled back.
+        # Reads take their own session below and run in parallel.
+        async with batch.lock:
+            savepoint = batch.session.begin_nested()
+            try:
+                yield batch.session
+            finally:
+                if batch.session.get_nested_transaction() is savepoint:
+                    savepoint.rollback()
+                batch.session.commit()
+        return
     db = SessionLocal()
     try:
         yield db
@@ -24,30 +78,129 @@ class UserCreate(BaseModel):
 class TransactionCreate(BaseModel):
     amount: float
     description: str
-    category: str
+    category: Optional[str] = None  # derived from the description when omitted
     date: datetime
 
+class TransactionRecategorize(BaseModel):
+    category: str = Field(..., min_length=1)
+    learn: bool = True  # apply this category to the merchant's future transactions
+
 class AccountCreate(BaseModel):
     name: str
     balance: float
     type: str
 
+class BalanceAdjustment(BaseModel):
+    amount: float
+    description: Optional[str] = None
+
+class TransferCreate(BaseModel):
+    from_account_id: int
+    to_account_id: int
+    amount: float
+
 class BillReminderCreate(BaseModel):
     description: str
     amount: float
     due_date: datetime
 
+class BillReminderReschedule(BaseModel):
+    remind_at: datetime
+
+class SmsMessage(BaseModel):
+    body: str
+
 class CreditScoreUpdate(BaseModel):
     credit_score: int
 
 class BudgetCreate(BaseModel):
     category: str
     amount: float
+    period: Literal["monthly", "weekly"] = "monthly"
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: Literal["GET", "POST", "PUT", "DELETE"] = "GET"
+    url: str
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+@app.on_event("startup")
+def start_reminder_scheduler():
+    if RUN_REMINDER_SCHEDULER:
+        reminder_scheduler.start_scheduler(bill_reminder_scheduler)
+
+@app.on_event("shutdown")
+def stop_reminder_scheduler():
+    bill_reminder_scheduler.stop()
+
+# Every worker applies the cache evictions published by the others.
+@app.on_event("startup")
+def start_cache_bus():
+    cache_bus.bus.start()
+
+@app.on_event("shutdown")
+def stop_cache_bus():
+    cache_bus.bus.stop()
+
+def check_not_modified(request: Request, db: Session, user_id: int, resource: str, *variant,
+                       weak: bool = False, exists: Callable[[], bool] = None):
+    """
+    Compute the resource's ETag from its data version (one PK lookup) and
+    return (etag, 304 response) when the client's copy is still current.
+    `exists` is only consulted for `If-None-Match: *`.
+    """
+    version = batch_cached(
+        request.scope, ("version", user_id, resource), lambda: data_versions.current_version(db, user_id, resource)
+    )
+    etag = data_versions.make_etag(user_id, resource, version, *variant, weak=weak)
+    if data_versions.etag_matches(request.headers.get("if-none-match"), etag, exists):
+        return etag, Response(status_code=304, headers={"ETag": etag})
+    return etag, None
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Financial API"}
 
+@app.get("/metrics/queries", response_model=List[dict])
+def get_query_metrics():
+    """Per-route SQL query counts and DB time since startup."""
+    return query_instrumentation.metrics.snapshot()
+
+def require_profiling_token(x_profile_token: Optional[str] = Header(None)):
+    if not PROFILING_TOKEN or not x_profile_token or not hmac.compare_digest(x_profile_token, PROFILING_TOKEN):
+        raise HTTPException(status_code=403, detail="Profiling access denied")
+
+@app.get("/profiles", response_model=List[dict], dependencies=[Depends(require_profiling_token)])
+def list_profiles():
+    return profile_store.list()
+
+@app.get("/profiles/{profile_id}/{kind}", dependencies=[Depends(require_profiling_token)])
+def download_profile(profile_id: str, kind: Literal["pstats", "collapsed"]):
+    """Download a capture: `pstats` for pstats/snakeviz, `collapsed` for flamegraph.pl/speedscope."""
+    path = profile_store.path(profile_id, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/octet-stream" if kind == "pstats" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=f"{profile_id}.{kind}")
+
+@app.post("/batch")
+async def batch(batch_request: BatchRequest, request: Request):
+    """
+    Run several API requests in one round trip. Each item is dispatched
+    in-process through the regular routes and gets its own status, headers
+    and body in `responses`, in request order.
+    """
+    db = SessionLocal()
+    try:
+        body = await run_batch(app, request.scope, [item.model_dump() for item in batch_request.requests], db)
+    finally:
+        db.close()
+    return json_bytes_response(request, body, compress=True)
+
 @app.post("/users/", response_model=dict)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db_user = User(username=user.username, hashed_password=user.password)  # In real app, hash the password
@@ -58,30 +211,196 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
 
 @app.post("/transactions/", response_model=dict)
 def create_transaction(transaction: TransactionCreate, db: Session = Depends(get_db)):
+    if not transaction.category:
+        transaction.category = categorization.categorize(db, 1, transaction.description)  # Hardcoded user_id for simplicity
     db_transaction = Transaction(**transaction.dict(), user_id=1)  # Hardcoded user_id for simplicity
     db.add(db_transaction)
+    event_log.record_transaction_created(db, db_transaction)
+    budget_alerts = budget_tracker.record_expense(db, 1, transaction.category, transaction.amount, transaction.date)
+    windowed_analytics.record_transaction(db, 1, transaction.amount, transaction.category, transaction.date)
+    spending_patterns.record_transaction(db, 1, transaction.amount, transaction.category, transaction.date)
+    detected_reminders = recurring_payments.record_transaction(
+        db, 1, transaction.description, transaction.amount, transaction.date, transaction_id=db_transaction.id  # flushed by the event log
+    )
+    data_versions.bump(db, 1, data_versions.ANALYSIS, data_versions.BUDGETS)
     db.commit()
     db.refresh(db_transaction)
-    return {"id": db_transaction.id, "description": db_transaction.description}
+    windowed_analytics.observe_transaction(1, transaction.amount, transaction.category, transaction.date)
+    budget_tracker.send_alerts(budget_alerts)
+    if bill_reminder_scheduler.running:
+        for reminder in detected_reminders:
+            bill_reminder_scheduler.schedule(reminder.id, reminder.remind_at)
+    return {"id": db_transaction.id, "description": db_transaction.description, "category": db_transaction.category}
+
+@app.put("/transactions/{transaction_id}/category", response_model=dict)
+def recategorize_transaction(transaction_id: int, recategorize: TransactionRecategorize, db: Session = Depends(get_db)):
+    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    old_category, new_category = transaction.category, recategorize.category
+    budget_alerts = []
+    if new_category != old_category:
+        transaction.category = new_category
+        event_log.record_transaction_updated(db, transaction, transaction.amount, old_category, transaction.date)
+        if transaction.amount is not None and transaction.date is not None:
+            budget_alerts = budget_tracker.move_expense(
+                db, transaction.user_id, old_category, new_category, transaction.amount, transaction.date
+            )
+            windowed_analytics.move_transaction(
+                db, transaction.user_id, transaction.amount, old_category, new_category, transaction.date
+            )
+            spending_patterns.move_transaction(
+                db, transaction.user_id, transaction.amount, old_category, new_category, transaction.date
+            )
+        data_versions.bump(db, transaction.user_id, data_versions.ANALYSIS, data_versions.BUDGETS)
+    learned = categorization.learn_override(db, transaction.user_id, transaction.description, new_category) if recategorize.learn else None
+    db.commit()
+    if new_category != old_category:
+        windowed_analytics.invalidate(transaction.user_id)
+    if learned:
+        categorization.invalidate(transaction.user_id)
+    budget_tracker.send_alerts(budget_alerts)
+    return {"id": transaction.id, "category": transaction.category, "learned_phrase": learned}
+
+@app.get("/transactions/search", response_model=List[dict])
+def search_transactions(
+    q: str = Query(..., min_length=1, description="Words to find in descriptions; end a word with * to match it as a prefix"),
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include"),
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    order: Literal["relevance", "date"] = "relevance",
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    try:
+        return transaction_search.search(
+            db, 1, q,  # Hardcoded user_id for simplicity
+            start_date=datetime.combine(start_date, datetime.min.time()) if start_date else None,
+            end_date=datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None,
+            category=category, min_amount=min_amount, max_amount=max_amount, order=order, limit=limit, offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @app.post("/accounts/", response_model=dict)
 def create_account(account: AccountCreate, db: Session = Depends(get_db)):
-    db_account = Account(**account.dict(), user_id=1)  # Hardcoded user_id for simplicity
+    db_account = Account(name=account.name, type=account.type, balance=0.0, user_id=1)  # Hardcoded user_id for simplicity
     db.add(db_account)
+    balance_ledger.record_balance_change(db, db_account, account.balance, "opening balance")
+    data_versions.bump(db, 1, data_versions.ANALYSIS)
     db.commit()
     db.refresh(db_account)
     return {"id": db_account.id, "name": db_account.name}
 
+def get_account_or_404(db: Session, account_id: int) -> Account:
+    account = db.query(Account).filter(Account.id == account_id).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return account
+
+@app.post("/accounts/{account_id}/adjustments", response_model=dict)
+def adjust_account_balance(account_id: int, adjustment: BalanceAdjustment, db: Session = Depends(get_db)):
+    try:
+        account, entry = transfers.adjust_balance(db, account_id, adjustment.amount, adjustment.description)
+    except transfers.AccountNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except transfers.TransferConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"id": account.id, "balance": account.balance, "occurred_at": entry.occurred_at}
+
+@app.post("/transfers/", response_model=dict)
+def create_transfer(transfer: TransferCreate, db: Session = Depends(get_db)):
+    try:
+        db_transfer = transfers.transfer_money(db, transfer.from_account_id, transfer.to_account_id, transfer.amount)
+    except transfers.AccountNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except transfers.TransferConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except transfers.TransferError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"id": db_transfer.id, "from_account_id": db_transfer.from_account_id,
+            "to_account_id": db_transfer.to_account_id, "amount": db_transfer.amount}
+
+@app.get("/accounts/{account_id}/balance", response_model=dict)
+def get_account_balance_at(account_id: int, at: Optional[datetime] = None, db: Session = Depends(get_db)):
+    account = get_account_or_404(db, account_id)
+    if at is None:
+        return {"id": account.id, "at": datetime.now(), "balance": account.balance}
+    return {"id": account.id, "at": at, "balance": balance_ledger.balance_at(db, account_id, at)}
+
+@app.get("/accounts/{account_id}/balance_history", response_model=List[dict])
+def get_account_balance_history(
+    account_id: int,
+    start_date: date,
+    end_date: Optional[date] = None,
+    interval: Literal["daily", "weekly"] = "daily",
+    db: Session = Depends(get_db)
+):
+    get_account_or_404(db, account_id)
+    end_date = end_date or date.today()
+    if (end_date - start_date).days > 3660:
+        raise HTTPException(status_code=422, detail="Range too large; use a weekly interval or a shorter range")
+    # Each point is the balance at the end of that day.
+    series = balance_ledger.balance_series(
+        db, account_id,
+        datetime.combine(start_date + timedelta(days=1), datetime.min.time()),
+        datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+        interval
+    )
+    return [{"date": (point - timedelta(days=1)).date(), "balance": balance} for point, balance in series]
+
 @app.post("/bill_reminders/", response_model=dict)
 def create_bill_reminder(bill_reminder: BillReminderCreate, db: Session = Depends(get_db)):
-    db_bill_reminder = BillReminder(**bill_reminder.dict(), user_id=1)  # Hardcoded user_id for simplicity
+    db_bill_reminder = BillReminder(**bill_reminder.dict(), remind_at=bill_reminder.due_date, user_id=1)  # Hardcoded user_id for simplicity
     db.add(db_bill_reminder)
+    data_versions.bump(db, 1, data_versions.BILL_REMINDERS)
+    reminder_scheduler.publish_change(db, 1)
     db.commit()
     db.refresh(db_bill_reminder)
+    if bill_reminder_scheduler.running:
+        bill_reminder_scheduler.schedule(db_bill_reminder.id, db_bill_reminder.remind_at)
     return {"id": db_bill_reminder.id, "description": db_bill_reminder.description}
 
+@app.put("/bill_reminders/{reminder_id}/reschedule", response_model=dict)
+def reschedule_bill_reminder(reminder_id: int, reschedule: BillReminderReschedule, db: Session = Depends(get_db)):
+    reminder = db.query(BillReminder).filter(BillReminder.id == reminder_id).first()
+    if not reminder:
+        raise HTTPException(status_code=404, detail="Bill reminder not found")
+    reminder_scheduler.reschedule(db, reminder, reschedule.remind_at)
+    db.commit()
+    if bill_reminder_scheduler.running:
+        bill_reminder_scheduler.schedule(reminder.id, reminder.remind_at)
+    return {"id": reminder.id, "remind_at": reminder.remind_at}
+
+@app.post("/sms/", response_model=dict)
+def receive_sms(sms: SmsMessage, db: Session = Depends(get_db)):
+    """Inbound SMS from the gateway. Handles "NO <id>" replies to bill reminders: remind again later."""
+    try:
+        command, params = sms_commands.parse_sms_command(sms.body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if command != "no" or not params.get("bill_id", "").isdigit():
+        raise HTTPException(status_code=400, detail="Only 'NO <bill id>' replies are handled")
+    reminder = db.query(BillReminder).filter(
+        BillReminder.id == int(params["bill_id"]), BillReminder.user_id == 1  # Hardcoded user_id for simplicity
+    ).first()
+    if not reminder:
+        raise HTTPException(status_code=404, detail="Bill reminder not found")
+    reply = reminder_scheduler.remind_later(db, reminder)
+    db.commit()
+    if bill_reminder_scheduler.running:
+        bill_reminder_scheduler.schedule(reminder.id, reminder.remind_at)
+    return {"reply": reply}
+
 @app.get("/bill_reminders/", response_model=List[dict])
-def get_bill_reminders(db: Session = Depends(get_db)):
+def get_bill_reminders(request: Request, response: Response, db: Session = Depends(get_db)):
+    etag, not_modified = check_not_modified(request, db, 1, data_versions.BILL_REMINDERS)  # Hardcoded user_id for simplicity
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
     reminders = db.query(BillReminder).filter(BillReminder.user_id == 1).all()  # Hardcoded user_id for simplicity
     return [{"id": r.id, "description": r.description, "amount": r.amount, "due_date": r.due_date} for r in reminders]
 
@@ -91,6 +410,7 @@ def update_credit_score(user_id: int, credit_score_update: CreditScoreUpdate, db
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.credit_score = credit_score_update.credit_score
+    data_versions.bump(db, user_id, data_versions.ANALYSIS)
     db.commit()
     return {"message": "Credit score updated successfully"}
 
@@ -98,61 +418,174 @@ def update_credit_score(user_id: int, credit_score_update: CreditScoreUpdate, db
 def create_budget(budget: BudgetCreate, db: Session = Depends(get_db)):
     db_budget = Budget(**budget.dict(), user_id=1)  # Hardcoded user_id for simplicity
     db.add(db_budget)
+    db.flush()
+    budget_tracker.seed_current_period(db, db_budget)
+    data_versions.bump(db, 1, data_versions.BUDGETS, data_versions.ANALYSIS)
     db.commit()
     db.refresh(db_budget)
-    return {"id": db_budget.id, "category": db_budget.category, "amount": db_budget.amount}
+    return {"id": db_budget.id, "category": db_budget.category, "amount": db_budget.amount, "period": db_budget.period}
 
 @app.get("/budgets/", response_model=List[dict])
-def get_budgets(db: Session = Depends(get_db)):
+def get_budgets(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Utilization is per current period, so the date is part of the representation.
+    etag, not_modified = check_not_modified(request, db, 1, data_versions.BUDGETS, date.today())  # Hardcoded user_id for simplicity
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = etag
     budgets = db.query(Budget).filter(Budget.user_id == 1).all()  # Hardcoded user_id for simplicity
-    return [{"id": b.id, "category": b.category, "amount": b.amount} for b in budgets]
+    utilization = budget_tracker.current_utilization(db, budgets)
+    return [{"id": b.id, "category": b.category, "amount": b.amount, "period": b.period, **utilization[b.id]} for b in budgets]
+
+def resolve_window(period: Optional[str], start_date: Optional[date], end_date: Optional[date]):
+    try:
+        return windowed_analytics.resolve_window(period, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+ANALYSIS_SECTIONS = REPORT_SECTIONS + ("advice", "forecast")
+TRANSACTION_SECTIONS = {"totals", "expense_breakdown", "top_spending_categories", "monthly_reports", "budget_comparisons"}
+
+def parse_sections(include: Optional[str]):
+    if include is None:
+        return None
+    sections = {section.strip() for section in include.split(",") if section.strip()}
+    unknown = sections - set(ANALYSIS_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown sections: {', '.join(sorted(unknown))}")
+    return sections
 
 @app.get("/analyze_finances/{user_id}", response_model=dict)
-def analyze_finances(user_id: int, db: Session = Depends(get_db)):
+def analyze_finances(
+    user_id: int,
+    request: Request,
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include"),
+    period: Optional[str] = Query(None, description="Named window, overrides start/end: " + ", ".join(windowed_analytics.WINDOW_PERIODS)),
+    include: Optional[str] = Query(None, description="Comma-separated sections to compute and return: " + ", ".join(ANALYSIS_SECTIONS) + " (default: all)"),
+    db: Session = Depends(get_db)
+):
+    start_date, end_date = resolve_window(period, start_date, end_date)
+    sections = parse_sections(include)
+    etag, not_modified = check_not_modified(
+        request, db, user_id, data_versions.ANALYSIS,
+        start_date, end_date, date.today(), negotiate_encoding(request.headers.get("accept-encoding")),
+        ",".join(sorted(sections)) if sections is not None else "*",
+        # The report carries its generation time, so only the rest of the body is stable.
+        weak=True, exists=lambda: db.query(User.id).filter(User.id == user_id).first() is not None,
+    )
+    if not_modified:
+        return not_modified
+
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    forecast = None
+    if sections is None or "forecast" in sections:
+        forecast = db.query(CashFlowForecast).filter(CashFlowForecast.user_id == user_id).first()
     
-    transactions = db.query(Transaction).filter(Transaction.user_id == user_id).all()
-    accounts = db.query(Account).filter(Account.user_id == user_id).all()
-    budgets = db.query(Budget).filter(Budget.user_id == user_id).all()
-    
-    financial_data = FinancialData(
+    # Advice reads every report section, so asking for it means computing them all.
+    report_sections = set(REPORT_SECTIONS) if sections is None else sections - {"advice", "forecast"}
+    compute_sections = set(REPORT_SECTIONS) if sections is None or "advice" in sections else report_sections
+
+    # Rows come straight from our own typed columns, so skip per-row Pydantic
+    # validation and hand the agent a columnar batch instead.
+    transaction_rows, accounts, budgets = [], [], []
+    if compute_sections & TRANSACTION_SECTIONS:
+        transaction_query = db.query(
+            Transaction.id, Transaction.amount, Transaction.description, Transaction.category, Transaction.date
+        ).filter(Transaction.user_id == user_id)
+        if start_date:
+            transaction_query = transaction_query.filter(Transaction.date >= datetime.combine(start_date, datetime.min.time()))
+        if end_date:
+            transaction_query = transaction_query.filter(Transaction.date < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+        transaction_rows = transaction_query.all()
+    if "account_balances" in compute_sections:
+        accounts = db.query(Account.name, Account.balance).filter(Account.user_id == user_id).all()
+    if "budget_comparisons" in compute_sections:
+        budgets = db.query(Budget.category, Budget.amount).filter(Budget.user_id == user_id).all()
+
+    financial_data = TrustedFinancialData(
         user_id=str(user_id),
-        transactions=[
-            {
-                "id": str(t.id),
-                "amount": t.amount,
-                "description": t.description,
-                "category": t.category,
-                "date": t.date
-            }
-            for t in transactions
-        ],
-        accounts=[
-            {
-                "id": str(a.id),
-                "name": a.name,
-                "balance": a.balance,
-                "type": a.type
-            }
-            for a in accounts
-        ],
-        budgets=[
-            {
-                "category": b.category,
-                "amount": b.amount
-            }
-            for b in budgets
-        ],
+        transactions=TransactionBatch.from_rows(transaction_rows),
+        account_balances={a.name: a.balance for a in accounts},
+        budgets=[(b.category, b.amount) for b in budgets],
         credit_score=user.credit_score,
         last_updated=datetime.now()
     )
     
-    report = financial_agent.analyze_financial_data(financial_data)
-    advice = financial_agent.generate_advice(report)
-    
-    return {"report": report, "advice": advice}
+    month_end_forecast = MonthEndForecast.model_validate(forecast, from_attributes=True) if forecast else None
+    if sections is None:
+        report = financial_agent.analyze_trusted_data(financial_data)
+        analysis = FinancialAnalysis(report=report, advice=financial_agent.generate_advice(report), forecast=month_end_forecast)
+    else:
+        report = financial_agent.analyze_trusted_data(financial_data, compute_sections)
+        fields = {"forecast": month_end_forecast} if "forecast" in sections else {}
+        if "advice" in sections:
+            fields["advice"] = financial_agent.generate_advice(report)
+            report = FinancialReport.model_construct(
+                user_id=report.user_id, report_date=report.report_date,
+                **{f: getattr(report, f) for section in report_sections for f in REPORT_SECTION_FIELDS[section]}
+            )
+        analysis = FinancialAnalysis.model_construct(report=report, **fields)
+
+    # Multi-year reports are large; dump straight to bytes instead of going
+    # through jsonable_encoder, and compress when the client accepts it.
+    body = model_json_bytes(analysis, exclude_unset=sections is not None)
+    response = json_bytes_response(request, body, compress=True)
+    response.headers["ETag"] = etag
+    return response
+
+@app.get("/analytics/{user_id}/totals", response_model=dict)
+def get_window_totals(
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    period: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    start_date, end_date = resolve_window(period, start_date, end_date)
+    index = windowed_analytics.get_index(db, user_id)
+    start = start_date.toordinal() if start_date else 1
+    end = end_date.toordinal() if end_date else date.max.toordinal()
+    income, expenses = index.totals(start, end)
+    by_category = index.category_totals(start, end)
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "total_income": income,
+        "total_expenses": expenses,
+        "net_savings": income - expenses,
+        "income_breakdown": {category: earned for category, (earned, _) in by_category.items() if earned},
+        "expense_breakdown": {category: spent for category, (_, spent) in by_category.items() if spent},
+    }
+
+@app.get("/analytics/{user_id}/trailing", response_model=List[dict])
+def get_trailing_series(
+    user_id: int,
+    window_days: int = Query(30, ge=1),
+    step_days: int = Query(1, ge=1),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    period: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    start_date, end_date = resolve_window(period, start_date, end_date)
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=364)
+    index = windowed_analytics.get_index(db, user_id)
+    series = index.trailing_series(start_date.toordinal(), end_date.toordinal(), window_days, step_days)
+    return [{"date": date.fromordinal(day), "income": income, "expenses": expenses} for day, income, expenses in series]
+
+@app.get("/analytics/{user_id}/spending_patterns", response_model=dict)
+def get_spending_patterns(user_id: int, db: Session = Depends(get_db)):
+    """Weekday and hour-of-day histograms, average daily spend and category trends, from precomputed aggregates."""
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    return spending_patterns.get_patterns(db, user_id).summary()
 
 if __name__ == "__main__":
     import uvicorn
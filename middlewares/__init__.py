@@ -0,0 +1 @@
+# ASGI middlewares for the root FastAPI app.
@@ -0,0 +1,252 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+The first response for a key is stored and later requests with the same key
+are answered from the store without reaching the route (or the business
+tables).
+
+The `idempotency_keys` table is the store, shared by every worker. Before the
+route runs, the request claims its key with a placeholder row (status 0); the
+primary key lets only one worker win. A duplicate that arrives while the
+first request is still running waits for it instead of racing it: on the
+same worker through an in-process event, on another worker by polling the
+row. The response is written over the claim before it is sent, so a retry
+that reaches any worker, or comes after a restart, gets the replay. A claim
+whose worker died lapses after CLAIM_TIMEOUT. A bounded in-memory LRU with a
+TTL serves repeated replays without a query.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal, IdempotencyRecord
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 24 * 3600  # seconds
+CLAIM_TIMEOUT = 60  # seconds a claim holds a key without a stored response
+CLAIM_POLL_INTERVAL = 0.05  # seconds between checks on a key claimed by another worker
+IN_FLIGHT = 0  # status_code of a claim row
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    expires_at: float  # epoch seconds
+
+class IdempotencyStore:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: int = DEFAULT_TTL, claim_timeout: int = CLAIM_TIMEOUT):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self._memory: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_cached(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._memory.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return stored
+
+    def put_cached(self, key: str, stored: StoredResponse):
+        with self._lock:
+            self._memory[key] = stored
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def claim(self, key: str, fingerprint: str) -> Tuple[bool, Optional[StoredResponse]]:
+        """
+        Claim `key` for a request about to run. Returns (True, None) when the
+        claim was taken, (False, stored) when a response is already stored,
+        and (False, None) while another worker holds the claim.
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            # Expired responses and lapsed claims free their keys.
+            db.query(IdempotencyRecord).filter(IdempotencyRecord.expires_at <= now).delete(synchronize_session=False)
+            claimed = db.execute(IdempotencyRecord.__table__.insert().prefix_with("OR IGNORE").values(
+                key=key, fingerprint=fingerprint, status_code=IN_FLIGHT, headers="[]", body=b"",
+                expires_at=datetime.fromtimestamp(time.time() + self.claim_timeout),
+            )).rowcount
+            db.commit()
+            if claimed:
+                return True, None
+            record = db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).first()
+            if record is None or record.status_code == IN_FLIGHT:
+                return False, None
+            stored = StoredResponse(
+                fingerprint=record.fingerprint,
+                status_code=record.status_code,
+                headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.headers)],
+                body=record.body,
+                expires_at=record.expires_at.timestamp(),
+            )
+            self.put_cached(key, stored)
+            return False, stored
+        except OperationalError:  # busy: treat as claimed elsewhere and check again
+            db.rollback()
+            return False, None
+        finally:
+            db.close()
+
+    def save(self, key: str, stored: StoredResponse):
+        """Store the response over the request's claim, then cache it."""
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).update({
+                "fingerprint": stored.fingerprint,
+                "status_code": stored.status_code,
+                "headers": json.dumps([[name.decode("latin-1"), value.decode("latin-1")] for name, value in stored.headers]),
+                "body": stored.body,
+                "expires_at": datetime.fromtimestamp(stored.expires_at),
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self.put_cached(key, stored)
+
+    def release(self, key: str):
+        """Drop the request's claim without storing a response, so a retry runs the route again."""
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(
+                IdempotencyRecord.key == key, IdempotencyRecord.status_code == IN_FLIGHT
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+class IdempotencyMiddleware:
+    def __init__(self, app, paths: Iterable[str], store: IdempotencyStore = None):
+        """
+        :param paths: Exact request paths whose POSTs honour Idempotency-Key
+        :param store: Response store (defaults to a fresh IdempotencyStore)
+        """
+        self.app = app
+        self.paths = frozenset(paths)
+        self.store = store or IdempotencyStore()
+        self._in_flight: Dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        body, more_messages = await self._read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        # Scope keys to the caller so one client's key cannot replay another's response.
+        caller = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()[:16]
+        key = f"{scope['path']}:{caller}:{idempotency_key.decode('latin-1')}"
+
+        while True:
+            stored = self.store.get_cached(key)
+            if stored is not None:
+                await self._replay(stored, fingerprint, send)
+                return
+            event = self._in_flight.get(key)
+            if event is None:
+                break
+            await event.wait()
+        event = self._in_flight[key] = asyncio.Event()
+
+        try:
+            while True:
+                claimed, stored = await run_in_threadpool(self.store.claim, key, fingerprint)
+                if stored is not None:
+                    await self._replay(stored, fingerprint, send)
+                    return
+                if claimed:
+                    break
+                await asyncio.sleep(CLAIM_POLL_INTERVAL)  # another worker is running it
+
+            captured = {"status": 500, "headers": [], "body": bytearray()}
+            messages = []
+
+            async def capture(message):
+                if message["type"] == "http.response.start":
+                    captured["status"] = message["status"]
+                    captured["headers"] = list(message.get("headers", []))
+                elif message["type"] == "http.response.body":
+                    captured["body"] += message.get("body", b"")
+                messages.append(message)
+
+            saved = False
+            try:
+                await self.app(scope, self._replay_receive(body, more_messages, receive), capture)
+                if captured["status"] < 500:
+                    await run_in_threadpool(self.store.save, key, StoredResponse(
+                        fingerprint=fingerprint,
+                        status_code=captured["status"],
+                        headers=captured["headers"],
+                        body=bytes(captured["body"]),
+                        expires_at=time.time() + self.store.ttl,
+                    ))
+                    saved = True
+            finally:
+                if not saved:
+                    await run_in_threadpool(self.store.release, key)
+            # Sent only once stored, so a client never sees a response a retry would not replay.
+            for message in messages:
+                await send(message)
+        finally:
+            del self._in_flight[key]
+            event.set()
+
+    @staticmethod
+    async def _read_body(receive):
+        chunks, extra = [], []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                extra.append(message)
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks), extra
+
+    @staticmethod
+    def _replay_receive(body: bytes, extra, receive):
+        pending = [{"type": "http.request", "body": body, "more_body": False}] + extra
+
+        async def replay():
+            if pending:
+                return pending.pop(0)
+            return await receive()
+        return replay
+
+    @staticmethod
+    async def _replay(stored: StoredResponse, fingerprint: str, send):
+        if stored.fingerprint != fingerprint:
+            body = b'{"detail":"Idempotency-Key was already used with a different request body"}'
+            await send({"type": "http.response.start", "status": 422, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        await send({"type": "http.response.start", "status": stored.status_code,
+                    "headers": stored.headers + [(b"idempotent-replayed", b"true")]})
+        await send({"type": "http.response.body", "body": stored.body})
@@ -0,0 +1,221 @@
+"""
+Opt-in cProfile capture of individual requests.
+
+A request is profiled when it carries the profiling token (`X-Profile-Token`
+header or `?profile=<token>`), or when it is picked by 1-in-N random
+sampling. Each capture is saved to a rotating directory as a `.pstats` file,
+a flamegraph-compatible `.collapsed` stack file and a `.json` summary.
+
+cProfile only sees the thread it is enabled in. The middleware profiles the
+event-loop side of the request, `ProfiledRoute` profiles sync endpoints in
+their threadpool worker with a second profiler, and the two are merged. One
+request is profiled at a time, because cProfile has a single profiler slot
+per thread. On the event loop, other requests interleaving during awaits
+can show up in the profile.
+
+When a request is not selected, the cost is a header lookup and a random()
+call; with no token and no sampling configured the middleware is not
+installed at all.
+"""
+import asyncio
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_QUERY_PARAM = "profile"
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_MAX_PROFILES = 200
+MAX_STACK_DEPTH = 64
+
+# Profilers of the request being profiled; endpoint threads append their own.
+_active_profiles: ContextVar[Optional[List[cProfile.Profile]]] = ContextVar("active_profiles", default=None)
+
+def new_profile_id() -> str:
+    return datetime.now().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoints profile themselves in their worker thread when asked to."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if call is None or asyncio.iscoroutinefunction(call):
+            return
+
+        def profiled_call(**values):
+            profiles = _active_profiles.get()
+            if profiles is None:
+                return call(**values)
+            profile = cProfile.Profile()
+            profiles.append(profile)
+            with profile:
+                return call(**values)
+        self.dependant.call = profiled_call
+
+def collapsed_stacks(stats: pstats.Stats) -> List[str]:
+    """
+    Approximate call stacks ("a;b;c <microseconds>") from cProfile's caller
+    graph. A function's time is split across its callers in proportion to
+    each caller edge's cumulative time.
+    """
+    entries = stats.stats
+    callees: Dict[tuple, Dict[tuple, float]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees.setdefault(caller, {})[func] = edge_cumulative
+
+    def label(func) -> str:
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    totals: Dict[str, float] = {}
+
+    def visit(func, path: List[str], chain: set, budget: float):
+        _, _, own_time, cumulative, _ = entries[func]
+        ratio = budget / cumulative if cumulative else 0.0
+        path = path + [label(func)]
+        key = ";".join(path)
+        totals[key] = totals.get(key, 0.0) + own_time * ratio
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_cumulative in callees.get(func, {}).items():
+            if callee not in chain and callee in entries:
+                visit(callee, path, chain | {callee}, edge_cumulative * ratio)
+
+    for func, (_, _, _, cumulative, callers) in entries.items():
+        if not callers:
+            visit(func, [], {func}, cumulative)
+    return [f"{stack} {int(seconds * 1e6)}" for stack, seconds in totals.items() if seconds * 1e6 >= 1]
+
+class ProfileStore:
+    """Rotating on-disk store: keeps the newest `max_profiles` captures."""
+
+    def __init__(self, directory: str = DEFAULT_PROFILE_DIR, max_profiles: int = DEFAULT_MAX_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, profiles: List[cProfile.Profile], summary: Dict, profile_id: Optional[str] = None) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = profile_id or new_profile_id()
+        base = os.path.join(self.directory, profile_id)
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w") as f:
+            f.write("\n".join(collapsed_stacks(stats)) + "\n")
+        with open(base + ".json", "w") as f:
+            json.dump({"id": profile_id, **summary}, f)
+        self._rotate()
+        return profile_id
+
+    def _rotate(self):
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for suffix in (".json", ".pstats", ".collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        summaries.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # rotated away or half-written
+        return summaries
+
+    def path(self, profile_id: str, kind: str) -> Optional[str]:
+        if kind not in ("pstats", "collapsed") or os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{kind}")
+        return path if os.path.exists(path) else None
+
+class ProfilingMiddleware:
+    def __init__(self, app, store: ProfileStore, token: Optional[str] = None, sample_every: int = 0,
+                 excluded_prefixes=("/profiles",)):
+        """
+        :param token: Secret that turns profiling on for a request; None disables on-demand profiling
+        :param sample_every: Profile a random 1-in-N of requests; 0 disables sampling
+        """
+        self.app = app
+        self.store = store
+        self.token = token.encode() if token else None
+        self.sample_rate = 1.0 / sample_every if sample_every > 0 else 0.0
+        self.excluded_prefixes = tuple(excluded_prefixes)
+        self._lock = asyncio.Lock()
+
+    def _requested(self, scope) -> bool:
+        if self.token is None:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.token)
+        if PROFILE_QUERY_PARAM.encode() in scope["query_string"]:
+            values = parse_qs(scope["query_string"].decode("latin-1")).get(PROFILE_QUERY_PARAM, [])
+            return any(hmac.compare_digest(value.encode(), self.token) for value in values)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = self._requested(scope)
+        if not requested and (random.random() >= self.sample_rate or scope["path"].startswith(self.excluded_prefixes)):
+            await self.app(scope, receive, send)
+            return
+        if not requested and self._lock.locked():
+            await self.app(scope, receive, send)  # a sampled request never waits for the profiler
+            return
+
+        # Known up front so an on-demand request can be told where its profile went.
+        profile_id = new_profile_id()
+        profile = cProfile.Profile()
+        profiles = [profile]
+        status = {"code": None}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if requested:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        async with self._lock:
+            started = time.perf_counter()
+            context_token = _active_profiles.set(profiles)
+            profile.enable()
+            try:
+                await self.app(scope, receive, capture_send)
+            finally:
+                profile.disable()
+                _active_profiles.reset(context_token)
+                duration = time.perf_counter() - started
+
+        summary = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope["query_string"].decode("latin-1"),
+            "status": status["code"],
+            "duration_ms": round(duration * 1000, 3),
+            "trigger": "requested" if requested else "sampled",
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        await run_in_threadpool(self.store.save, profiles, summary, profile_id)
@@ -0,0 +1,49 @@
+"""
+Per-request SQL query accounting.
+
+Collects the queries a request issues (see `utils.query_instrumentation`),
+adds them to the per-route metrics and logs N+1 suspects. In debug mode the
+numbers are also returned as response headers:
+
+    X-DB-Queries: 4
+    X-DB-Time-ms: 3.21
+    X-DB-N-Plus-One: 1   (number of repeated statement shapes)
+"""
+import logging
+
+from utils.query_instrumentation import QueryStats, current_stats, metrics
+
+logger = logging.getLogger(__name__)
+
+class QueryStatsMiddleware:
+    def __init__(self, app, debug_headers: bool = False):
+        self.app = app
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(parent=current_stats.get())
+        context_token = current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and self.debug_headers:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.total_time * 1000:.2f}".encode()),
+                    (b"x-db-n-plus-one", str(len(stats.n_plus_one_suspects())).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            current_stats.reset(context_token)
+            route = scope.get("route")
+            # Route templates, not raw paths, so the metrics stay bounded.
+            label = f"{scope['method']} {route.path if route is not None else '<unmatched>'}"
+            suspects = stats.n_plus_one_suspects()
+            for shape, count in suspects.items():
+                logger.warning("Possible N+1 in %s: statement ran %d times: %s", label, count, shape)
+            metrics.observe(label, stats, len(suspects))
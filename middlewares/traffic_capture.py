@@ -0,0 +1,141 @@
+"""
+Sampled capture of request/response pairs to JSONL for replay testing.
+
+A sampled request is recorded with its timing, status, sanitized headers and
+bodies. Credentials are never written: auth and cookie headers are dropped
+and JSON fields with sensitive names are redacted. Unsampled requests pay
+one random() call. Sampled requests only buffer raw bytes; decoding, redaction
+and writing happen on a background thread, so a request never waits on disk.
+
+Replay captured traffic with `python -m benchmarks.replay_traffic`.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPTURE_PATH = "captures/traffic.jsonl"
+MAX_STORED_BODY = 64 * 1024  # larger bodies are stored as a hash only
+KEPT_HEADERS = {b"content-type", b"accept", b"if-none-match", b"idempotency-key"}
+SENSITIVE_KEYS = {"password", "hashed_password", "token", "access_token", "refresh_token", "secret",
+                  "api_key", "card_number", "cvv", "ssn", "pin"}
+REDACTED = "[REDACTED]"
+
+def redact(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: REDACTED if k.lower() in SENSITIVE_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+def encode_body(body: bytes, content_type: str) -> Optional[dict]:
+    """Store small JSON/text bodies (JSON redacted); anything else as size + hash."""
+    if not body:
+        return None
+    if len(body) <= MAX_STORED_BODY:
+        if content_type.startswith("application/json"):
+            try:
+                return {"json": redact(json.loads(body))}
+            except ValueError:
+                pass
+        elif content_type.startswith("text/"):
+            return {"text": body.decode("utf-8", "replace")}
+    return {"size": len(body), "sha256": hashlib.sha256(body).hexdigest()}
+
+class CaptureWriter:
+    """Builds records and appends them to a JSONL file from a daemon thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Callable[[], dict]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def write(self, build_record: Callable[[], dict]):
+        self._queue.put(build_record)
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                build_record = self._queue.get()
+                try:
+                    f.write(json.dumps(build_record(), separators=(",", ":"), default=str) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                except Exception:
+                    logger.exception("Failed to write captured request")
+
+class TrafficCaptureMiddleware:
+    def __init__(self, app, path: str = DEFAULT_CAPTURE_PATH, sample_rate: float = 0.01, writer: CaptureWriter = None):
+        """
+        :param path: JSONL file to append captured pairs to
+        :param sample_rate: Fraction of HTTP requests to capture (0-1)
+        """
+        self.app = app
+        self.sample_rate = sample_rate
+        self.writer = writer or CaptureWriter(path)
+
+    async def __call__(self, scope, receive, send):
+        # POST /batch sub-requests are replayed as part of their batch.
+        if scope["type"] != "http" or "batch" in scope or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        request_body = bytearray()
+        response = {"status": None, "headers": [], "body": bytearray()}
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                response["body"].extend(message.get("body", b""))
+            await send(message)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            duration = time.perf_counter() - started
+            self.writer.write(partial(self._record, scope, started_at, duration, bytes(request_body), response))
+
+    @staticmethod
+    def _record(scope, started_at: float, duration: float, request_body: bytes, response: dict) -> dict:
+        request_headers = dict(scope["headers"])
+        response_headers = {name.lower(): value for name, value in response["headers"]}
+        body = bytes(response["body"])
+        if response_headers.get(b"content-encoding") == b"gzip":
+            body = gzip.decompress(body)
+        elif response_headers.get(b"content-encoding"):
+            body = b""  # encodings we cannot decode here are left out
+        return {
+            "ts": started_at,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope["query_string"].decode("latin-1"),
+            "headers": {name.decode("latin-1"): value.decode("latin-1")
+                        for name, value in request_headers.items() if name in KEPT_HEADERS},
+            "request_body": encode_body(request_body, request_headers.get(b"content-type", b"").decode("latin-1")),
+            "status": response["status"],
+            "response_body": encode_body(body, response_headers.get(b"content-type", b"").decode("latin-1")),
+            "duration_ms": round(duration * 1000, 3),
+        }
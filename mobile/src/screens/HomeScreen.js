@@ -37,7 +37,7 @@ const HomeScreen = () => {
 
     const loadDashboardData = async () => {
         try {
-            const data = await fetchDashboardData();
+            const data = await fetchDashboardData(user.id);
             setDashboardData(data);
         } catch (error) {
             console.error('Error fetching dashboard data:', error);
@@ -101,6 +101,14 @@ const HomeScreen = () => {
             
             <BalanceDisplay balance={dashboardData.balance} />
 
+            {/* Month-end projection from the nightly cash-flow forecast */}
+            {dashboardData.forecast && (
+                <Card containerStyle={[styles.card, { backgroundColor: colors.cardBackground }]}>
+                    <Card.Title style={[styles.cardTitle, { color: colors.text }]}>Projected at Month End</Card.Title>
+                    <Text style={{ color: colors.text }}>{formatCurrency(dashboardData.forecast.projected_balance)}</Text>
+                </Card>
+            )}
+
             <Card containerStyle={[styles.card, { backgroundColor: colors.cardBackground }]}> 
                 <Card.Title style={[styles.cardTitle, { color: colors.text }]}>Quick Actions</Card.Title>
                 {/* 13. Navigation to transaction screens */}
@@ -124,6 +132,10 @@ HomeScreen.propTypes = {
         recentTransactions: PropTypes.arrayOf(PropTypes.object).isRequired,
         upcomingBills: PropTypes.arrayOf(PropTypes.object).isRequired,
         financialSummary: PropTypes.object.isRequired,
+        forecast: PropTypes.shape({
+            month_end: PropTypes.string,
+            projected_balance: PropTypes.number,
+        }),
     }),
 };
 
@@ -81,6 +81,28 @@ export const login = async (email, password) => {
     }
 };
 
+// Home screen data. The analysis endpoint computes only the sections asked
+// for, including the month-end projection from the nightly cash-flow forecast
+// (null until the forecast has run for the user).
+export const fetchDashboardData = async (userId) => {
+    const [analysis, bills] = await Promise.all([
+        api.get(`/analyze_finances/${userId}`, { params: { include: 'totals,account_balances,forecast' } }),
+        api.get('/bill_reminders/'),
+    ]);
+    const { report, forecast } = analysis.data;
+    return {
+        balance: Object.values(report.account_balances).reduce((total, balance) => total + balance, 0),
+        recentTransactions: [],
+        upcomingBills: bills.data,
+        financialSummary: {
+            totalIncome: report.total_income,
+            totalExpenses: report.total_expenses,
+            netSavings: report.net_savings,
+        },
+        forecast: forecast ?? null,
+    };
+};
+
 // ... (other API functions)
 
 export default api;
@@ -0,0 +1,64 @@
+"""
+Point-in-time account balances.
+
+Every change to `Account.balance` goes through `record_balance_change`, which
+appends a `balance_entries` row carrying both the delta and the resulting
+balance. Because the log is append-only and written in time order, each entry
+doubles as a checkpoint: the balance at time T is the `balance_after` of the
+last entry at or before T, found with one seek on (account_id, occurred_at).
+Downsampled series are one such seek per point, independent of how many
+entries fall between points.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import Account, BalanceEntry
+from services import event_log
+
+SERIES_INTERVALS = {"daily": timedelta(days=1), "weekly": timedelta(days=7)}
+
+def _last_entry(db: Session, account_id: int) -> Optional[BalanceEntry]:
+    return db.query(BalanceEntry).filter(BalanceEntry.account_id == account_id).order_by(
+        BalanceEntry.occurred_at.desc(), BalanceEntry.id.desc()
+    ).first()
+
+def record_balance_change(db: Session, account: Account, delta: float, reason: str = None,
+                          when: datetime = None) -> BalanceEntry:
+    """
+    Apply `delta` to the account and append the matching ledger entry and
+    balance_adjusted event. The caller commits, so all three land in the same
+    DB transaction.
+    """
+    when = when or datetime.now()
+    if account.id is None:
+        db.flush()
+    current = account.balance or 0.0
+    if current and _last_entry(db, account.id) is None:
+        # Account predates the ledger: record its balance as an opening entry.
+        db.add(BalanceEntry(account_id=account.id, occurred_at=when, delta=current,
+                            balance_after=current, reason="opening balance"))
+    account.balance = current + delta
+    entry = BalanceEntry(account_id=account.id, occurred_at=when, delta=delta,
+                         balance_after=account.balance, reason=reason)
+    db.add(entry)
+    event_log.record_balance_adjusted(db, account, delta, reason, when)
+    return entry
+
+def balance_at(db: Session, account_id: int, at: datetime) -> float:
+    row = db.query(BalanceEntry.balance_after).filter(
+        BalanceEntry.account_id == account_id, BalanceEntry.occurred_at <= at
+    ).order_by(BalanceEntry.occurred_at.desc(), BalanceEntry.id.desc()).first()
+    return row.balance_after if row else 0.0
+
+def balance_series(db: Session, account_id: int, start: datetime, end: datetime,
+                   interval: str = "daily") -> List[Tuple[datetime, float]]:
+    """End-of-bucket balances from start to end, one indexed seek per point."""
+    step = SERIES_INTERVALS[interval]
+    series = []
+    point = start
+    while point <= end:
+        series.append((point, balance_at(db, account_id, point)))
+        point += step
+    return series
@@ -0,0 +1,136 @@
+"""
+Write-time budget tracking.
+
+Each budget keeps a running spend counter per period in `budget_spend`. The
+counter is bumped in the same DB transaction as the expense that caused it,
+so checking a budget never needs a rescan of the user's transactions.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import Budget, BudgetSpend, Transaction, run_pending_backfill
+from utils.alert_system import budget_exceeded_alert
+
+BUDGET_PERIODS = ("monthly", "weekly")
+BUDGET_ALERT_THRESHOLDS = (0.8, 1.0)
+
+def period_start(period: str, when: datetime) -> datetime:
+    day = datetime(when.year, when.month, when.day)
+    if period == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def period_end(period: str, start: datetime) -> datetime:
+    if period == "weekly":
+        return start + timedelta(days=7)
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+def _add_spend(db: Session, budget: Budget, amount: float, when: datetime) -> Tuple[BudgetSpend, float]:
+    """Increment the budget's counter for the period containing `when`; returns (counter, new total)."""
+    start = period_start(budget.period, when)
+    updated = db.query(BudgetSpend).filter(
+        BudgetSpend.budget_id == budget.id, BudgetSpend.period_start == start
+    ).update({BudgetSpend.spent: BudgetSpend.spent + amount}, synchronize_session=False)
+    if not updated:
+        db.add(BudgetSpend(budget_id=budget.id, period_start=start, spent=amount, alerted_threshold=0.0))
+        db.flush()
+    counter = db.query(BudgetSpend).filter(
+        BudgetSpend.budget_id == budget.id, BudgetSpend.period_start == start
+    ).populate_existing().one()
+    return counter, counter.spent
+
+def record_expense(db: Session, user_id: int, category: str, amount: float, when: datetime) -> List[Tuple[str, float, float, float]]:
+    """
+    Update counters for every budget covering this expense. Must be called
+    before the caller commits so the counter and the transaction land together.
+
+    :return: Alerts to send once the transaction has committed, as
+             (category, spent, budget, threshold) tuples
+    """
+    if amount >= 0:
+        return []
+
+    alerts = []
+    budgets = db.query(Budget).filter(Budget.user_id == user_id, Budget.category == category).all()
+    for budget in budgets:
+        counter, spent = _add_spend(db, budget, abs(amount), when)
+        if not budget.amount or budget.amount <= 0:
+            continue
+        crossed = max((t for t in BUDGET_ALERT_THRESHOLDS if spent >= t * budget.amount), default=0.0)
+        if crossed > counter.alerted_threshold:
+            counter.alerted_threshold = crossed
+            alerts.append((budget.category, spent, budget.amount, crossed))
+    return alerts
+
+def move_expense(db: Session, user_id: int, old_category: str, new_category: str, amount: float,
+                 when: datetime) -> List[Tuple[str, float, float, float]]:
+    """
+    Move an already recorded expense from one category's budgets to
+    another's, e.g. after a recategorization. Must be called before the
+    caller commits.
+
+    :return: Alerts for the new category's budgets, as from record_expense
+    """
+    if amount >= 0:
+        return []
+    for budget in db.query(Budget).filter(Budget.user_id == user_id, Budget.category == old_category).all():
+        db.query(BudgetSpend).filter(
+            BudgetSpend.budget_id == budget.id, BudgetSpend.period_start == period_start(budget.period, when)
+        ).update({BudgetSpend.spent: BudgetSpend.spent - abs(amount)}, synchronize_session=False)
+    return record_expense(db, user_id, new_category, amount, when)
+
+def send_alerts(alerts: List[Tuple[str, float, float, float]]):
+    for category, spent, budget, threshold in alerts:
+        budget_exceeded_alert(category, spent, budget, threshold)
+
+def seed_current_period(db: Session, budget: Budget, now: datetime = None):
+    """Start a new budget's counter from the expenses already recorded in the current period."""
+    start = period_start(budget.period, now or datetime.now())
+    spent = db.query(func.coalesce(func.sum(-Transaction.amount), 0.0)).filter(
+        Transaction.user_id == budget.user_id,
+        Transaction.category == budget.category,
+        Transaction.amount < 0,
+        Transaction.date >= start,
+        Transaction.date < period_end(budget.period, start),
+    ).scalar()
+    db.add(BudgetSpend(budget_id=budget.id, period_start=start, spent=spent, alerted_threshold=0.0))
+
+def seed_current_periods(db: Session, now: datetime = None) -> int:
+    """Seed the current-period counter of every budget that has none; returns how many were seeded."""
+    now = now or datetime.now()
+    seeded = 0
+    for budget in db.query(Budget).all():
+        start = period_start(budget.period, now)
+        exists = db.query(BudgetSpend.id).filter(
+            BudgetSpend.budget_id == budget.id, BudgetSpend.period_start == start
+        ).first()
+        if exists is None:
+            seed_current_period(db, budget, now)
+            seeded += 1
+    return seeded
+
+def current_utilization(db: Session, budgets: List[Budget], now: datetime = None) -> Dict[int, Dict]:
+    """Current-period spend for each budget, read straight from the counters."""
+    now = now or datetime.now()
+    starts = {budget.id: period_start(budget.period, now) for budget in budgets}
+    counters = db.query(BudgetSpend.budget_id, BudgetSpend.period_start, BudgetSpend.spent).filter(
+        BudgetSpend.budget_id.in_(list(starts)),
+        BudgetSpend.period_start.in_(set(starts.values())),
+    ).all()
+    spent_by_budget = {c.budget_id: c.spent for c in counters if starts[c.budget_id] == c.period_start}
+
+    utilization = {}
+    for budget in budgets:
+        spent = spent_by_budget.get(budget.id, 0.0)
+        utilization[budget.id] = {
+            "period_start": starts[budget.id],
+            "spent": spent,
+            "utilization": spent / budget.amount if budget.amount else None,
+        }
+    return utilization
+
+# Budgets that existed before budget_spend did.
+run_pending_backfill("budget_spend", seed_current_periods)
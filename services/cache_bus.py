@@ -0,0 +1,194 @@
+"""
+Cross-worker invalidation for in-process caches, without a broker.
+
+Some caches live in process memory: the per-user windowed-analytics indexes
+and the per-user category-override automata. With several uvicorn workers,
+a write only updates the caches of the worker that handled it. So the writer
+also publishes an eviction: a `cache_invalidations` row, added in the same
+DB transaction as the change, which becomes visible exactly when the change
+does.
+
+Every worker watches the database with `PRAGMA data_version`. The value
+changes whenever another connection commits, and reading it does no I/O.
+When it moves, the worker reads the rows past its high-water mark and calls
+the subscribed caches' `invalidate(user_id)`, skipping its own rows. A
+background thread polls every POLL_INTERVAL_MS, so evictions land within
+milliseconds. Caches also call `sync_for_read()` before serving an entry,
+so a read that starts after a write committed in any worker never sees the
+entry that write replaced.
+
+The pollers trim rows older than RETENTION. A worker that has fallen
+further behind than that notices the gap in the id sequence and drops
+every cache.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database import CacheInvalidation, engine
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_MS = float(os.getenv("CACHE_BUS_POLL_MS", "5"))
+RETENTION = timedelta(minutes=5)
+TRIM_INTERVAL = 30.0  # seconds between trims of old rows
+
+Invalidate = Callable[[Optional[int]], None]
+
+def _database_path() -> Optional[str]:
+    if engine.url.get_backend_name() != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return None
+    return engine.url.database
+
+class CacheBus:
+    def __init__(self, database_path: Optional[str] = None, poll_interval_ms: float = POLL_INTERVAL_MS):
+        self.database_path = database_path if database_path is not None else _database_path()
+        self.poll_interval = poll_interval_ms / 1000
+        self.check_on_read = True
+        self._subscribers: Dict[str, List[Invalidate]] = {}
+        self._token = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version = None
+        self._last_id = 0
+        self._last_trim = 0.0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def origin(self) -> str:
+        # The pid keeps forked workers apart even though they share the token.
+        return f"{os.getpid()}-{self._token}"
+
+    @property
+    def running(self) -> bool:
+        return self._connection is not None
+
+    def subscribe(self, cache: str, invalidate: Invalidate):
+        """Call `invalidate(user_id)` (None: every user) when another worker publishes for `cache`."""
+        self._subscribers.setdefault(cache, []).append(invalidate)
+
+    def publish(self, db: Session, cache: str, user_id: Optional[int] = None):
+        """
+        Evict `user_id`'s entry (or every entry) of `cache` in the other
+        workers. Call before the caller commits; update this worker's cache
+        as usual.
+        """
+        db.execute(CacheInvalidation.__table__.insert().values(
+            cache=cache, user_id=user_id, origin=self.origin, created_at=datetime.now()
+        ))
+
+    def start(self):
+        if self.running:
+            return
+        if not self.database_path:
+            logger.warning("Cache bus needs a file-backed SQLite database; cross-worker invalidation is off")
+            return
+        connection = sqlite3.connect(self.database_path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            # data_version first: a commit between the two reads is then seen as a change.
+            self._data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+            self._last_id = connection.execute("SELECT coalesce(max(id), 0) FROM cache_invalidations").fetchone()[0]
+            self._connection = connection
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def sync(self) -> int:
+        """Apply the evictions other workers have committed so far. Returns how many were applied."""
+        if self._connection is None:
+            return 0
+        with self._lock:
+            # Evictions are applied under the lock, so a concurrent caller
+            # cannot return (and read a cache) before they have landed.
+            connection = self._connection
+            if connection is None:
+                return 0
+            data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return 0
+            self._data_version = data_version
+            # One read transaction, so the rows and the sequence come from the same snapshot.
+            connection.execute("BEGIN")
+            try:
+                rows = connection.execute(
+                    "SELECT id, cache, user_id, origin FROM cache_invalidations WHERE id > ? ORDER BY id", (self._last_id,)
+                ).fetchall()
+                sequence = connection.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = 'cache_invalidations'"
+                ).fetchone()
+            finally:
+                connection.execute("COMMIT")
+            if sequence is not None and sequence[0] > self._last_id and (not rows or rows[0][0] > self._last_id + 1):
+                # Rows we never saw were trimmed: we cannot tell what to evict.
+                logger.warning("Cache bus fell behind the trimmed log; dropping every cache")
+                self._last_id = sequence[0]
+                self._apply_all()
+                return 1
+            if not rows:
+                return 0
+            self._last_id = rows[-1][0]
+            origin = self.origin
+            applied = 0
+            for _, cache, user_id, row_origin in rows:
+                if row_origin != origin:
+                    applied += self._apply(cache, user_id)
+            return applied
+
+    def sync_for_read(self):
+        """Called by caches before serving an entry."""
+        if self.check_on_read:
+            self.sync()
+
+    def _apply(self, cache: str, user_id: Optional[int]) -> int:
+        for invalidate in self._subscribers.get(cache, ()):
+            try:
+                invalidate(user_id)
+            except Exception:
+                logger.exception(f"Failed to invalidate {cache} for user {user_id}")
+        return 1
+
+    def _apply_all(self):
+        for cache in self._subscribers:
+            self._apply(cache, None)
+
+    def _trim(self):
+        cutoff = (datetime.now() - RETENTION).strftime("%Y-%m-%d %H:%M:%S.%f")  # SQLAlchemy's DateTime format
+        # A connection of its own that never waits for the write lock, so a
+        # trim cannot hold up sync() and the cached reads behind it.
+        connection = sqlite3.connect(self.database_path, timeout=0, isolation_level=None)
+        try:
+            connection.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (cutoff,))
+        except sqlite3.OperationalError as e:  # busy: another worker is writing; try again next time
+            logger.info(f"Cache bus trim skipped: {e}")
+        finally:
+            connection.close()
+
+    def _run(self):
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                self.sync()
+                if time.monotonic() - self._last_trim > TRIM_INTERVAL:
+                    self._last_trim = time.monotonic()
+                    self._trim()
+            except Exception:
+                logger.exception("Cache bus poll failed")
+
+bus = CacheBus()
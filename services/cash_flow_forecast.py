@@ -0,0 +1,180 @@
+"""
+Month-end balance forecasts for every user, computed in vectorized batches.
+
+Users are processed in id-range chunks. For each chunk the daily net flows
+(income - expenses) of the last HISTORY_DAYS days are read from
+`daily_rollups` into a users x days NumPy matrix, and simple exponential
+smoothing runs over every user at once. Its closed form is a weighted sum of
+the columns, so the smoothed level of the whole chunk is one matrix-vector
+product.
+
+The history already contains the user's bills, spread by the smoothing into
+the daily level at their average rate. Known bills (`bill_reminders`, including
+the ones created by the recurring-payment detector) replace that average with
+their actual due dates:
+
+    projected_balance = current_balance + days_left * daily_net
+                        - (bills due by month end - monthly bills * days_left / 30.44)
+
+Forecasts are written to `cash_flow_forecasts`, one row per user, and read by
+the analysis endpoint. Run nightly with:
+    python -m services.cash_flow_forecast --run
+"""
+import argparse
+import calendar
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, User
+from services import data_versions
+
+HISTORY_DAYS = 90
+# Smoothing factor for a 60-day span (alpha = 2 / (span + 1)): long enough to
+# average out monthly lumps such as paychecks and rent.
+SMOOTHING = 2 / 61
+DAYS_PER_MONTH = 30.44
+DEFAULT_CHUNK_SIZE = 100_000
+
+def month_end(day: date) -> date:
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+def smoothing_weights(days: int, alpha: float = SMOOTHING) -> np.ndarray:
+    """
+    Weights w such that flows @ w is the exponentially smoothed level after
+    the last of `days` columns, with the level started at the first column.
+    """
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (days - 1)
+    return weights
+
+def project(flows: np.ndarray, balances: np.ndarray, bills_due: np.ndarray, monthly_bills: np.ndarray,
+            days_left: int, weights: Optional[np.ndarray] = None):
+    """
+    Vectorized forecast for a chunk of users.
+
+    :param flows: users x days matrix of daily net flows, oldest day first
+    :return: (daily_net, projected_balance) arrays, one entry per user
+    """
+    if weights is None:
+        weights = smoothing_weights(flows.shape[1])
+    daily_net = flows @ weights
+    projected = balances + days_left * daily_net - (bills_due - monthly_bills * (days_left / DAYS_PER_MONTH))
+    return daily_net, projected
+
+# The chunk queries and the upsert go straight through the session's DBAPI
+# cursor: at a million users, building SQLAlchemy rows and processing bound
+# parameters per row would cost more than SQLite itself.
+_FLOWS_SQL = """SELECT user_id, CAST(julianday(day) - julianday(?) AS INTEGER), income - expense
+    FROM daily_rollups WHERE user_id BETWEEN ? AND ? AND day BETWEEN ? AND ?"""
+_BALANCES_SQL = "SELECT user_id, sum(balance) FROM accounts WHERE user_id BETWEEN ? AND ? GROUP BY user_id"
+_BILLS_SQL = """SELECT user_id, CAST(julianday(due_date) - julianday(?) AS INTEGER), amount FROM bill_reminders
+    WHERE user_id BETWEEN ? AND ? AND due_date >= ? AND due_date < ? AND amount IS NOT NULL"""
+_FORECAST_COLUMNS = ("user_id", "as_of", "month_end", "current_balance", "daily_net", "upcoming_bills",
+                     "projected_balance", "created_at")
+_UPSERT_SQL = "INSERT INTO cash_flow_forecasts (%s) VALUES (%s) ON CONFLICT (user_id) DO UPDATE SET %s" % (
+    ", ".join(_FORECAST_COLUMNS), ", ".join("?" * len(_FORECAST_COLUMNS)),
+    ", ".join(f"{column} = excluded.{column}" for column in _FORECAST_COLUMNS[1:]),
+)
+# A new forecast changes the analysis report, so it bumps the same version its ETag is derived from.
+_BUMP_SQL = f"""INSERT INTO data_versions (user_id, resource, version) VALUES (?, '{data_versions.ANALYSIS}', 1)
+    ON CONFLICT (user_id, resource) DO UPDATE SET version = version + 1"""
+
+def _sql_datetime(when: datetime) -> str:
+    return when.strftime("%Y-%m-%d %H:%M:%S.%f")  # SQLAlchemy's SQLite DateTime storage format
+
+def _fetch(cursor, sql: str, parameters, columns: int) -> np.ndarray:
+    return np.array(cursor.execute(sql, parameters).fetchall(), dtype=np.float64).reshape(-1, columns).T
+
+def _positions(user_ids: np.ndarray, owners: np.ndarray):
+    """Row of each owner in `user_ids`, and a mask of the owners that are in it at all."""
+    positions = np.minimum(np.searchsorted(user_ids, owners), len(user_ids) - 1)
+    return positions, user_ids[positions] == owners
+
+def forecast_chunk(db: Session, user_ids: np.ndarray, as_of: date, weights: np.ndarray) -> int:
+    """
+    Forecast `user_ids` (sorted), upsert their cash_flow_forecasts rows and
+    bump their analysis versions. Returns the number written.
+    """
+    cursor = db.connection().connection.cursor()
+    try:
+        return _forecast_chunk(cursor, user_ids, as_of, weights)
+    finally:
+        cursor.close()
+
+def _forecast_chunk(cursor, user_ids: np.ndarray, as_of: date, weights: np.ndarray) -> int:
+    first, last = int(user_ids[0]), int(user_ids[-1])
+    users, days = len(user_ids), len(weights)
+    history_start = as_of - timedelta(days=days - 1)
+    end = month_end(as_of)
+    days_left = (end - as_of).days
+    tomorrow = datetime.combine(as_of + timedelta(days=1), datetime.min.time())
+
+    # Rollups are per category; bincount over flat (user, day) cells sums them into the matrix.
+    owners, offsets, net = _fetch(cursor, _FLOWS_SQL, (history_start.isoformat(), first, last,
+                                                       history_start.isoformat(), as_of.isoformat()), 3)
+    positions, known = _positions(user_ids, owners)
+    cells = positions[known] * days + offsets[known].astype(np.intp)
+    flows = np.bincount(cells, net[known], users * days).reshape(users, days)
+
+    owners, totals = _fetch(cursor, _BALANCES_SQL, (first, last), 2)
+    positions, known = _positions(user_ids, owners)
+    balances = np.bincount(positions[known], totals[known], users)
+
+    # One month of upcoming bills; the ones due by month end are subtracted in full.
+    owners, due_in, amounts = _fetch(cursor, _BILLS_SQL, (as_of.isoformat(), first, last, _sql_datetime(tomorrow),
+                                                          _sql_datetime(tomorrow + timedelta(days=round(DAYS_PER_MONTH)))), 3)
+    positions, known = _positions(user_ids, owners)
+    monthly_bills = np.bincount(positions[known], amounts[known], users)
+    due = known & (due_in <= days_left)
+    bills_due = np.bincount(positions[due], amounts[due], users)
+
+    daily_net, projected = project(flows, balances, bills_due, monthly_bills, days_left, weights)
+    as_of_value, end_value, created_at = as_of.isoformat(), end.isoformat(), _sql_datetime(datetime.now())
+    cursor.executemany(_UPSERT_SQL, (
+        (user_id, as_of_value, end_value, balance, net, bills, balance_at_end, created_at)
+        for user_id, balance, net, bills, balance_at_end in zip(
+            user_ids.tolist(), balances.round(2).tolist(), daily_net.round(2).tolist(),
+            bills_due.round(2).tolist(), projected.round(2).tolist()
+        )
+    ))
+    cursor.executemany(_BUMP_SQL, ((user_id,) for user_id in user_ids.tolist()))
+    return users
+
+def forecast_all(db: Session, as_of: Optional[date] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 user_id: Optional[int] = None) -> int:
+    """
+    Forecast every user (or one) as of the end of `as_of` (default: yesterday,
+    the latest complete day) and store the results. Each chunk is committed
+    as it is written. Returns the number of users forecast.
+    """
+    as_of = as_of or date.today() - timedelta(days=1)
+    weights = smoothing_weights(HISTORY_DAYS)
+    query = select(User.id).order_by(User.id)
+    if user_id is not None:
+        query = query.where(User.id == user_id)
+    user_ids = np.array(db.execute(query).scalars().all(), dtype=np.int64)
+    for start in range(0, len(user_ids), chunk_size):
+        forecast_chunk(db, user_ids[start:start + chunk_size], as_of, weights)
+        db.commit()
+    return len(user_ids)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast every user's month-end balance.")
+    parser.add_argument("--run", action="store_true", help="Compute and store the forecasts")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="Last day of history (default: yesterday)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+    if args.run:
+        session = SessionLocal()
+        try:
+            started = time.perf_counter()
+            users = forecast_all(session, args.as_of, args.chunk_size, args.user_id)
+        finally:
+            session.close()
+        print(f"forecast {users} users in {time.perf_counter() - started:.1f}s")
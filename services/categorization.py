@@ -0,0 +1,88 @@
+"""
+Transaction categorization at ingest, with per-user overrides.
+
+Descriptions are labelled by the shared keyword automaton in
+`utils.categorizer`. When a user recategorizes a transaction, the leading
+merchant words of its description become an override phrase for that user
+(`category_overrides`), and later descriptions containing the phrase get the
+user's category instead of the dictionary's. Each user's overrides are
+compiled into their own small automaton, cached in-process and dropped by
+`invalidate` after an override is committed; other workers drop theirs when
+the override's eviction reaches them over the cache bus.
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import CategoryOverride
+from services.cache_bus import bus
+from utils.categorizer import DEFAULT_CATEGORY, KeywordAutomaton, categorizer, merchant_phrase
+
+_automata: Dict[int, KeywordAutomaton] = {}
+_versions: Dict[int, int] = {}  # bumped by invalidate, to catch overrides racing a rebuild
+_automata_lock = threading.Lock()
+CACHE_NAME = "category_overrides"
+
+def get_overrides(db: Session, user_id: int) -> KeywordAutomaton:
+    bus.sync_for_read()
+    with _automata_lock:
+        automaton = _automata.get(user_id)
+        if automaton is not None:
+            return automaton
+        version = _versions.get(user_id, 0)
+    rows = db.query(CategoryOverride.phrase, CategoryOverride.category).filter(
+        CategoryOverride.user_id == user_id
+    ).all()
+    automaton = KeywordAutomaton((row.phrase, row.category) for row in rows)
+    with _automata_lock:
+        if _versions.get(user_id, 0) == version:
+            _automata[user_id] = automaton
+    return automaton
+
+def invalidate(user_id: Optional[int] = None):
+    """Drop cached override automata. Call after committing an override."""
+    with _automata_lock:
+        if user_id is None:
+            _automata.clear()
+            for cached_user_id in list(_versions):
+                _versions[cached_user_id] += 1
+        else:
+            _automata.pop(user_id, None)
+            _versions[user_id] = _versions.get(user_id, 0) + 1
+
+bus.subscribe(CACHE_NAME, invalidate)
+
+def categorize(db: Session, user_id: int, description: Optional[str]) -> str:
+    return categorizer.categorize(description, get_overrides(db, user_id))
+
+def categorize_many(db: Session, user_id: int, descriptions: Iterable[Optional[str]]) -> List[str]:
+    return categorizer.categorize_many(descriptions, get_overrides(db, user_id))
+
+def learn_override(db: Session, user_id: int, description: Optional[str], category: str) -> Optional[str]:
+    """
+    Remember `category` for the description's merchant phrase. Call before
+    the caller commits, and `invalidate(user_id)` after.
+
+    :return: The phrase learned, or None when the description has no usable
+             words or the dictionary already gives this category
+    """
+    phrase = merchant_phrase(description or "")
+    if not phrase:
+        return None
+    existing = db.query(CategoryOverride.category).filter(
+        CategoryOverride.user_id == user_id, CategoryOverride.phrase == phrase
+    ).scalar()
+    if existing is None and (categorizer.match(description) or DEFAULT_CATEGORY) == category:
+        return None
+    statement = sqlite_insert(CategoryOverride).values(
+        user_id=user_id, phrase=phrase, category=category, updated_at=datetime.now()
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["user_id", "phrase"],
+        set_={"category": statement.excluded.category, "updated_at": statement.excluded.updated_at},
+    ))
+    bus.publish(db, CACHE_NAME, user_id)
+    return phrase
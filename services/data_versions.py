@@ -0,0 +1,63 @@
+"""
+Per-user data versions for conditional GETs.
+
+Every write bumps a counter for the resources it affects, in the same DB
+transaction. Read endpoints derive an ETag from the counter, so an
+`If-None-Match` revalidation costs a single primary-key lookup and no
+recomputation or serialization.
+"""
+import hashlib
+from typing import Callable, Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import DataVersion
+
+BUDGETS = "budgets"
+BILL_REMINDERS = "bill_reminders"
+ANALYSIS = "analysis"
+
+def bump(db: Session, user_id: int, *resources: str):
+    """Increment the version of each resource. Call before the caller commits."""
+    for resource in resources:
+        statement = sqlite_insert(DataVersion).values(user_id=user_id, resource=resource, version=1)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["user_id", "resource"],
+            set_={"version": DataVersion.version + 1},
+        ))
+
+def current_version(db: Session, user_id: int, resource: str) -> int:
+    version = db.query(DataVersion.version).filter(
+        DataVersion.user_id == user_id, DataVersion.resource == resource
+    ).scalar()
+    return version or 0
+
+def make_etag(user_id: int, resource: str, version: int, *variant, weak: bool = False) -> str:
+    """
+    ETag for a resource version. `variant` covers anything else the body
+    depends on (query parameters, the current date for period-relative data).
+    Pass `weak` when the body also carries values that change on every
+    request (a generation timestamp), so equal tags mean equivalent, not
+    byte-identical, bodies.
+    """
+    key = "|".join(str(part) for part in (user_id, resource, version) + variant)
+    tag = '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+    return "W/" + tag if weak else tag
+
+def etag_matches(if_none_match: Optional[str], etag: str, exists: Optional[Callable[[], bool]] = None) -> bool:
+    """
+    Weak comparison, as If-None-Match uses. `*` matches only a resource that
+    exists; `exists` is called just for that case (default: it does).
+    """
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            if exists is None or exists():
+                return True
+        elif candidate.removeprefix("W/") == opaque:
+            return True
+    return False
@@ -0,0 +1,396 @@
+"""
+Append-only event log of transactions and balances, with per-user snapshots.
+
+Every change to a transaction or an account balance also appends an `events`
+row in the same DB transaction: TRANSACTION_CREATED, TRANSACTION_UPDATED
+(carrying the values before and after), TRANSACTION_DELETED (carrying the
+values removed), and BALANCE_ADJUSTED (written by
+`balance_ledger.record_balance_change`). The current tables stay the source
+for reads. The log is the history behind them: it answers audit queries and
+rebuilds derived state.
+
+A projection folds a user's events into a state. The built-in projections
+(per-account balances, per-day-and-category rollups) sum self-contained
+deltas. Summing does not depend on order, so replay reads the events as
+NumPy columns and applies a whole chunk at once (a bincount per projection)
+instead of dispatching event by event. `snapshot_all` periodically stores
+each active user's projection states. A replay starts from the nearest
+snapshot at or before the requested event and applies only the events after
+it.
+
+Run once after deploying to log existing data, then periodically:
+    python -m services.event_log --backfill
+    python -m services.event_log --snapshot
+Check or rebuild derived tables from the log with:
+    python -m services.event_log --verify [--user-id N]
+    python -m services.event_log --rebuild-rollups --user-id N
+"""
+import argparse
+import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database import Account, DailyRollup, Event, EventSnapshot, SessionLocal, Transaction
+from services import windowed_analytics
+from services.cache_bus import bus
+
+TRANSACTION_CREATED = 1
+TRANSACTION_UPDATED = 2
+TRANSACTION_DELETED = 3
+BALANCE_ADJUSTED = 4
+EVENT_NAMES = {
+    TRANSACTION_CREATED: "transaction_created",
+    TRANSACTION_UPDATED: "transaction_updated",
+    TRANSACTION_DELETED: "transaction_deleted",
+    BALANCE_ADJUSTED: "balance_adjusted",
+}
+
+# Events since a user's latest snapshot before snapshot_all takes a new one.
+SNAPSHOT_EVERY = 10_000
+REPLAY_CHUNK_SIZE = 1_000_000
+
+def _append(db: Session, user_id: int, kind: int, entity_id: int, **values):
+    db.add(Event(user_id=user_id, kind=kind, entity_id=entity_id, recorded_at=datetime.now(), **values))
+
+def record_transaction_created(db: Session, transaction: Transaction):
+    """Log a new transaction. Call before the caller commits."""
+    if transaction.id is None:
+        db.flush()
+    _append(db, transaction.user_id, TRANSACTION_CREATED, transaction.id, amount=transaction.amount,
+            category=transaction.category, occurred_at=transaction.date, description=transaction.description)
+
+def record_transaction_updated(db: Session, transaction: Transaction, previous_amount: Optional[float],
+                               previous_category: Optional[str], previous_date: Optional[datetime]):
+    """Log a change to a transaction, given its values before the change. Call before the caller commits."""
+    _append(db, transaction.user_id, TRANSACTION_UPDATED, transaction.id, amount=transaction.amount,
+            category=transaction.category, occurred_at=transaction.date, description=transaction.description,
+            previous_amount=previous_amount, previous_category=previous_category, previous_occurred_at=previous_date)
+
+def record_transaction_deleted(db: Session, transaction: Transaction):
+    """Log a transaction's removal, with the values removed. Call before the caller commits."""
+    _append(db, transaction.user_id, TRANSACTION_DELETED, transaction.id, amount=transaction.amount,
+            category=transaction.category, occurred_at=transaction.date, description=transaction.description)
+
+def record_balance_adjusted(db: Session, account: Account, delta: float, reason: Optional[str], when: datetime):
+    _append(db, account.user_id, BALANCE_ADJUSTED, account.id, amount=delta, occurred_at=when, description=reason)
+
+@dataclass
+class EventBatch:
+    """
+    A run of one user's events as columns. Batches are applied in event
+    order, but projections must not depend on the order within one.
+    """
+    kinds: np.ndarray
+    entity_ids: np.ndarray
+    amounts: np.ndarray  # NaN where missing
+    categories: List[str]  # "" where missing
+    days: np.ndarray  # date.toordinal() of occurred_at; 0 where missing
+    previous_amounts: np.ndarray
+    previous_categories: List[str]
+    previous_days: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple]) -> "EventBatch":
+        """Build from (kind, entity_id, amount, category, day, previous amount, category, day) rows."""
+        columns = list(zip(*rows)) or [()] * 8
+        kinds, entity_ids, amounts, categories, days, previous_amounts, previous_categories, previous_days = columns
+        return cls(np.array(kinds, dtype=np.int64), np.array(entity_ids, dtype=np.int64),
+                   np.array(amounts, dtype=np.float64), [category or "" for category in categories],
+                   np.array(days, dtype=np.int64), np.array(previous_amounts, dtype=np.float64),
+                   [category or "" for category in previous_categories], np.array(previous_days, dtype=np.int64))
+
+def _encode(values: List[str], codes: Dict[str, int]) -> np.ndarray:
+    for value in set(values).difference(codes):
+        codes[value] = len(codes)
+    return np.fromiter(map(codes.__getitem__, values), dtype=np.int64, count=len(values))
+
+def _sum_by(keys: np.ndarray, *columns: np.ndarray):
+    """Distinct keys and, for each column, its sum per key."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, [np.bincount(inverse, column, len(unique)) for column in columns]
+
+class Projection(ABC):
+    """A fold over a user's events. `dump` and `load` convert the state to and from JSON for snapshots."""
+    name: str
+
+    @abstractmethod
+    def initial(self):
+        ...
+
+    @abstractmethod
+    def apply(self, state, batch: EventBatch):
+        ...
+
+    def dump(self, state):
+        return state
+
+    def load(self, data):
+        return data
+
+class AccountBalances(Projection):
+    """Balance per account id; matches `accounts.balance`."""
+    name = "account_balances"
+
+    def initial(self) -> Dict[int, float]:
+        return {}
+
+    def apply(self, state: Dict[int, float], batch: EventBatch) -> Dict[int, float]:
+        adjusted = batch.kinds == BALANCE_ADJUSTED
+        if not adjusted.any():
+            return state
+        accounts, (deltas,) = _sum_by(batch.entity_ids[adjusted], np.nan_to_num(batch.amounts[adjusted]))
+        for account_id, delta in zip(accounts.tolist(), deltas.tolist()):
+            state[account_id] = state.get(account_id, 0.0) + delta
+        return state
+
+    def dump(self, state):
+        return [[account_id, balance] for account_id, balance in state.items()]
+
+    def load(self, data):
+        return {account_id: balance for account_id, balance in data}
+
+class DailyRollups(Projection):
+    """(income, expense) per (day ordinal, category); matches `daily_rollups`."""
+    name = "daily_rollups"
+
+    def initial(self) -> Dict[Tuple[int, str], List[float]]:
+        return {}
+
+    def apply(self, state: Dict[Tuple[int, str], List[float]], batch: EventBatch):
+        # Created and updated events add their values, deleted events remove
+        # them, and updated events also remove their previous values. Rows
+        # without an amount or a date were never rolled up.
+        added = (batch.kinds == TRANSACTION_CREATED) | (batch.kinds == TRANSACTION_UPDATED)
+        removed = batch.kinds == TRANSACTION_DELETED
+        current = (added | removed) & ~np.isnan(batch.amounts) & (batch.days > 0)
+        previous = (batch.kinds == TRANSACTION_UPDATED) & ~np.isnan(batch.previous_amounts) & (batch.previous_days > 0)
+        if not current.any() and not previous.any():
+            return state
+        codes: Dict[str, int] = {}
+        category_codes = np.concatenate([
+            _encode(batch.categories, codes)[current],
+            _encode([batch.previous_categories[i] for i in np.flatnonzero(previous).tolist()], codes),
+        ])
+        days = np.concatenate([batch.days[current], batch.previous_days[previous]])
+        amounts = np.concatenate([batch.amounts[current], batch.previous_amounts[previous]])
+        signs = np.concatenate([np.where(removed[current], -1.0, 1.0), np.full(previous.sum(), -1.0)])
+        keys = days * len(codes) + category_codes
+        unique, (income, expense) = _sum_by(keys, signs * np.maximum(amounts, 0.0), signs * np.maximum(-amounts, 0.0))
+        categories = list(codes)
+        for key, day_income, day_expense in zip(unique.tolist(), income.tolist(), expense.tolist()):
+            cell = state.setdefault((key // len(codes), categories[key % len(codes)]), [0.0, 0.0])
+            cell[0] += day_income
+            cell[1] += day_expense
+        return state
+
+    def dump(self, state):
+        return [[day, category, income, expense] for (day, category), (income, expense) in state.items()]
+
+    def load(self, data):
+        return {(day, category): [income, expense] for day, category, income, expense in data}
+
+PROJECTIONS: Tuple[Projection, ...] = (AccountBalances(), DailyRollups())
+
+# A chunk of events is read as a single row: SQLite joins each column into one
+# string and NumPy parses it in one call. Fetching a Python row per event would
+# cost more than the rest of the replay. REALs come back with 15 significant
+# digits, which is exact for amounts in cents. group_concat does not promise
+# an order, hence the rule that projections ignore order within a batch.
+_SEPARATOR = "\x1f"
+_EVENTS_SQL = """SELECT count(*), max(id), group_concat(kind), group_concat(entity_id),
+        group_concat(coalesce(amount, 'nan')), group_concat(coalesce(category, ''), char(31)), group_concat(day),
+        group_concat(coalesce(previous_amount, 'nan')), group_concat(coalesce(previous_category, ''), char(31)),
+        group_concat(previous_day)
+    FROM (SELECT id, kind, entity_id, amount, category, previous_amount, previous_category,
+                 coalesce(CAST(julianday(date(occurred_at)) AS INTEGER) - %(offset)d, 0) AS day,
+                 coalesce(CAST(julianday(date(previous_occurred_at)) AS INTEGER) - %(offset)d, 0) AS previous_day
+          FROM events WHERE user_id = ? AND id > ? AND id <= ? ORDER BY id LIMIT ?)""" % {
+    "offset": 1721424,  # truncated julianday() of a date, minus this, is its date.toordinal()
+}
+
+def _numbers(joined: str, dtype) -> np.ndarray:
+    return np.fromstring(joined, dtype=dtype, sep=",")
+
+def _read_batch(cursor, user_id: int, after: int, until: int, limit: int) -> Tuple[Optional[EventBatch], int]:
+    """The next `limit` events after event `after`, and the id of the last one."""
+    (count, last, kinds, entity_ids, amounts, categories, days, previous_amounts, previous_categories,
+     previous_days) = cursor.execute(_EVENTS_SQL, (user_id, after, until, limit)).fetchone()
+    if not count:
+        return None, after
+    return EventBatch(_numbers(kinds, np.int64), _numbers(entity_ids, np.int64), _numbers(amounts, np.float64),
+                      categories.split(_SEPARATOR), _numbers(days, np.int64), _numbers(previous_amounts, np.float64),
+                      previous_categories.split(_SEPARATOR), _numbers(previous_days, np.int64)), last
+
+@dataclass
+class ReplayResult:
+    states: Dict[str, object]  # projection name -> state
+    event_id: int  # last event applied (or covered by the snapshot)
+    snapshot_event_id: int  # 0 when replayed from the start
+    events_replayed: int
+
+def _nearest_snapshot(db: Session, user_id: int, until: Optional[int]) -> Optional[EventSnapshot]:
+    query = db.query(EventSnapshot).filter(EventSnapshot.user_id == user_id)
+    if until is not None:
+        query = query.filter(EventSnapshot.event_id <= until)
+    return query.order_by(EventSnapshot.event_id.desc()).first()
+
+def replay(db: Session, user_id: int, until: Optional[int] = None, projections: Sequence[Projection] = PROJECTIONS,
+           use_snapshots: bool = True) -> ReplayResult:
+    """
+    Fold the user's events up to and including event `until` (default: all)
+    into each projection, starting from the nearest snapshot that covers them.
+    """
+    states = {projection.name: projection.initial() for projection in projections}
+    start = 0
+    snapshot = _nearest_snapshot(db, user_id, until) if use_snapshots else None
+    if snapshot is not None:
+        stored = json.loads(snapshot.state)
+        if all(projection.name in stored for projection in projections):
+            states = {projection.name: projection.load(stored[projection.name]) for projection in projections}
+            start = snapshot.event_id
+    last, replayed = start, 0
+    cursor = db.connection().connection.cursor()
+    try:
+        while True:
+            batch, last = _read_batch(cursor, user_id, last, until if until is not None else 2 ** 62, REPLAY_CHUNK_SIZE)
+            if batch is None:
+                break
+            for projection in projections:
+                states[projection.name] = projection.apply(states[projection.name], batch)
+            replayed += len(batch)
+            if len(batch) < REPLAY_CHUNK_SIZE:
+                break
+    finally:
+        cursor.close()
+    return ReplayResult(states, last, start, replayed)
+
+def snapshot(db: Session, user_id: int, projections: Sequence[Projection] = PROJECTIONS) -> Optional[EventSnapshot]:
+    """Store the user's projections as of their latest event, unless already stored. Call before committing."""
+    result = replay(db, user_id, projections=projections)
+    if result.events_replayed == 0:
+        return None
+    stored = EventSnapshot(user_id=user_id, event_id=result.event_id, created_at=datetime.now(), state=json.dumps(
+        {projection.name: projection.dump(result.states[projection.name]) for projection in projections}
+    ))
+    db.add(stored)
+    return stored
+
+def snapshot_all(db: Session, every: int = SNAPSHOT_EVERY) -> int:
+    """Snapshot every user with at least `every` events since their latest snapshot, committing each. Returns the count."""
+    due = db.execute(text("""SELECT events.user_id FROM events
+        LEFT JOIN (SELECT user_id, max(event_id) AS event_id FROM event_snapshots GROUP BY user_id) AS latest
+            ON latest.user_id = events.user_id
+        WHERE events.id > coalesce(latest.event_id, 0)
+        GROUP BY events.user_id HAVING count(*) >= :every"""), {"every": every}).scalars().all()
+    for user_id in due:
+        snapshot(db, user_id)
+        db.commit()
+    return len(due)
+
+def backfill(db: Session) -> int:
+    """
+    Log what the current tables hold but the log does not, so that replays
+    match them. Transactions without events get a created event with their
+    current values. Transactions whose first event is an update get a created
+    event with that update's previous values. Accounts whose logged deltas do
+    not add up to their balance get an opening-balance event for the
+    difference. Safe to run again. Returns the number of events added.
+    """
+    now = datetime.now()
+    parameters = {"created": TRANSACTION_CREATED, "updated": TRANSACTION_UPDATED, "deleted": TRANSACTION_DELETED,
+                  "adjusted": BALANCE_ADJUSTED, "now": now}
+    added = db.execute(text("""INSERT INTO events (user_id, kind, entity_id, amount, category, occurred_at, description, recorded_at)
+        SELECT user_id, :created, id, amount, category, date, description, :now FROM transactions
+        WHERE user_id IS NOT NULL
+          AND id NOT IN (SELECT entity_id FROM events WHERE kind IN (:created, :updated, :deleted))
+        ORDER BY id"""), parameters).rowcount
+    added += db.execute(text("""INSERT INTO events (user_id, kind, entity_id, amount, category, occurred_at, description, recorded_at)
+        SELECT user_id, :created, entity_id, previous_amount, previous_category, previous_occurred_at, description, :now
+        FROM events WHERE id IN (
+            SELECT min(id) FROM events WHERE kind IN (:created, :updated, :deleted) GROUP BY entity_id
+        ) AND kind = :updated AND entity_id NOT IN (SELECT entity_id FROM events WHERE kind = :created)
+        ORDER BY id"""), parameters).rowcount
+    added += db.execute(text("""INSERT INTO events (user_id, kind, entity_id, amount, occurred_at, description, recorded_at)
+        SELECT accounts.user_id, :adjusted, accounts.id, coalesce(accounts.balance, 0) - coalesce(logged.total, 0),
+               :now, 'opening balance', :now
+        FROM accounts LEFT JOIN (
+            SELECT entity_id, sum(amount) AS total FROM events WHERE kind = :adjusted GROUP BY entity_id
+        ) AS logged ON logged.entity_id = accounts.id
+        WHERE accounts.user_id IS NOT NULL AND round(coalesce(accounts.balance, 0) - coalesce(logged.total, 0), 2) != 0
+        ORDER BY accounts.id"""), parameters).rowcount
+    return added
+
+def _rollup_rows(state) -> Dict[Tuple[date, str], Tuple[float, float]]:
+    return {(date.fromordinal(day), category): (round(income, 2), round(expense, 2))
+            for (day, category), (income, expense) in state.items() if round(income, 2) or round(expense, 2)}
+
+def verify(db: Session, user_id: int) -> List[str]:
+    """Differences between the user's replayed projections and the current tables."""
+    result = replay(db, user_id)
+    problems = []
+    balances = result.states[AccountBalances.name]
+    for account_id, balance in db.query(Account.id, Account.balance).filter(Account.user_id == user_id):
+        logged = round(balances.pop(account_id, 0.0), 2)
+        if logged != round(balance or 0.0, 2):
+            problems.append(f"account {account_id}: balance {balance}, log says {logged}")
+    problems.extend(f"account {account_id}: in the log only" for account_id in balances)
+    expected = _rollup_rows(result.states[DailyRollups.name])
+    for day, category, income, expense in db.query(DailyRollup.day, DailyRollup.category, DailyRollup.income,
+                                                   DailyRollup.expense).filter(DailyRollup.user_id == user_id):
+        logged = expected.pop((day, category), (0.0, 0.0))
+        if logged != (round(income, 2), round(expense, 2)):
+            problems.append(f"rollup {day} {category!r}: {income}/{expense}, log says {logged[0]}/{logged[1]}")
+    problems.extend(f"rollup {day} {category!r}: in the log only" for day, category in expected)
+    return problems
+
+def rebuild_rollups(db: Session, user_id: int) -> int:
+    """Rewrite the user's daily_rollups from the log. Call before committing. Returns the rows written."""
+    rows = _rollup_rows(replay(db, user_id).states[DailyRollups.name])
+    db.query(DailyRollup).filter(DailyRollup.user_id == user_id).delete(synchronize_session=False)
+    if rows:
+        db.execute(DailyRollup.__table__.insert(), [
+            {"user_id": user_id, "day": day, "category": category, "income": income, "expense": expense}
+            for (day, category), (income, expense) in rows.items()
+        ])
+    bus.publish(db, windowed_analytics.CACHE_NAME, user_id)
+    windowed_analytics.invalidate(user_id)
+    return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the transaction and balance event log.")
+    parser.add_argument("--backfill", action="store_true", help="Log existing data of users without events")
+    parser.add_argument("--snapshot", action="store_true", help="Snapshot users with enough new events")
+    parser.add_argument("--verify", action="store_true", help="Compare replayed projections with the tables")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="Rewrite daily_rollups from the log")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+    session = SessionLocal()
+    try:
+        if args.backfill:
+            print(f"logged {backfill(session)} events")
+            session.commit()
+        if args.snapshot:
+            print(f"snapshot {snapshot_all(session)} users")
+        if args.rebuild_rollups:
+            if args.user_id is None:
+                parser.error("--rebuild-rollups needs --user-id")
+            print(f"wrote {rebuild_rollups(session, args.user_id)} rollup rows")
+            session.commit()
+        if args.verify:
+            user_ids = [args.user_id] if args.user_id is not None else session.execute(
+                text("SELECT DISTINCT user_id FROM events ORDER BY user_id")).scalars().all()
+            for user_id in user_ids:
+                for problem in verify(session, user_id):
+                    print(f"user {user_id}: {problem}")
+            print(f"verified {len(user_ids)} users")
+    finally:
+        session.close()
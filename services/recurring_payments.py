@@ -0,0 +1,234 @@
+"""
+Recurring-payment and subscription detection, feeding bill reminders.
+
+A user's expenses are grouped by merchant (the leading merchant words of the
+description, see `utils.categorizer.merchant_phrase`). Each merchant's charges
+are split into clusters of similar amounts, so a fixed subscription stands out
+from one-off purchases at the same merchant, and each cluster is sorted by
+date. A cluster is a recurring payment when its median gap between charges
+matches a period (weekly, monthly or annual) and most gaps fall within that
+period's tolerance. Grouping is one pass and every group is sorted twice, so
+a history of n charges is checked in O(n log n).
+
+For every series still running, the next charge is predicted from the latest
+one and a `bill_reminders` row is created for it, unless the user already has
+a reminder for that merchant around that date. Reminders created here carry
+the merchant phrase in `bill_reminders.merchant`.
+
+`record_transaction` re-checks only the new expense's merchant, finding its
+earlier charges through the full-text index. Run the detector over every
+user with:
+    python -m services.recurring_payments --detect
+"""
+import argparse
+import calendar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import literal_column, select
+from sqlalchemy.orm import Session
+
+from database import BillReminder, SessionLocal, Transaction
+from services import data_versions, reminder_scheduler
+from services.transaction_search import build_match_query, transactions_fts
+from utils.categorizer import merchant_phrase
+
+# History looked at: enough for two annual charges and the tolerance around them.
+LOOKBACK = timedelta(days=800)
+# Largest relative spread of amounts within one series (price changes, usage-based bills).
+AMOUNT_TOLERANCE = 0.2
+# Share of the gaps between charges that must match the period.
+MIN_REGULAR = 0.75
+
+@dataclass(frozen=True)
+class Period:
+    name: str
+    days: float
+    tolerance: float  # days either side of `days` that still count as on time
+    months: int  # calendar months to step when predicting; 0 steps by `days`
+    min_occurrences: int
+
+    def advance(self, when: datetime) -> datetime:
+        if not self.months:
+            return when + timedelta(days=self.days)
+        month_index = when.year * 12 + when.month - 1 + self.months
+        year, month = divmod(month_index, 12)
+        day = min(when.day, calendar.monthrange(year, month + 1)[1])
+        return when.replace(year=year, month=month + 1, day=day)
+
+PERIODS = (
+    Period("weekly", 7, 1, 0, 4),
+    Period("monthly", 30.44, 5, 1, 3),
+    Period("annual", 365.25, 15, 12, 2),
+)
+_MIN_OCCURRENCES = min(period.min_occurrences for period in PERIODS)
+_MAX_TOLERANCE = timedelta(days=max(period.tolerance for period in PERIODS))
+
+@dataclass
+class RecurringSeries:
+    merchant: str
+    description: str  # of the latest charge
+    period: str
+    amount: float  # median charge, positive
+    occurrences: int
+    last_date: datetime
+    next_date: datetime
+
+Charge = Tuple[float, datetime, str]  # (positive amount, date, description)
+
+def _amount_clusters(charges: List[Charge]) -> Iterable[List[Charge]]:
+    """Split charges into runs whose largest amount is within AMOUNT_TOLERANCE of the smallest."""
+    charges.sort(key=itemgetter(0))
+    cluster: List[Charge] = []
+    for charge in charges:
+        if cluster and charge[0] > cluster[0][0] * (1 + AMOUNT_TOLERANCE):
+            yield cluster
+            cluster = []
+        cluster.append(charge)
+    if cluster:
+        yield cluster
+
+def _series(merchant: str, cluster: List[Charge], now: datetime) -> Optional[RecurringSeries]:
+    cluster.sort(key=itemgetter(1))
+    gaps = sorted((b[1] - a[1]).total_seconds() / 86400 for a, b in zip(cluster, cluster[1:]))
+    median_gap = gaps[len(gaps) // 2]
+    for period in PERIODS:
+        if len(cluster) < period.min_occurrences or abs(median_gap - period.days) > period.tolerance:
+            continue
+        regular = sum(1 for gap in gaps if abs(gap - period.days) <= period.tolerance)
+        if regular < MIN_REGULAR * len(gaps):
+            return None
+        _, last_date, description = cluster[-1]
+        next_date = period.advance(last_date)
+        if next_date + timedelta(days=period.tolerance) < now:
+            return None  # stopped: the next charge is overdue
+        amounts = sorted(charge[0] for charge in cluster)
+        return RecurringSeries(merchant, description, period.name, round(amounts[len(amounts) // 2], 2),
+                               len(cluster), last_date, next_date)
+    return None
+
+def detect(charges: Iterable[Tuple[Optional[str], float, datetime]], now: Optional[datetime] = None) -> List[RecurringSeries]:
+    """Recurring payments among one user's (description, amount, date) rows. Income is ignored."""
+    now = now or datetime.now()
+    merchants: Dict[str, List[Charge]] = {}
+    for description, amount, when in charges:
+        if amount is None or when is None or amount >= 0:
+            continue
+        merchant = merchant_phrase(description or "")
+        if merchant:
+            merchants.setdefault(merchant, []).append((-amount, when, description))
+    found = []
+    for merchant, merchant_charges in merchants.items():
+        if len(merchant_charges) < _MIN_OCCURRENCES:
+            continue
+        for cluster in _amount_clusters(merchant_charges):
+            if len(cluster) >= _MIN_OCCURRENCES:
+                series = _series(merchant, cluster, now)
+                if series is not None:
+                    found.append(series)
+    return found
+
+def _existing_reminders(db: Session, now: datetime, user_id: Optional[int] = None) -> Dict[int, List[Tuple[str, datetime]]]:
+    """(merchant phrase, due date) of reminders that could cover a prediction, per user."""
+    query = db.query(BillReminder.user_id, BillReminder.description, BillReminder.merchant, BillReminder.due_date).filter(
+        BillReminder.due_date >= now - _MAX_TOLERANCE
+    )
+    if user_id is not None:
+        query = query.filter(BillReminder.user_id == user_id)
+    reminders: Dict[int, List[Tuple[str, datetime]]] = {}
+    for owner, description, merchant, due_date in query:
+        reminders.setdefault(owner, []).append((merchant or merchant_phrase(description or ""), due_date))
+    return reminders
+
+def create_reminders(db: Session, user_id: int, series: Iterable[RecurringSeries], now: Optional[datetime] = None,
+                     existing: Optional[List[Tuple[str, datetime]]] = None) -> List[BillReminder]:
+    """
+    Add a bill reminder for the next charge of each series, skipping those
+    already due or already covered by a reminder for the same merchant. Call
+    before the caller commits, and schedule the returned reminders after.
+    """
+    now = now or datetime.now()
+    if existing is None:
+        existing = _existing_reminders(db, now, user_id).get(user_id, [])
+    tolerances = {period.name: timedelta(days=period.tolerance) for period in PERIODS}
+    created = []
+    for found in series:
+        if found.next_date < now:
+            continue
+        tolerance = tolerances[found.period]
+        if any(merchant == found.merchant and abs(due_date - found.next_date) <= tolerance for merchant, due_date in existing):
+            continue
+        reminder = BillReminder(user_id=user_id, description=found.description, amount=found.amount,
+                                due_date=found.next_date, remind_at=found.next_date, merchant=found.merchant)
+        db.add(reminder)
+        existing.append((found.merchant, found.next_date))
+        created.append(reminder)
+    if created:
+        data_versions.bump(db, user_id, data_versions.BILL_REMINDERS)
+        reminder_scheduler.publish_change(db, user_id)
+    return created
+
+def record_transaction(db: Session, user_id: int, description: Optional[str], amount: float, when: datetime,
+                       now: Optional[datetime] = None, transaction_id: Optional[int] = None) -> List[BillReminder]:
+    """
+    Re-check the merchant of a new expense and add any reminder it predicts.
+    Call before the caller commits, and schedule the returned reminders
+    after. The new row need not be flushed; if it is, pass its
+    `transaction_id` so the history lookup does not count it twice.
+    """
+    if amount is None or when is None or amount >= 0:
+        return []
+    merchant = merchant_phrase(description or "")
+    match = build_match_query(user_id, merchant)
+    if match is None:
+        return []
+    # The index lookup goes in a subquery: as a join, SQLite drives it from
+    # the (user_id, date) index and probes the FTS table once per row.
+    matching = select(transactions_fts.c.rowid).where(literal_column("transactions_fts").op("MATCH")(match))
+    history = db.query(Transaction.description, Transaction.amount, Transaction.date).filter(
+        Transaction.id.in_(matching), Transaction.user_id == user_id,
+        Transaction.amount < 0, Transaction.date >= when - LOOKBACK, Transaction.id != transaction_id
+    ).all()
+    # The index matches the words anywhere; keep the charges where they lead the description.
+    charges = [tuple(row) for row in history if merchant_phrase(row.description or "") == merchant]
+    charges.append((description, amount, when))
+    return create_reminders(db, user_id, detect(charges, now), now)
+
+def detect_all(db: Session, user_id: Optional[int] = None, now: Optional[datetime] = None) -> Tuple[int, int, List[BillReminder]]:
+    """
+    Run the detector over every user's recent expenses (or one user's) in a
+    single ordered scan.
+
+    :return: (users checked, series found, reminders created)
+    """
+    now = now or datetime.now()
+    query = db.query(Transaction.user_id, Transaction.description, Transaction.amount, Transaction.date).filter(
+        Transaction.amount < 0, Transaction.date >= now - LOOKBACK
+    )
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    existing = _existing_reminders(db, now, user_id)
+    users, series_found, created = 0, 0, []
+    for owner, rows in groupby(query.order_by(Transaction.user_id).yield_per(5000), key=itemgetter(0)):
+        series = detect(((description, amount, when) for _, description, amount, when in rows), now)
+        users += 1
+        series_found += len(series)
+        created.extend(create_reminders(db, owner, series, now, existing.setdefault(owner, [])))
+    return users, series_found, created
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect recurring payments and create bill reminders for them.")
+    parser.add_argument("--detect", action="store_true", help="Check every user's recent expenses")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+    if args.detect:
+        session = SessionLocal()
+        try:
+            users, series_found, created = detect_all(session, args.user_id)
+            session.commit()
+        finally:
+            session.close()
+        print(f"checked {users} users: {series_found} recurring payments, {len(created)} new bill reminders")
@@ -0,0 +1,269 @@
+"""
+Proactive bill reminder scheduler.
+
+Pending reminders from `bill_reminders` are kept in a min-heap keyed on the
+time they should fire. Reschedules push a fresh heap entry and orphan the old
+one (lazy deletion), so both scheduling and rescheduling are O(log n). On
+restart the pending set is re-read with one index-ordered query, which is
+already a valid heap.
+
+Reminders are created and moved by other processes too (API workers, the
+`services.recurring_payments` CLI). Writers publish the change on the cache
+bus (`publish_change`, before they commit); the scheduler re-reads that
+user's pending reminders on its own thread. A reminder is only sent once its
+fire time, read again from the database, has come. A "NO <id>" SMS reply to a
+reminder moves it REMIND_LATER ahead (`remind_later`).
+
+Run standalone with:
+    python -m services.reminder_scheduler
+"""
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, BillReminder
+from services import data_versions
+from services.cache_bus import bus
+from utils.sms_commands import send_bill_reminder, send_sms
+
+logger = logging.getLogger(__name__)
+
+BUS_TOPIC = "bill_reminders"
+REMIND_LATER = timedelta(days=3)  # the delay the backend's reschedule_bill_reminder promises
+
+Pending = Iterable[Tuple[int, datetime]]
+
+class ReminderScheduler:
+    def __init__(self, send: Callable[[int], Optional[datetime]], clock: Callable[[], datetime] = datetime.now,
+                 refresh: Optional[Callable[[Optional[int]], Pending]] = None):
+        """
+        :param send: Called with a reminder id once it is due; may return a later time to fire it at instead
+        :param clock: Returns the current time; swap in a virtual clock for simulations
+        :param refresh: Returns the pending (reminder_id, fire_at) pairs of a user (None: every user),
+            called on the scheduler thread after `changed`
+        """
+        self.send = send
+        self.clock = clock
+        self.refresh = refresh
+        self._heap: List[Tuple[datetime, int, int]] = []  # (fire_at, seq, reminder_id)
+        self._live: Dict[int, int] = {}  # reminder_id -> seq of its current heap entry
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._changed: Set[Optional[int]] = set()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def load(self, pending: Pending):
+        """Replace the scheduled set with (reminder_id, fire_at) pairs."""
+        with self._condition:
+            self._heap = []
+            self._live = {}
+            for reminder_id, fire_at in pending:
+                seq = next(self._seq)
+                self._heap.append((fire_at, seq, reminder_id))
+                self._live[reminder_id] = seq
+            heapq.heapify(self._heap)  # O(n), and a no-op walk for index-ordered input
+            self._condition.notify()
+
+    def schedule(self, reminder_id: int, fire_at: datetime):
+        """Schedule a reminder, or move it if it is already scheduled."""
+        with self._condition:
+            seq = next(self._seq)
+            heapq.heappush(self._heap, (fire_at, seq, reminder_id))
+            self._live[reminder_id] = seq
+            self._compact()
+            self._condition.notify()
+
+    def changed(self, user_id: Optional[int] = None):
+        """Note that a user's reminders (None: anyone's) changed elsewhere, to be re-read with `refresh`."""
+        with self._condition:
+            self._changed.add(user_id)
+            self._condition.notify()
+
+    def cancel(self, reminder_id: int):
+        with self._condition:
+            self._live.pop(reminder_id, None)
+            self._compact()
+
+    def next_fire_time(self) -> Optional[datetime]:
+        with self._condition:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        """Remove and return every reminder due at or before `now`, in due order."""
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, reminder_id = heapq.heappop(self._heap)
+                if self._live.get(reminder_id) == seq:
+                    del self._live[reminder_id]
+                    due.append(reminder_id)
+        return due
+
+    def run_pending(self) -> int:
+        """Send every reminder that is due now; returns how many were sent."""
+        due = self.pop_due(self.clock())
+        sent = 0
+        for reminder_id in due:
+            try:
+                later = self.send(reminder_id)
+            except Exception:
+                logger.exception(f"Failed to send bill reminder {reminder_id}")
+                continue
+            if later is None:
+                sent += 1
+            else:
+                self.schedule(reminder_id, later)
+        return sent
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                if not self._changed:
+                    next_fire = self.next_fire_time()
+                    if next_fire is None:
+                        self._condition.wait()
+                    else:
+                        delay = (next_fire - self.clock()).total_seconds()
+                        if delay > 0:
+                            self._condition.wait(delay)
+                if self._stopping:
+                    return
+                changed, self._changed = self._changed, set()
+            if changed:
+                self._refresh(changed)
+            self.run_pending()
+
+    def _refresh(self, changed: Set[Optional[int]]):
+        if self.refresh is None:
+            return
+        try:
+            if None in changed:
+                self.load(self.refresh(None))
+                return
+            for user_id in changed:
+                for reminder_id, fire_at in self.refresh(user_id):
+                    self.schedule(reminder_id, fire_at)
+        except Exception:
+            logger.exception("Failed to re-read pending bill reminders")
+
+    def _drop_stale(self):
+        while self._heap and self._live.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        # Rebuild once orphaned entries dominate so memory stays O(live reminders).
+        if len(self._heap) > 2 * len(self._live) + 1024:
+            self._heap = [entry for entry in self._heap if self._live.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+def pending_reminders(db: Session, user_id: Optional[int] = None) -> List[Tuple[int, datetime]]:
+    """Unsent reminders (of one user, or everyone's) as (id, fire_at), ordered by fire time."""
+    fire_at = func.coalesce(BillReminder.remind_at, BillReminder.due_date)
+    query = db.query(BillReminder.id, fire_at).filter(BillReminder.reminded_at.is_(None), fire_at.isnot(None))
+    if user_id is not None:
+        query = query.filter(BillReminder.user_id == user_id)
+    return query.order_by(fire_at).all()
+
+def load_pending(user_id: Optional[int] = None) -> List[Tuple[int, datetime]]:
+    db = SessionLocal()
+    try:
+        return pending_reminders(db, user_id)
+    finally:
+        db.close()
+
+def publish_change(db: Session, user_id: int):
+    """Have the scheduler, in whichever process runs it, re-read a user's reminders. Call before the caller commits."""
+    bus.publish(db, BUS_TOPIC, user_id)
+
+def reschedule(db: Session, reminder: BillReminder, remind_at: datetime):
+    """
+    Move a reminder, to be sent (again) at `remind_at`. Call before the caller
+    commits, and schedule it after if the scheduler runs in this process.
+    """
+    reminder.remind_at = remind_at
+    reminder.reminded_at = None
+    data_versions.bump(db, reminder.user_id, data_versions.BILL_REMINDERS)
+    publish_change(db, reminder.user_id)
+
+def remind_later(db: Session, reminder: BillReminder, now: Optional[datetime] = None) -> str:
+    """Handle a "NO <id>" reply to a reminder; returns the SMS answer. Call before the caller commits."""
+    remind_at = (now or datetime.now()) + REMIND_LATER
+    reschedule(db, reminder, remind_at)
+    return f"Bill reminder for bill {reminder.id} has been rescheduled for {remind_at.strftime('%Y-%m-%d')}."
+
+def send_due_reminder(reminder_id: int) -> Optional[datetime]:
+    """
+    Send the SMS for one reminder and mark it as sent. If the reminder was
+    moved to a later time in the meantime, send nothing and return that time.
+    """
+    db = SessionLocal()
+    try:
+        reminder = db.query(BillReminder).filter(BillReminder.id == reminder_id).first()
+        if reminder is None or reminder.reminded_at is not None:
+            return None
+        fire_at = reminder.remind_at or reminder.due_date
+        if fire_at is None:
+            return None
+        if fire_at > datetime.now():
+            return fire_at
+        message = send_bill_reminder(str(reminder.id), reminder.amount or 0.0, reminder.due_date.strftime('%Y-%m-%d'))
+        send_sms(reminder.user_id, message)
+        reminder.reminded_at = datetime.now()
+        db.commit()
+        return None
+    finally:
+        db.close()
+
+def create_scheduler() -> ReminderScheduler:
+    return ReminderScheduler(send_due_reminder, refresh=load_pending)
+
+def start_scheduler(scheduler: ReminderScheduler):
+    """Recover pending reminders from the database, follow changes made elsewhere, and start firing them."""
+    # The bus first: a change committed after it starts is seen, so none is missed between the two.
+    bus.subscribe(BUS_TOPIC, scheduler.changed)
+    bus.start()
+    scheduler.load(load_pending())
+    logger.info(f"Reminder scheduler loaded {len(scheduler)} pending reminders")
+    scheduler.start()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    scheduler = create_scheduler()
+    start_scheduler(scheduler)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        scheduler.stop()
+        bus.stop()
@@ -0,0 +1,185 @@
+"""
+Batch report generation for every user.
+
+Users are partitioned into fixed-width id ranges. Each chunk is analyzed in a
+process pool where every worker holds its own read-only SQLite connection;
+the parent process is the only writer and stores a chunk's snapshots together
+with its checkpoint row, so a crashed run resumes by skipping finished chunks.
+
+Run with:
+    python -m services.report_batch --run-id 2024-06 --workers 8
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.pool import StaticPool
+
+from agents.financial_agent import FinancialAgent, FinancialAnalysis, TransactionBatch, TrustedFinancialData
+from database import engine, SessionLocal, User, Transaction, Account, Budget, ReportSnapshot, ReportBatchCheckpoint
+from utils.responses import model_json_bytes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+@dataclass
+class BatchResult:
+    run_id: str
+    users: int
+    chunks: int
+    skipped_chunks: int
+    elapsed: float
+
+    @property
+    def users_per_second(self) -> float:
+        return self.users / self.elapsed if self.elapsed else 0.0
+
+# Per-process state, set up by _init_worker.
+_worker_engine = None
+_worker_agent = None
+
+def _init_worker(db_path: str):
+    global _worker_engine, _worker_agent
+    _worker_engine = create_engine(
+        "sqlite://",
+        creator=lambda: sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False),
+        poolclass=StaticPool,
+    )
+    _worker_agent = FinancialAgent()
+
+def _build_chunk(chunk_start: int, chunk_end: int) -> Tuple[int, List[Tuple[int, str]]]:
+    """Analyze every user with chunk_start <= id < chunk_end; returns (chunk_start, [(user_id, json)])."""
+    users = User.__table__.c
+    transactions = Transaction.__table__.c
+    accounts = Account.__table__.c
+    budgets = Budget.__table__.c
+
+    with _worker_engine.connect() as connection:
+        user_rows = connection.execute(
+            select(users.id, users.credit_score).where(users.id >= chunk_start, users.id < chunk_end)
+        ).all()
+        if not user_rows:
+            return chunk_start, []
+
+        batches: Dict[int, TransactionBatch] = defaultdict(TransactionBatch)
+        for row in connection.execute(
+            select(transactions.user_id, transactions.id, transactions.amount, transactions.description,
+                   transactions.category, transactions.date)
+            .where(transactions.user_id >= chunk_start, transactions.user_id < chunk_end)
+        ):
+            batches[row[0]].append(*row[1:])
+
+        balances: Dict[int, Dict[str, float]] = defaultdict(dict)
+        for user_id, name, balance in connection.execute(
+            select(accounts.user_id, accounts.name, accounts.balance)
+            .where(accounts.user_id >= chunk_start, accounts.user_id < chunk_end)
+        ):
+            balances[user_id][name] = balance
+
+        user_budgets: Dict[int, List[Tuple[str, float]]] = defaultdict(list)
+        for user_id, category, amount in connection.execute(
+            select(budgets.user_id, budgets.category, budgets.amount)
+            .where(budgets.user_id >= chunk_start, budgets.user_id < chunk_end)
+        ):
+            user_budgets[user_id].append((category, amount))
+
+    results = []
+    now = datetime.now()
+    for user_id, credit_score in user_rows:
+        data = TrustedFinancialData(
+            user_id=str(user_id),
+            transactions=batches.get(user_id) or TransactionBatch(),
+            account_balances=balances.get(user_id, {}),
+            budgets=user_budgets.get(user_id, []),
+            credit_score=credit_score,
+            last_updated=now
+        )
+        report = _worker_agent.analyze_trusted_data(data)
+        advice = _worker_agent.generate_advice(report)
+        results.append((user_id, model_json_bytes(FinancialAnalysis(report=report, advice=advice)).decode()))
+    return chunk_start, results
+
+def _write_chunk(run_id: str, chunk_start: int, results: List[Tuple[int, str]]):
+    now = datetime.now()
+    with engine.begin() as connection:
+        if results:
+            connection.execute(
+                ReportSnapshot.__table__.insert().prefix_with("OR REPLACE"),
+                [{"run_id": run_id, "user_id": user_id, "report": report, "created_at": now} for user_id, report in results]
+            )
+        connection.execute(
+            ReportBatchCheckpoint.__table__.insert().prefix_with("OR REPLACE"),
+            {"run_id": run_id, "chunk_start": chunk_start, "completed_at": now}
+        )
+
+def run_report_batch(run_id: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     workers: Optional[int] = None) -> BatchResult:
+    """
+    Generate report snapshots for all users. Safe to call again with the same
+    run_id after a crash; chunks that were already written are skipped.
+
+    :param run_id: Identifies the run (defaults to the current month, e.g. "2024-06")
+    :param chunk_size: Width of each user-id range handed to a worker
+    :param workers: Process count (defaults to os.cpu_count())
+    """
+    run_id = run_id or datetime.now().strftime("%Y-%m")
+    db_path = engine.url.database
+    if engine.url.get_backend_name() != "sqlite" or not db_path:
+        raise ValueError("The batch report job requires a file-backed SQLite database")
+    db_path = os.path.abspath(db_path)
+
+    db = SessionLocal()
+    try:
+        max_user_id = db.query(func.max(User.id)).scalar() or 0
+        done = {c for (c,) in db.query(ReportBatchCheckpoint.chunk_start).filter(ReportBatchCheckpoint.run_id == run_id)}
+    finally:
+        db.close()
+
+    chunks = [start for start in range(1, max_user_id + 1, chunk_size) if start not in done]
+    workers = workers or os.cpu_count() or 1
+    users = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as executor:
+        pending = set()
+        queue = iter(chunks)
+        # Keep a bounded window in flight so results never pile up in memory.
+        for start in queue:
+            pending.add(executor.submit(_build_chunk, start, start + chunk_size))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk_start, results = future.result()
+                _write_chunk(run_id, chunk_start, results)
+                users += len(results)
+                next_start = next(queue, None)
+                if next_start is not None:
+                    pending.add(executor.submit(_build_chunk, next_start, next_start + chunk_size))
+            elapsed = time.perf_counter() - started
+            logger.info(f"Report batch {run_id}: {users} users, {users / elapsed if elapsed else 0:.0f} users/sec")
+
+    result = BatchResult(run_id, users, len(chunks), len(done), time.perf_counter() - started)
+    logger.info(f"Report batch {run_id} finished: {result.users} users in {result.elapsed:.1f}s "
+                f"({result.users_per_second:.0f} users/sec), {result.skipped_chunks} chunks resumed")
+    return result
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Generate report snapshots for every user.")
+    parser.add_argument("--run-id", help="Run identifier; reuse it to resume a crashed run (default: current month)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    result = run_report_batch(args.run_id, args.chunk_size, args.workers)
+    print(f"{result.users} users in {result.elapsed:.1f}s ({result.users_per_second:.0f} users/sec)")
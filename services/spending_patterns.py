@@ -0,0 +1,227 @@
+"""
+Spending-pattern analytics from mergeable streaming aggregates.
+
+Every expense updates a handful of per-user counters in
+`spending_pattern_buckets`, in the same DB transaction as the expense:
+- the overall total, with the first and last day seen;
+- its weekday and hour-of-day histogram cells;
+- its category, together with the month-weighted sum used for the trend.
+That is four upserts, whatever the history size.
+
+Every counter is a sum of integer cents, or a min/max of days, so aggregates
+built over different time ranges or shards merge exactly by adding them
+(`SpendingPatterns.merge`). Reading the analysis is a read of at most
+7 + 24 + categories + 1 rows; no transaction history is scanned.
+
+A category's trend is the least-squares slope of its monthly spend over the
+user's whole span of months, months without spending counting as zero. With
+the span fixed, the slope only needs the category's sum of cents and its sum
+of month index x cents. Both are additive.
+
+Rebuild the buckets from the transactions table with:
+    python -m services.spending_patterns --rebuild
+"""
+import argparse
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, SpendingPatternBucket, Transaction, run_pending_backfill
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+TOP_CATEGORIES = 3
+
+def _cents(amount: float) -> int:
+    return int(round(abs(amount) * 100))
+
+def _month_index(day: date) -> int:
+    return day.year * 12 + day.month - 1
+
+class SpendingPatterns:
+    """In-memory form of one user's (or one shard's) aggregates."""
+
+    def __init__(self):
+        self.count = 0
+        self.cents = 0
+        self.first_day: Optional[int] = None
+        self.last_day: Optional[int] = None
+        self.weekday = [[0, 0] for _ in range(7)]  # [count, cents]
+        self.hour = [[0, 0] for _ in range(24)]
+        self.categories: Dict[str, List[int]] = {}  # category -> [count, cents, month_cents]
+
+    def add(self, amount: float, category: Optional[str], when: datetime):
+        """Count one expense. Income is ignored."""
+        if amount >= 0:
+            return
+        cents = _cents(amount)
+        day = when.toordinal()
+        self.count += 1
+        self.cents += cents
+        self.first_day = day if self.first_day is None else min(self.first_day, day)
+        self.last_day = day if self.last_day is None else max(self.last_day, day)
+        for cell in (self.weekday[when.weekday()], self.hour[when.hour]):
+            cell[0] += 1
+            cell[1] += cents
+        cell = self.categories.setdefault(category or "", [0, 0, 0])
+        cell[0] += 1
+        cell[1] += cents
+        cell[2] += _month_index(when) * cents
+
+    def merge(self, other: "SpendingPatterns") -> "SpendingPatterns":
+        """Add another aggregate into this one; exact and order-independent."""
+        self.count += other.count
+        self.cents += other.cents
+        days = [d for d in (self.first_day, other.first_day) if d is not None]
+        self.first_day = min(days) if days else None
+        days = [d for d in (self.last_day, other.last_day) if d is not None]
+        self.last_day = max(days) if days else None
+        for mine, theirs in zip(self.weekday + self.hour, other.weekday + other.hour):
+            mine[0] += theirs[0]
+            mine[1] += theirs[1]
+        for category, (count, cents, month_cents) in other.categories.items():
+            cell = self.categories.setdefault(category, [0, 0, 0])
+            cell[0] += count
+            cell[1] += cents
+            cell[2] += month_cents
+        return self
+
+    def rows(self, user_id: int) -> List[Dict]:
+        """The aggregate as spending_pattern_buckets rows."""
+        rows = [{"user_id": user_id, "dimension": "total", "bucket": "", "count": self.count, "cents": self.cents,
+                 "month_cents": 0, "first_day": self.first_day, "last_day": self.last_day}]
+        for dimension, cells in (("weekday", self.weekday), ("hour", self.hour)):
+            rows.extend({"user_id": user_id, "dimension": dimension, "bucket": str(i), "count": count, "cents": cents,
+                         "month_cents": 0, "first_day": None, "last_day": None}
+                        for i, (count, cents) in enumerate(cells) if count)
+        rows.extend({"user_id": user_id, "dimension": "category", "bucket": category, "count": count, "cents": cents,
+                     "month_cents": month_cents, "first_day": None, "last_day": None}
+                    for category, (count, cents, month_cents) in self.categories.items() if count)
+        return rows
+
+    @classmethod
+    def from_rows(cls, rows: Iterable) -> "SpendingPatterns":
+        patterns = cls()
+        for row in rows:
+            if row.dimension == "total":
+                patterns.count, patterns.cents = row.count, row.cents
+                patterns.first_day, patterns.last_day = row.first_day, row.last_day
+            elif row.dimension in ("weekday", "hour"):
+                getattr(patterns, row.dimension)[int(row.bucket)] = [row.count, row.cents]
+            elif row.dimension == "category":
+                patterns.categories[row.bucket] = [row.count, row.cents, row.month_cents]
+        return patterns
+
+    def category_trend(self, category: str) -> float:
+        """Least-squares slope of the category's monthly spend, in dollars per month."""
+        if self.first_day is None or category not in self.categories:
+            return 0.0
+        first = _month_index(date.fromordinal(self.first_day))
+        n = _month_index(date.fromordinal(self.last_day)) - first + 1
+        if n < 2:
+            return 0.0
+        _, cents, month_cents = self.categories[category]
+        # Month indices relative to the first month: 0 .. n-1. Integer arithmetic throughout.
+        sum_x = n * (n - 1) // 2
+        sum_xx = (n - 1) * n * (2 * n - 1) // 6
+        sum_xy = month_cents - first * cents
+        return (n * sum_xy - sum_x * cents) / (n * sum_xx - sum_x * sum_x) / 100
+
+    def summary(self) -> Dict:
+        days = self.last_day - self.first_day + 1 if self.first_day is not None else 0
+        ranked = sorted(self.categories, key=lambda category: self.categories[category][1], reverse=True)
+        return {
+            "transactions": self.count,
+            "total_spend": self.cents / 100,
+            "first_date": date.fromordinal(self.first_day) if self.first_day is not None else None,
+            "last_date": date.fromordinal(self.last_day) if self.last_day is not None else None,
+            "average_daily_spend": self.cents / 100 / days if days else 0.0,
+            "top_categories": [category for category in ranked if self.categories[category][1] > 0][:TOP_CATEGORIES],
+            "weekday_spend": {WEEKDAYS[i]: {"transactions": count, "spend": cents / 100}
+                              for i, (count, cents) in enumerate(self.weekday)},
+            "hourly_spend": [{"hour": hour, "transactions": count, "spend": cents / 100}
+                             for hour, (count, cents) in enumerate(self.hour)],
+            "category_trends": {category: {"spend": self.categories[category][1] / 100,
+                                           "monthly_slope": self.category_trend(category)}
+                                for category in ranked if self.categories[category][0]},
+        }
+
+def _upsert(db: Session, row: Dict):
+    statement = sqlite_insert(SpendingPatternBucket).values(**row)
+    excluded = statement.excluded
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["user_id", "dimension", "bucket"],
+        set_={
+            "count": SpendingPatternBucket.count + excluded.count,
+            "cents": SpendingPatternBucket.cents + excluded.cents,
+            "month_cents": SpendingPatternBucket.month_cents + excluded.month_cents,
+            # SQLite's scalar min()/max() return NULL if any argument is NULL.
+            "first_day": func.min(func.coalesce(SpendingPatternBucket.first_day, excluded.first_day),
+                                  func.coalesce(excluded.first_day, SpendingPatternBucket.first_day)),
+            "last_day": func.max(func.coalesce(SpendingPatternBucket.last_day, excluded.last_day),
+                                 func.coalesce(excluded.last_day, SpendingPatternBucket.last_day)),
+        },
+    ))
+
+def record_transaction(db: Session, user_id: int, amount: float, category: Optional[str], when: datetime):
+    """Add an expense to the user's buckets. Call before the caller commits."""
+    if amount is None or when is None or amount >= 0:
+        return
+    delta = SpendingPatterns()
+    delta.add(amount, category, when)
+    for row in delta.rows(user_id):
+        _upsert(db, row)
+
+def move_transaction(db: Session, user_id: int, amount: float, old_category: Optional[str],
+                     new_category: Optional[str], when: datetime):
+    """Move an expense between category buckets. Call before the caller commits."""
+    if amount is None or when is None or amount >= 0:
+        return
+    cents = _cents(amount)
+    for category, sign in ((old_category, -1), (new_category, 1)):
+        _upsert(db, {"user_id": user_id, "dimension": "category", "bucket": category or "", "count": sign,
+                     "cents": sign * cents, "month_cents": sign * _month_index(when) * cents,
+                     "first_day": None, "last_day": None})
+
+def get_patterns(db: Session, user_id: int) -> SpendingPatterns:
+    return SpendingPatterns.from_rows(db.query(SpendingPatternBucket).filter(SpendingPatternBucket.user_id == user_id))
+
+def aggregate(rows: Iterable) -> SpendingPatterns:
+    """Aggregate (amount, category, date) rows, e.g. one shard or time range of a user's history."""
+    patterns = SpendingPatterns()
+    for amount, category, when in rows:
+        if amount is not None and when is not None:
+            patterns.add(amount, category, when)
+    return patterns
+
+def rebuild(db: Session, user_id: Optional[int] = None):
+    """Recompute the buckets from the transactions table (all users, or one)."""
+    delete = db.query(SpendingPatternBucket)
+    user_ids = db.query(Transaction.user_id).filter(Transaction.amount < 0).distinct()
+    if user_id is not None:
+        delete = delete.filter(SpendingPatternBucket.user_id == user_id)
+        user_ids = user_ids.filter(Transaction.user_id == user_id)
+    delete.delete(synchronize_session=False)
+    for (owner,) in user_ids.all():
+        patterns = aggregate(db.query(Transaction.amount, Transaction.category, Transaction.date).filter(
+            Transaction.user_id == owner, Transaction.amount < 0
+        ).yield_per(5000))
+        db.execute(SpendingPatternBucket.__table__.insert(), patterns.rows(owner))
+
+# History from before spending_pattern_buckets existed.
+run_pending_backfill("spending_pattern_buckets", rebuild)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the spending-pattern aggregates.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute spending_pattern_buckets from transactions")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+    if args.rebuild:
+        session = SessionLocal()
+        try:
+            rebuild(session, args.user_id)
+            session.commit()
+        finally:
+            session.close()
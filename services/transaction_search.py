@@ -0,0 +1,114 @@
+"""
+Full-text search over transaction descriptions.
+
+Backed by the `transactions_fts` FTS5 index (see `database.create_search_index`),
+which triggers keep in step with `transactions`. A search looks terms up in
+the index, restricted to the user's rows there, instead of scanning every
+description with `LIKE '%term%'`. The usual filters then apply to the matching
+rows, which are ranked by BM25 relevance (or date).
+
+Query syntax: whitespace-separated words, all of which must match; a word
+ending in `*` matches as a prefix ("amaz*"). Anything else is treated as
+literal text, so user input never reaches the FTS5 query parser.
+
+Rebuild the index from the transactions table with:
+    python -m services.transaction_search --rebuild
+"""
+import argparse
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import column, func, literal_column, table, text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Transaction
+
+SEARCH_ORDERS = ("relevance", "date")
+
+transactions_fts = table("transactions_fts", column("rowid"))
+
+_TERM = re.compile(r"(\w+)(\*?)")
+
+def build_match_query(user_id: int, query: str) -> Optional[str]:
+    """
+    Turn user input into a safe FTS5 MATCH expression over one user's rows,
+    or None if it has no searchable words.
+    """
+    terms = ['"%s"%s' % (word, star) for word, star in _TERM.findall(query)]
+    if not terms:
+        return None
+    return 'owner:"u%d" AND description:(%s)' % (user_id, " ".join(terms))
+
+def search(
+    db: Session,
+    user_id: int,
+    query: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    order: str = "relevance",
+    limit: int = 50,
+    offset: int = 0,
+) -> List[Dict]:
+    """
+    Transactions of `user_id` whose description matches `query`.
+
+    :param end_date: Exclusive upper bound
+    :raises ValueError: If the query has no searchable words or `order` is unknown
+    """
+    match = build_match_query(user_id, query)
+    if match is None:
+        raise ValueError("Search query has no searchable words")
+    if order not in SEARCH_ORDERS:
+        raise ValueError(f"Unknown order: {order}")
+
+    # Weight 0 for `owner`: every row of the user has that token, it says nothing about relevance.
+    rank = func.bm25(literal_column("transactions_fts"), 1.0, 0.0).label("rank")
+    search_query = db.query(
+        Transaction.id, Transaction.amount, Transaction.description, Transaction.category, Transaction.date, rank
+    ).join(transactions_fts, transactions_fts.c.rowid == Transaction.id).filter(
+        literal_column("transactions_fts").op("MATCH")(match), Transaction.user_id == user_id
+    )
+    if start_date is not None:
+        search_query = search_query.filter(Transaction.date >= start_date)
+    if end_date is not None:
+        search_query = search_query.filter(Transaction.date < end_date)
+    if category is not None:
+        search_query = search_query.filter(Transaction.category == category)
+    if min_amount is not None:
+        search_query = search_query.filter(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        search_query = search_query.filter(Transaction.amount <= max_amount)
+    if order == "relevance":
+        search_query = search_query.order_by(rank, Transaction.date.desc())
+    else:
+        search_query = search_query.order_by(Transaction.date.desc(), Transaction.id.desc())
+    rows = search_query.limit(limit).offset(offset).all()
+    return [{"id": row.id, "amount": row.amount, "description": row.description, "category": row.category,
+             "date": row.date, "score": -row.rank} for row in rows]
+
+def rebuild_index(db: Session):
+    """Re-index every transaction description from the transactions table."""
+    db.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+
+def optimize_index(db: Session):
+    """Merge the index's b-trees into one; worth running after a large import."""
+    db.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('optimize')"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the transaction full-text index.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index every transaction description")
+    parser.add_argument("--optimize", action="store_true", help="Merge the index segments")
+    args = parser.parse_args()
+    session = SessionLocal()
+    try:
+        if args.rebuild:
+            rebuild_index(session)
+        if args.optimize:
+            optimize_index(session)
+        session.commit()
+    finally:
+        session.close()
@@ -0,0 +1,140 @@
+"""
+Money transfers between accounts, and manual balance adjustments.
+
+Two layers keep concurrent transfers correct without one global lock:
+
+* An in-process striped lock table. A transfer takes the stripes for both
+  accounts in ascending stripe order, so transfers over disjoint accounts run
+  in parallel and no two transfers can deadlock.
+* Optimistic versioning on `accounts.version` (see `Account.__mapper_args__`),
+  which catches writers in other processes. A stale write is rolled back and
+  retried with jittered backoff.
+
+The debit, the credit, both ledger entries and the transfer row commit in one
+DB transaction. Adjustments (`adjust_balance`) write a single account under
+the same locks and retries.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from database import Account, BalanceEntry, Transfer
+from services import data_versions
+from services.balance_ledger import record_balance_change
+
+MAX_RETRIES = 8
+RETRY_BACKOFF = 0.002  # seconds, doubled per attempt
+
+T = TypeVar("T")
+
+class TransferError(ValueError):
+    pass
+
+class AccountNotFoundError(TransferError):
+    pass
+
+class InsufficientFundsError(TransferError):
+    pass
+
+class TransferConflictError(TransferError):
+    pass
+
+class StripedLocks:
+    def __init__(self, stripes: int = 256):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def hold(self, *keys):
+        """Hold the stripes for all keys, acquired in canonical (ascending) order."""
+        stripes = sorted({hash(key) % len(self._locks) for key in keys})
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+
+account_locks = StripedLocks()
+
+def _write_accounts(db: Session, account_ids: Sequence[int], write: Callable[[Dict[int, Account]], T],
+                    max_retries: int, conflict_message: str) -> T:
+    """
+    Load the accounts under their stripes, call `write(accounts)` and commit,
+    retrying with jittered backoff when another writer got there first.
+    """
+    for attempt in range(max_retries):
+        with account_locks.hold(*account_ids):
+            try:
+                accounts = {
+                    a.id: a for a in db.query(Account).filter(Account.id.in_(list(account_ids))).populate_existing()
+                }
+                if any(account_id not in accounts for account_id in account_ids):
+                    raise AccountNotFoundError("Account not found")
+                result = write(accounts)
+                db.commit()
+                return result
+            except (StaleDataError, OperationalError):
+                # Another writer changed an account (or held the SQLite write lock); retry.
+                db.rollback()
+            except Exception:
+                db.rollback()
+                raise
+        time.sleep(RETRY_BACKOFF * (2 ** attempt) * random.random())
+
+    raise TransferConflictError(conflict_message)
+
+def transfer_money(db: Session, from_account_id: int, to_account_id: int, amount: float,
+                   max_retries: int = MAX_RETRIES) -> Transfer:
+    """
+    Move `amount` from one account to another and commit.
+
+    :raises AccountNotFoundError: If either account does not exist
+    :raises InsufficientFundsError: If the source balance is below `amount`
+    :raises TransferConflictError: If concurrent writers won every retry
+    """
+    if amount <= 0:
+        raise TransferError("Transfer amount must be positive")
+    if from_account_id == to_account_id:
+        raise TransferError("Cannot transfer to the same account")
+
+    def move(accounts: Dict[int, Account]) -> Transfer:
+        source, target = accounts[from_account_id], accounts[to_account_id]
+        if (source.balance or 0.0) < amount:
+            raise InsufficientFundsError(f"Insufficient funds in account {from_account_id}")
+        now = datetime.now()
+        record_balance_change(db, source, -amount, f"transfer to account {to_account_id}", now)
+        record_balance_change(db, target, amount, f"transfer from account {from_account_id}", now)
+        transfer = Transfer(from_account_id=from_account_id, to_account_id=to_account_id,
+                            amount=amount, created_at=now)
+        db.add(transfer)
+        for user_id in {source.user_id, target.user_id}:
+            data_versions.bump(db, user_id, data_versions.ANALYSIS)
+        return transfer
+
+    return _write_accounts(db, (from_account_id, to_account_id), move, max_retries,
+                           "Transfer could not be completed due to concurrent updates, please retry")
+
+def adjust_balance(db: Session, account_id: int, amount: float, reason: Optional[str] = None,
+                   max_retries: int = MAX_RETRIES) -> Tuple[Account, BalanceEntry]:
+    """
+    Apply a manual adjustment of `amount` to one account and commit.
+
+    :raises AccountNotFoundError: If the account does not exist
+    :raises TransferConflictError: If concurrent writers won every retry
+    """
+    def adjust(accounts: Dict[int, Account]) -> Tuple[Account, BalanceEntry]:
+        account = accounts[account_id]
+        entry = record_balance_change(db, account, amount, reason)
+        data_versions.bump(db, account.user_id, data_versions.ANALYSIS)
+        return account, entry
+
+    return _write_accounts(db, (account_id,), adjust, max_retries,
+                           "Adjustment could not be completed due to concurrent updates, please retry")
@@ -0,0 +1,239 @@
+"""
+Time-windowed analytics backed by daily rollups and prefix sums.
+
+`daily_rollups` holds one row per (user, day, category) and is upserted in the
+same DB transaction as each new transaction. On top of it every user gets an
+in-process PrefixSumIndex of cumulative income/expense per day (overall and
+per category), so any window total is two binary searches and a subtraction.
+Appends in day order extend the index in O(1); an out-of-order backfill marks
+it dirty and it is rebuilt from the rollups on the next read. Writes also
+publish an eviction on the cache bus, so other workers drop their copy of the
+user's index (see services.cache_bus).
+
+Rebuild the rollup table from the transactions table with:
+    python -m services.windowed_analytics --rebuild
+"""
+import argparse
+import threading
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, DailyRollup, Transaction, run_pending_backfill
+from services.cache_bus import bus
+
+WINDOW_PERIODS = ("last_30_days", "this_month", "this_quarter", "trailing_12_months")
+
+def resolve_window(period: Optional[str] = None, start_date: Optional[date] = None,
+                   end_date: Optional[date] = None, today: Optional[date] = None) -> Tuple[Optional[date], Optional[date]]:
+    """Turn a named period or explicit bounds into an inclusive (start, end) date range."""
+    today = today or date.today()
+    if period == "last_30_days":
+        return today - timedelta(days=29), today
+    if period == "this_month":
+        return today.replace(day=1), today
+    if period == "this_quarter":
+        return date(today.year, 3 * ((today.month - 1) // 3) + 1, 1), today
+    if period == "trailing_12_months":
+        try:
+            year_ago = today.replace(year=today.year - 1)
+        except ValueError:  # Feb 29
+            year_ago = today.replace(year=today.year - 1, day=28)
+        return year_ago + timedelta(days=1), today
+    if period is not None:
+        raise ValueError(f"Unknown period: {period}")
+    return start_date, end_date
+
+class PrefixSumIndex:
+    """Cumulative daily income/expense for one user (overall and per category), keyed by date ordinal."""
+    __slots__ = ("days", "income", "expense", "categories", "dirty")
+
+    def __init__(self):
+        self.days: List[int] = []
+        self.income: List[float] = []
+        self.expense: List[float] = []
+        self.categories: Dict[str, Tuple[List[int], List[float], List[float]]] = {}  # days, income, expense
+        self.dirty = False
+
+    @classmethod
+    def build(cls, rows) -> "PrefixSumIndex":
+        """Build from (day, category, income, expense) rows sorted by day."""
+        index = cls()
+        for day, category, income, expense in rows:
+            index.add(day.toordinal(), category, income, expense)
+        return index
+
+    def add(self, day: int, category: str, income: float, expense: float):
+        if self.days and day < self.days[-1]:
+            self.dirty = True
+            return
+        if self.days and self.days[-1] == day:
+            self.income[-1] += income
+            self.expense[-1] += expense
+        else:
+            self.days.append(day)
+            self.income.append((self.income[-1] if self.income else 0.0) + income)
+            self.expense.append((self.expense[-1] if self.expense else 0.0) + expense)
+        if income or expense:
+            days, income_sums, expense_sums = self.categories.setdefault(category, ([], [], []))
+            if days and days[-1] == day:
+                income_sums[-1] += income
+                expense_sums[-1] += expense
+            else:
+                days.append(day)
+                income_sums.append((income_sums[-1] if income_sums else 0.0) + income)
+                expense_sums.append((expense_sums[-1] if expense_sums else 0.0) + expense)
+
+    @staticmethod
+    def _through(days: List[int], sums: List[float], day: int) -> float:
+        """Cumulative value through the end of `day`."""
+        i = bisect_right(days, day)
+        return sums[i - 1] if i else 0.0
+
+    def totals(self, start: int, end: int) -> Tuple[float, float]:
+        """Income and expense for the inclusive ordinal range [start, end]."""
+        return (self._through(self.days, self.income, end) - self._through(self.days, self.income, start - 1),
+                self._through(self.days, self.expense, end) - self._through(self.days, self.expense, start - 1))
+
+    def category_totals(self, start: int, end: int) -> Dict[str, Tuple[float, float]]:
+        """Income and expense per category for the inclusive ordinal range [start, end]."""
+        totals = {}
+        for category, (days, income, expense) in self.categories.items():
+            earned = self._through(days, income, end) - self._through(days, income, start - 1)
+            spent = self._through(days, expense, end) - self._through(days, expense, start - 1)
+            if earned or spent:
+                totals[category] = (earned, spent)
+        return totals
+
+    def trailing_series(self, start: int, end: int, window: int, step: int = 1) -> List[Tuple[int, float, float]]:
+        """
+        (day, income, expense) over the `window` days ending at each point from
+        start to end. Both window edges only move forward, so this is a single
+        merge-style pass over the index.
+        """
+        series = []
+        days, income, expense = self.days, self.income, self.expense
+        hi = lo = 0  # first index past the window's right edge / left edge
+        for point in range(start, end + 1, step):
+            while hi < len(days) and days[hi] <= point:
+                hi += 1
+            while lo < len(days) and days[lo] <= point - window:
+                lo += 1
+            base_income = income[lo - 1] if lo else 0.0
+            base_expense = expense[lo - 1] if lo else 0.0
+            series.append((point,
+                           (income[hi - 1] if hi else 0.0) - base_income,
+                           (expense[hi - 1] if hi else 0.0) - base_expense))
+        return series
+
+_indexes: Dict[int, PrefixSumIndex] = {}
+_versions: Dict[int, int] = {}  # bumped on every observed write, to catch writes racing a rebuild
+_indexes_lock = threading.Lock()
+CACHE_NAME = "windowed_analytics"
+
+def get_index(db: Session, user_id: int) -> PrefixSumIndex:
+    """Return the user's index, rebuilding it from the rollups if missing or dirty."""
+    bus.sync_for_read()
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None and not index.dirty:
+            return index
+        version = _versions.get(user_id, 0)
+    rows = db.query(DailyRollup.day, DailyRollup.category, DailyRollup.income, DailyRollup.expense).filter(
+        DailyRollup.user_id == user_id
+    ).order_by(DailyRollup.day).all()
+    index = PrefixSumIndex.build(rows)
+    with _indexes_lock:
+        if _versions.get(user_id, 0) != version:
+            index.dirty = True  # a write landed while we were reading; rebuild next time
+        _indexes[user_id] = index
+    return index
+
+def invalidate(user_id: Optional[int] = None):
+    with _indexes_lock:
+        if user_id is None:
+            _indexes.clear()
+            for cached_user_id in list(_versions):
+                _versions[cached_user_id] += 1
+        else:
+            _indexes.pop(user_id, None)
+            _versions[user_id] = _versions.get(user_id, 0) + 1
+
+bus.subscribe(CACHE_NAME, invalidate)
+
+def _add_to_rollup(db: Session, user_id: int, day: date, category: str, income: float, expense: float):
+    statement = sqlite_insert(DailyRollup).values(
+        user_id=user_id, day=day, category=category or "", income=income, expense=expense
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["user_id", "day", "category"],
+        set_={"income": DailyRollup.income + statement.excluded.income,
+              "expense": DailyRollup.expense + statement.excluded.expense},
+    ))
+
+def record_transaction(db: Session, user_id: int, amount: float, category: str, when: datetime):
+    """Upsert the day's rollup row. Call before the caller commits."""
+    income, expense = (amount, 0.0) if amount > 0 else (0.0, -amount)
+    _add_to_rollup(db, user_id, when.date(), category, income, expense)
+    bus.publish(db, CACHE_NAME, user_id)
+
+def move_transaction(db: Session, user_id: int, amount: float, old_category: str, new_category: str, when: datetime):
+    """
+    Move a transaction's amount between category rollups. Call before the
+    caller commits, and `invalidate(user_id)` after: cached indexes only
+    support appends.
+    """
+    income, expense = (amount, 0.0) if amount > 0 else (0.0, -amount)
+    _add_to_rollup(db, user_id, when.date(), old_category, -income, -expense)
+    _add_to_rollup(db, user_id, when.date(), new_category, income, expense)
+    bus.publish(db, CACHE_NAME, user_id)
+
+def observe_transaction(user_id: int, amount: float, category: str, when: datetime):
+    """Apply a committed transaction to the cached index, if one is loaded."""
+    income, expense = (amount, 0.0) if amount > 0 else (0.0, -amount)
+    with _indexes_lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        index = _indexes.get(user_id)
+        if index is not None:
+            index.add(when.toordinal(), category or "", income, expense)
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None):
+    """Recompute daily_rollups from the transactions table (all users, or one)."""
+    delete = db.query(DailyRollup)
+    source = select(
+        Transaction.user_id,
+        func.date(Transaction.date),
+        func.coalesce(Transaction.category, ""),
+        func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0.0)),
+        func.sum(case((Transaction.amount < 0, -Transaction.amount), else_=0.0)),
+    ).where(Transaction.date.isnot(None), Transaction.amount.isnot(None))
+    if user_id is not None:
+        delete = delete.filter(DailyRollup.user_id == user_id)
+        source = source.where(Transaction.user_id == user_id)
+    delete.delete(synchronize_session=False)
+    source = source.group_by(Transaction.user_id, func.date(Transaction.date), func.coalesce(Transaction.category, ""))
+    db.execute(DailyRollup.__table__.insert().from_select(
+        ["user_id", "day", "category", "income", "expense"], source
+    ))
+    bus.publish(db, CACHE_NAME, user_id)
+    invalidate(user_id)
+
+# History from before daily_rollups existed.
+run_pending_backfill("daily_rollups", rebuild_rollups)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the daily rollup table.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute daily_rollups from transactions")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+    if args.rebuild:
+        session = SessionLocal()
+        try:
+            rebuild_rollups(session, args.user_id)
+            session.commit()
+        finally:
+            session.close()
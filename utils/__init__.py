@@ -0,0 +1 @@
+# Shared helpers for the root FastAPI app.
@@ -0,0 +1,28 @@
+"""
+Alerts raised by the root app.
+
+Counterpart of backend/app/utils/alert_system.py, which the root app cannot
+import: backend/app/__init__.py wires up the backend's routers and their
+dependencies, and that module configures logging and prints at import.
+`budget_exceeded_alert` keeps the backend's signature and message, and both
+take the crossed `threshold` for the 80% early warning.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+def budget_exceeded_alert(category: str, amount: float, budget: float, threshold: float = 1.0):
+    """
+    Alert that a budget category crossed a threshold.
+
+    :param category: Budget category
+    :param amount: Actual spent amount
+    :param budget: Budget limit
+    :param threshold: Fraction of the budget that was crossed (1.0 means fully spent)
+    """
+    if threshold >= 1.0:
+        message = f"Budget exceeded for {category}. Spent ${amount:.2f}, budget was ${budget:.2f}"
+    else:
+        message = f"Budget for {category} is {threshold:.0%} used. Spent ${amount:.2f} of ${budget:.2f}"
+    logger.warning(message, extra={"alert_type": "budget_exceeded", "category": category, "amount": amount,
+                                   "budget": budget, "threshold": threshold})
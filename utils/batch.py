@@ -0,0 +1,141 @@
+"""
+In-process dispatch for `POST /batch`.
+
+Each sub-request is run through the full ASGI app (middlewares included)
+concurrently with its siblings, and the responses are stitched into one JSON
+body without re-parsing sub-response bodies. Sub-requests in a batch share a
+`BatchContext`:
+
+* one DB session for the write sub-requests, handed out by `get_db`.
+  SQLAlchemy sessions are not thread-safe, so each write route holds the
+  context's lock while it has the session: writes run one after another.
+  Each runs in its own savepoint, so one that fails rolls back only its own
+  work and leaves the session usable for the rest of the batch. Reads get a
+  session of their own and run in parallel with everything else.
+* a cache for lookups several sub-requests repeat (see `batch_cached`). It is
+  cleared whenever a write sub-request completes.
+
+Identical GET sub-requests are dispatched once and share the response.
+Sub-requests run in no particular order; clients must not batch a read that
+depends on a write in the same batch.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy.orm import Session
+
+MAX_BATCH_SIZE = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_PATH = "/batch"
+READ_METHODS = {"GET", "HEAD"}
+
+# Parent headers that describe the batch request itself rather than each sub-request.
+_HOP_HEADERS = {b"content-length", b"content-type", b"accept-encoding", b"if-none-match", b"idempotency-key"}
+# Sub-response bodies are spliced into the batch body as they are, so they must not be encoded.
+_DROPPED_ITEM_HEADERS = {b"accept-encoding"}
+
+class BatchContext:
+    def __init__(self, session: Session):
+        self.session = session
+        self.lock = asyncio.Lock()
+        self.cache: Dict[Any, Any] = {}
+        self._reads: Dict[Tuple, "asyncio.Future"] = {}
+
+def batch_cached(scope, key, compute: Callable[[], Any]):
+    """Memoize `compute()` for the rest of the batch; computes directly outside a batch."""
+    context: Optional[BatchContext] = scope.get("batch")
+    if context is None:
+        return compute()
+    if key not in context.cache:
+        context.cache[key] = compute()
+    return context.cache[key]
+
+def _sub_scope(parent_scope, method: str, url: str, headers: Dict[str, str], body: bytes, context: BatchContext):
+    parts = urlsplit(url)
+    merged = {name: value for name, value in parent_scope["headers"] if name not in _HOP_HEADERS}
+    for name, value in headers.items():
+        name = name.lower().encode("latin-1")
+        if name not in _DROPPED_ITEM_HEADERS:
+            merged[name] = value.encode("latin-1")
+    if body:
+        merged[b"content-type"] = merged.get(b"content-type", b"application/json")
+        merged[b"content-length"] = str(len(body)).encode()
+    scope = {
+        key: value for key, value in parent_scope.items()
+        if key not in ("path", "raw_path", "query_string", "headers", "method", "router", "endpoint", "path_params", "route", "fastapi_astack")
+    }
+    scope.update({
+        "method": method,
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": list(merged.items()),
+        "batch": context,
+    })
+    return scope
+
+async def _run(app, scope, body: bytes) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    sent_request = False
+    captured = {"status": 500, "headers": [], "body": bytearray()}
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            captured["status"] = message["status"]
+            captured["headers"] = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            captured["body"] += message.get("body", b"")
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # ServerErrorMiddleware has already sent the 500 before re-raising.
+        pass
+    return captured["status"], captured["headers"], bytes(captured["body"])
+
+async def _dispatch(app, parent_scope, item: Dict[str, Any], context: BatchContext) -> bytes:
+    method = item["method"].upper()
+    headers = item.get("headers") or {}
+    body = b"" if item.get("body") is None else json.dumps(item["body"], separators=(",", ":")).encode()
+
+    if urlsplit(item["url"]).path.rstrip("/") == BATCH_PATH:
+        status, response_headers, response_body = 400, [(b"content-type", b"application/json")], b'{"detail":"Batches cannot be nested"}'
+    elif method in READ_METHODS:
+        key = (method, item["url"], tuple(sorted(headers.items())))
+        future = context._reads.get(key)
+        if future is None:
+            future = context._reads[key] = asyncio.ensure_future(
+                _run(app, _sub_scope(parent_scope, method, item["url"], headers, body, context), body)
+            )
+        status, response_headers, response_body = await asyncio.shield(future)
+    else:
+        status, response_headers, response_body = await _run(
+            app, _sub_scope(parent_scope, method, item["url"], headers, body, context), body
+        )
+        context.cache.clear()
+        context._reads.clear()
+
+    header_map = {name.decode("latin-1"): value.decode("latin-1") for name, value in response_headers
+                  if name not in (b"content-length",)}
+    if not response_body:
+        encoded_body = b"null"
+    elif header_map.get("content-type", "").startswith("application/json"):
+        encoded_body = response_body
+    else:
+        encoded_body = json.dumps(response_body.decode("utf-8", "replace")).encode()
+    envelope = json.dumps({"id": item.get("id"), "status": status, "headers": header_map}, separators=(",", ":"))
+    return envelope[:-1].encode() + b',"body":' + encoded_body + b"}"
+
+async def run_batch(app, parent_scope, items: List[Dict[str, Any]], session: Session) -> bytes:
+    """Dispatch the sub-requests concurrently and return the combined JSON body."""
+    context = BatchContext(session)
+    parts = await asyncio.gather(*(_dispatch(app, parent_scope, item, context) for item in items))
+    return b'{"responses":[' + b",".join(parts) + b"]}"
@@ -0,0 +1,228 @@
+"""
+Local transaction categorization with an Aho-Corasick keyword automaton.
+
+Descriptions are normalized to lowercase alphanumeric words separated by
+single spaces and padded with a space on each side. Keywords are normalized
+the same way, so a keyword only matches whole words ("uber" matches
+"UBER *TRIP 8812" but not "Suberb Bakery"). All keywords are matched in one
+left-to-right pass over the description; the longest match wins, and on a
+tie the earliest.
+
+The pure-Python automaton resolves failure links at build time into a full
+transition table, so matching is one dict lookup per character. When
+pyahocorasick is installed its C automaton is used instead. Labels for
+repeated descriptions (the common case: the same merchants recur every
+month) come from a bounded memo cache.
+"""
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional; fall back to the pure-Python automaton
+    ahocorasick = None
+
+DEFAULT_CATEGORY = "Other"
+CACHE_SIZE = 100_000
+# Leading words of a description kept as its merchant phrase: enough to name
+# the merchant ("trader joe s"), few enough to leave out locations.
+MERCHANT_PHRASE_WORDS = 3
+
+MERCHANT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "Income": (
+        "payroll", "salary", "direct dep", "direct deposit", "dir dep", "paycheck", "interest paid",
+        "interest payment", "dividend", "tax refund", "irs treas", "reimbursement",
+    ),
+    "Housing": (
+        "rent", "mortgage", "hoa", "property mgmt", "property management", "apartments", "landlord",
+        "home depot", "lowes", "ikea",
+    ),
+    "Utilities": (
+        "electric", "electricity", "power co", "energy", "gas co", "water dept", "water utility", "sewer",
+        "comcast", "xfinity", "spectrum", "at t", "verizon", "t mobile", "sprint", "phone bill", "internet",
+        "pg e", "con ed", "duke energy", "waste management",
+    ),
+    "Food": (
+        "whole foods", "wholefds", "trader joe", "trader joes", "safeway", "kroger", "publix", "aldi",
+        "costco", "grocery", "groceries", "supermarket", "market", "starbucks", "dunkin", "chipotle",
+        "mcdonald", "mcdonalds", "burger king", "wendys", "taco bell", "subway", "chick fil a", "panera",
+        "domino", "dominos", "pizza", "doordash", "grubhub", "uber eats", "ubereats", "postmates",
+        "instacart", "restaurant", "diner", "cafe", "coffee", "bakery", "deli", "bistro", "sushi", "grill",
+    ),
+    "Transportation": (
+        "uber", "lyft", "shell", "chevron", "exxon", "exxonmobil", "mobil", "bp", "texaco", "sunoco",
+        "gas station", "fuel", "parking", "toll", "ez pass", "e zpass", "metro", "metro card", "transit",
+        "mta", "bart", "amtrak", "car insurance", "geico", "progressive", "jiffy lube", "auto repair",
+        "car wash", "dmv",
+    ),
+    "Shopping": (
+        "amazon", "amzn", "amzn mktp", "target", "walmart", "wal mart", "best buy", "ebay", "etsy",
+        "costco whse", "macys", "nordstrom", "tj maxx", "marshalls", "kohls", "old navy", "gap", "h m",
+        "zara", "apple store", "sephora", "ulta", "dollar tree", "staples",
+    ),
+    "Entertainment": (
+        "netflix", "spotify", "hulu", "disney plus", "disneyplus", "hbo", "max com", "youtube premium",
+        "apple music", "amc theatres", "amc", "regal", "cinema", "theatre", "theater", "steam",
+        "playstation", "xbox", "nintendo", "ticketmaster", "stubhub", "concert", "bowling",
+    ),
+    "Health": (
+        "cvs", "cvs pharmacy", "walgreens", "rite aid", "pharmacy", "dental", "dentist", "medical",
+        "clinic", "hospital", "doctor", "optometry", "vision", "labcorp", "quest diagnostics", "gym",
+        "planet fitness", "fitness", "yoga",
+    ),
+    "Travel": (
+        "airlines", "airline", "delta air", "delta airlines", "united airlines", "american airlines",
+        "southwest", "jetblue", "marriott", "hilton", "hyatt", "holiday inn", "airbnb", "expedia",
+        "booking com", "hotel", "motel", "hertz", "avis", "enterprise rent",
+    ),
+    "Other": (
+        "venmo", "zelle", "paypal", "cash app", "atm", "atm withdrawal", "withdrawal", "transfer", "fee",
+    ),
+}
+
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+def normalize(text: str) -> str:
+    """Lowercase words separated by single spaces, padded with a space on each side."""
+    return " " + _SEPARATORS.sub(" ", text.lower()).strip() + " "
+
+def merchant_phrase(description: str) -> str:
+    """The merchant words of a description: its leading words, up to the first one with a digit in it."""
+    words = []
+    for word in normalize(description).split()[:MERCHANT_PHRASE_WORDS]:
+        if any(char.isdigit() for char in word):
+            break
+        words.append(word)
+    return " ".join(words)
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over normalized keywords.
+
+    `match(text)` scans an already normalized text once and returns the label
+    of the longest keyword found in it, or None.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]]):
+        """:param keywords: (keyword, label) pairs; a repeated keyword keeps its first label"""
+        patterns: Dict[str, str] = {}
+        for keyword, label in keywords:
+            pattern = normalize(keyword)
+            if pattern.strip():
+                patterns.setdefault(pattern, label)
+        self.size = len(patterns)
+        if ahocorasick is not None:
+            self._native = ahocorasick.Automaton()
+            for pattern, label in patterns.items():
+                self._native.add_word(pattern, (len(pattern), label))
+            if patterns:
+                self._native.make_automaton()
+            self.match = self._match_native if patterns else self._match_nothing
+        else:
+            self._build(patterns)
+            self.match = self._match
+
+    def _build(self, patterns: Dict[str, str]):
+        goto: List[Dict[str, int]] = [{}]
+        output: List[Optional[Tuple[int, str]]] = [None]
+        for pattern, label in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(None)
+                state = next_state
+            output[state] = (len(pattern), label)
+
+        # Breadth-first, so a state's failure target (always shallower) is
+        # complete before the state itself. Each state's table is its own
+        # edges layered over its failure target's table: a full DFA, with
+        # characters outside the keyword alphabet falling back to the root.
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque((child, 0) for child in goto[0].values())
+        while queue:
+            state, fail = queue.popleft()
+            # Deeper means longer, so a state's own keyword beats any it inherits.
+            if output[state] is None:
+                output[state] = output[fail]
+            delta[state] = {**delta[fail], **goto[state]}
+            for char, child in goto[state].items():
+                queue.append((child, delta[fail].get(char, 0)))
+        self._delta = delta
+        self._output = output
+
+    def _match(self, text: str) -> Optional[str]:
+        delta, output = self._delta, self._output
+        state, best = 0, None
+        for char in text:
+            state = delta[state].get(char, 0)
+            found = output[state]
+            if found is not None and (best is None or found[0] > best[0]):
+                best = found
+        return best[1] if best is not None else None
+
+    def _match_native(self, text: str) -> Optional[str]:
+        best = None
+        for _, found in self._native.iter(text):
+            if best is None or found[0] > best[0]:
+                best = found
+        return best[1] if best is not None else None
+
+    @staticmethod
+    def _match_nothing(text: str) -> Optional[str]:
+        return None
+
+class Categorizer:
+    """Labels descriptions from a keyword dictionary, with per-caller overrides checked first."""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]] = None, cache_size: int = CACHE_SIZE):
+        keywords = MERCHANT_KEYWORDS if keywords is None else keywords
+        self.automaton = KeywordAutomaton(
+            (keyword, category) for category, category_keywords in keywords.items() for keyword in category_keywords
+        )
+        self.cache_size = cache_size
+        self._cache: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def match(self, description: str) -> Optional[str]:
+        """Dictionary label for `description`, or None when no keyword matches."""
+        cache = self._cache
+        try:
+            return cache[description]
+        except KeyError:
+            pass
+        label = self.automaton.match(normalize(description))
+        if len(cache) >= self.cache_size:
+            with self._lock:
+                cache.clear()  # descriptions recur in bursts; a full reset is cheaper than LRU bookkeeping
+        cache[description] = label
+        return label
+
+    def categorize(self, description: Optional[str], overrides: Optional[KeywordAutomaton] = None,
+                   default: str = DEFAULT_CATEGORY) -> str:
+        if not description:
+            return default
+        if overrides is not None and overrides.size:
+            label = overrides.match(normalize(description))
+            if label is not None:
+                return label
+        label = self.match(description)
+        return label if label is not None else default
+
+    def categorize_many(self, descriptions: Iterable[Optional[str]], overrides: Optional[KeywordAutomaton] = None,
+                        default: str = DEFAULT_CATEGORY) -> List[str]:
+        if overrides is not None and overrides.size:
+            return [self.categorize(description, overrides, default) for description in descriptions]
+        match = self.match
+        labels = []
+        for description in descriptions:
+            label = match(description) if description else None
+            labels.append(label if label is not None else default)
+        return labels
+
+categorizer = Categorizer()
@@ -0,0 +1,137 @@
+"""
+SQL query instrumentation via SQLAlchemy engine events.
+
+Every statement is timed. While a request is active (see
+`middlewares.query_stats`), its queries are counted into a `QueryStats`,
+and statements issued repeatedly with the same shape are reported as N+1
+suspects. Statements slower than SLOW_QUERY_MS are written to the
+`sql.slow` logger as JSON, with their parameters and, for reads,
+SQLite's `EXPLAIN QUERY PLAN`. Set SLOW_QUERY_LOG to also write that log to
+a file.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+MAX_LOGGED_PARAMS = 500  # characters of repr(parameters) kept in the slow log
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("sql.slow")
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """Statement text with IN-lists collapsed, so the same query with different binds maps to one shape."""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+class QueryStats:
+    """Queries issued while handling one request; nested requests also count toward their parent."""
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float):
+        shape = statement_shape(statement)
+        stats = self
+        while stats is not None:
+            with stats._lock:
+                stats.count += 1
+                stats.total_time += elapsed
+                stats.shapes[shape] += 1
+            stats = stats.parent
+
+    def n_plus_one_suspects(self, threshold: int = None) -> Dict[str, int]:
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        return {shape: count for shape, count in self.shapes.items()
+                if count >= threshold and shape.lstrip("( ").upper().startswith("SELECT")}
+
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+class QueryMetrics:
+    """Process-wide per-route totals."""
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route: str, stats: QueryStats, suspects: int):
+        with self._lock:
+            totals = self._routes.setdefault(route, {"requests": 0, "queries": 0, "db_time_ms": 0.0,
+                                                     "max_queries": 0, "n_plus_one_requests": 0})
+            totals["requests"] += 1
+            totals["queries"] += stats.count
+            totals["db_time_ms"] += stats.total_time * 1000
+            totals["max_queries"] = max(totals["max_queries"], stats.count)
+            totals["n_plus_one_requests"] += 1 if suspects else 0
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"route": route, **totals,
+                 "avg_queries": totals["queries"] / totals["requests"],
+                 "avg_db_time_ms": totals["db_time_ms"] / totals["requests"]}
+                for route, totals in sorted(self._routes.items())
+            ]
+
+metrics = QueryMetrics()
+
+def _explain(cursor, statement: str, parameters) -> Optional[List[str]]:
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    try:
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            return [row[-1] for row in explain_cursor.fetchall()]
+        finally:
+            explain_cursor.close()
+    except Exception as e:  # non-SQLite backends or statements SQLite cannot explain
+        return [f"unavailable: {e}"]
+
+def _log_slow_query(cursor, statement: str, parameters, elapsed: float, executemany: bool):
+    slow_query_logger.warning(json.dumps({
+        "duration_ms": round(elapsed * 1000, 3),
+        "statement": statement,
+        "parameters": repr(parameters)[:MAX_LOGGED_PARAMS],
+        "plan": None if executemany else _explain(cursor, statement, parameters),
+    }))
+
+def install(engine, slow_query_ms: float = None, slow_query_log: Optional[str] = None):
+    """Attach the timing hooks to `engine`."""
+    threshold = (SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms) / 1000
+    slow_query_log = slow_query_log or os.getenv("SLOW_QUERY_LOG")
+    if slow_query_log:
+        directory = os.path.dirname(slow_query_log)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.FileHandler(slow_query_log)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_query_logger.addHandler(handler)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        stats = current_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+        if elapsed >= threshold:
+            _log_slow_query(cursor, statement, parameters, elapsed, executemany)
@@ -0,0 +1,78 @@
+"""
+Pre-serialized JSON responses for large payloads.
+
+Endpoints that return big Pydantic models can dump them straight to bytes with
+`model_json_bytes` and hand the result to `json_bytes_response`, skipping
+FastAPI's `jsonable_encoder` recursion. Compression is opt-in per call and
+negotiated from the client's Accept-Encoding header.
+"""
+import gzip
+import os
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip only
+    brotli = None
+
+# Payloads smaller than this are sent uncompressed; compressing them costs more than it saves.
+COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "4096"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+class JSONBytesResponse(Response):
+    media_type = "application/json"
+
+def model_json_bytes(model: BaseModel, exclude_unset: bool = False) -> bytes:
+    """Serialize a model directly to JSON bytes without building intermediate dicts."""
+    return model.__pydantic_serializer__.to_json(model, exclude_unset=exclude_unset)
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(candidates, key=lambda encoding: accepted.get(encoding, accepted.get("*", 0.0)))
+    if accepted.get(best, accepted.get("*", 0.0)) <= 0:
+        return None
+    return best
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+def json_bytes_response(request: Request, body: bytes, compress: bool = False, status_code: int = 200) -> JSONBytesResponse:
+    """
+    Wrap already-encoded JSON bytes in a response.
+
+    :param request: Incoming request, used for Accept-Encoding negotiation
+    :param body: Encoded JSON body
+    :param compress: Opt in to br/gzip for bodies of at least COMPRESSION_MIN_SIZE bytes
+    :param status_code: HTTP status code
+    """
+    headers = {}
+    if compress:
+        headers["Vary"] = "Accept-Encoding"
+        if len(body) >= COMPRESSION_MIN_SIZE:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+            if encoding:
+                body = compress_body(body, encoding)
+                headers["Content-Encoding"] = encoding
+    return JSONBytesResponse(content=body, status_code=status_code, headers=headers)
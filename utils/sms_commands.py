@@ -0,0 +1,33 @@
+"""
+SMS helpers for the root app.
+
+Message formats and command parsing are the backend's
+(backend/app/utils/sms_commands.py), loaded from its file: importing it as
+`backend.app.utils` would run backend/app/__init__.py, which builds the
+whole backend app.
+"""
+import importlib.util
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def _load_backend_module(name: str):
+    path = Path(__file__).resolve().parents[1] / "backend" / "app" / "utils" / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(f"backend_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+_backend = _load_backend_module("sms_commands")
+parse_sms_command = _backend.parse_sms_command
+send_bill_reminder = _backend.send_bill_reminder
+
+def send_sms(user_id: int, message: str):
+    """
+    Send an SMS message to a user.
+
+    :param user_id: ID of the recipient
+    :param message: Message body
+    """
+    logger.info(f"SMS to user {user_id}: {message}")